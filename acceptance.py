@@ -0,0 +1,174 @@
+import re
+
+import code_analysis
+
+DEFAULT_TEST_TIMEOUT = 5
+DEFAULT_MAX_TESTS = 8
+MAX_REPORTED_FAILURES = 5
+
+acceptance_prompt = """
+Write acceptance tests for a Python script that solves this task:
+{task_description}
+
+The script defines these functions:
+{signatures}
+
+Write up to {max_tests} independent test cases that check the functions return the results the task asks for, including edge cases. Each test case must be a single Python assert statement calling the functions above, for example:
+assert add(2, 3) == 5
+
+Return only the assert statements, one per line, without explanations.
+"""
+
+ASSERT_PATTERN = re.compile(r'^\s*(assert\b.*)$')
+
+
+def signatures(functions):
+    """Readable signatures from extract_functions output"""
+    return '\n'.join(
+        f"- {name}({', '.join(info['arguments'])})"
+        + (f" -> {', '.join(info['returns'])}" if info['returns'] else '')
+        for name, info in functions.items()
+    )
+
+
+def parse_tests(text):
+    """Single-line assert statements in an LLM reply that compile"""
+    tests = []
+    for line in text.split('\n'):
+        match = ASSERT_PATTERN.match(line)
+        if match is None:
+            continue
+        test = match.group(1).rstrip()
+        try:
+            compile(test, '<test>', 'exec')
+        except SyntaxError:
+            continue
+        if test not in tests:
+            tests.append(test)
+    return tests
+
+
+def example_test(example):
+    """
+    An assert statement for a user-supplied example.
+
+    Examples are assert statements, (call, expected) pairs or dicts with
+    'input' (a call expression) and 'output' (the expected value).
+    """
+    if isinstance(example, str):
+        return example if example.lstrip().startswith('assert') else f"assert {example}"
+    if isinstance(example, dict):
+        call, expected = example['input'], example['output']
+    else:
+        call, expected = example
+    return f"assert (result := {call}) == {expected!r}, 'returned ' + repr(result)"
+
+
+class AcceptanceTests:
+    """
+    Assert-statement tests a script has to pass on top of running cleanly.
+
+    Every test runs in its own sandbox job, concurrently and with its own
+    timeout, against the script's definitions (the script's own top-level
+    code is not run). Without an executor a SandboxPool is started on first
+    use and kept until close().
+    """
+
+    def __init__(self, tests, timeout=DEFAULT_TEST_TIMEOUT):
+        self.tests = list(tests)
+        self.timeout = timeout
+        self._pool = None
+
+    @classmethod
+    def from_examples(cls, examples, timeout=DEFAULT_TEST_TIMEOUT):
+        return cls([example_test(example) for example in examples], timeout)
+
+    @classmethod
+    def generate(cls, task_description, script, llm=None, cache=None, max_tests=DEFAULT_MAX_TESTS,
+                 timeout=DEFAULT_TEST_TIMEOUT):
+        """Ask the LLM for tests of the functions script defines"""
+        from coding_agents import complete, extract_functions
+        functions = extract_functions(script)
+        if not isinstance(functions, dict) or not functions:
+            # Nothing callable to test, the script is judged by running it
+            return cls([], timeout)
+        prompt = acceptance_prompt.format(task_description=task_description,
+                                          signatures=signatures(functions),
+                                          max_tests=max_tests)
+        reply = complete(prompt, llm, cache)
+        return cls(parse_tests(reply)[:max_tests], timeout)
+
+    def __len__(self):
+        return len(self.tests)
+
+    def test_program(self, script, test):
+        # The script's definitions and constants, without the code that runs the task
+        try:
+            definitions = code_analysis.definitions_only(script, constants=True)
+        except SyntaxError:
+            definitions = script
+        return f"{definitions}\n\n{test}\n"
+
+    def run(self, script, executor=None):
+        """
+        Run every test against script in parallel.
+
+        Returns [{'test', 'passed', 'error'}]. executor is a SandboxPool;
+        the tests' own pool is used when it is None.
+        """
+        if not self.tests:
+            return []
+        if executor is None:
+            if self._pool is None:
+                from sandbox import SandboxPool
+                self._pool = SandboxPool(workers=min(len(self.tests), DEFAULT_MAX_TESTS))
+            executor = self._pool
+        programs = [self.test_program(script, test) for test in self.tests]
+        futures = [executor.submit(program, timeout=self.timeout) for program in programs]
+        results = [future.result() for future in futures]
+        return [
+            {
+                'test': test,
+                'passed': not result['is_error'],
+                'error': result['error_message'] or ('AssertionError' if result['is_error'] else '')
+            }
+            for test, result in zip(self.tests, results)
+        ]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    @staticmethod
+    def failures(results):
+        return [result for result in results if not result['passed']]
+
+    @staticmethod
+    def describe(failures):
+        """Error text for fix_script listing the failing tests"""
+        lines = [f"The script ran, but {len(failures)} acceptance test(s) failed:"]
+        for failure in failures[:MAX_REPORTED_FAILURES]:
+            lines.append(f"{failure['test']}  # {failure['error']}")
+        if len(failures) > MAX_REPORTED_FAILURES:
+            lines.append(f"... and {len(failures) - MAX_REPORTED_FAILURES} more")
+        return '\n'.join(lines)
+
+
+def resolve(acceptance, task_description, script, llm=None, cache=None):
+    """
+    AcceptanceTests for run_and_fix's acceptance argument: True asks the
+    LLM for tests, a list is taken as examples, AcceptanceTests are used
+    as they are.
+    """
+    if acceptance is None or isinstance(acceptance, AcceptanceTests):
+        return acceptance
+    if acceptance is True:
+        return AcceptanceTests.generate(task_description, script, llm, cache)
+    return AcceptanceTests.from_examples(acceptance)
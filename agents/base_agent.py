@@ -3,15 +3,15 @@ from dataclasses import dataclass
 from abc import ABC, abstractmethod
 import os
 from pathlib import Path
-import yaml
 import json
 import asyncio
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type
-)
+from .response_cache import ResponseCache
+from .config_registry import get_registry, ConfigError
+from .tracing import tracer, record_usage
+from .resilience import Resilience
+from .rate_limit import report_usage
+
+BASE_SETTINGS_PATH = Path(__file__).parent / 'base_settings.yaml'
 
 @dataclass
 class AgentResponse:
@@ -40,20 +40,73 @@ class AgentError(Exception):
     """Base error for agent operations"""
     pass
 
+class BaseAgentConfig:
+    """
+    Base configuration for all agents
+
+    Settings come from the process-wide config registry: each YAML file is
+    parsed once, the merged settings are frozen and shared by every agent
+    using the same files, and edits to the files are picked up on the next
+    access.
+    """
+    def __init__(self, config_path: str):
+        self.config_path = config_path
+        # Fail now rather than on the first request if a file is invalid
+        get_registry().merged(config_path, BASE_SETTINGS_PATH)
+
+    def _merged(self):
+        # A file broken by a later edit keeps its last valid settings
+        return get_registry().merged(self.config_path, BASE_SETTINGS_PATH, strict=False)
+
+    def _load_yaml(self, path: str) -> Dict[str, Any]:
+        return get_registry().load(path)
+
+    @property
+    def base_settings(self) -> Dict[str, Any]:
+        return self._merged().base
+
+    @property
+    def provider_settings(self) -> Dict[str, Any]:
+        return self._merged().provider
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Merged base and provider settings (read-only)"""
+        return self._merged().settings
+
+    @property
+    def templates(self) -> Dict[str, Any]:
+        """Precompiled prompt templates by name"""
+        return self._merged().templates
+
 class BaseAgent(ABC):
     """Base class for all code generation agents"""
     
-    def __init__(self, config_path: str):
-        """Initialize base agent with configuration path"""
+    def __init__(self, config_path: str, cache: Optional[ResponseCache] = None):
+        """Initialize base agent with configuration"""
         self.config_path = config_path
-        self.config = None
-        self.settings = self._load_settings()
+        self.config = self._load_config(config_path)
+        self.cache = cache
+        self.setup_client()
+
+    @abstractmethod
+    def setup_client(self):
+        """Set up the API client"""
+        pass
+    
+    @abstractmethod
+    def _load_config(self, config_path: str) -> BaseAgentConfig:
+        """Load and validate configuration"""
+        pass
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return self.config.settings
 
     def _load_settings(self) -> Dict[str, Any]:
         """Load settings from YAML file"""
         try:
-            with open(self.config_path, 'r') as f:
-                return yaml.safe_load(f)
+            return get_registry().load(self.config_path)
         except Exception as e:
             raise AgentError(f"Failed to load settings: {str(e)}")
 
@@ -108,21 +161,78 @@ class BaseAgent(ABC):
                      template: str,
                      **kwargs) -> str:
         """Format prompt template with parameters"""
-        return template.format(**kwargs)
+        try:
+            return get_registry().template(template).format(**kwargs)
+        except ConfigError as e:
+            raise AgentError(str(e)) from e
 
     @staticmethod
     def format_list_items(items: List[str]) -> str:
         """Format list items for prompts"""
         return "\n".join(f"- {item}" for item in items)
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type(Exception)
-    )
+    @property
+    def provider_name(self) -> str:
+        return self.settings.get('provider_name', type(self).__name__)
+
     async def execute_with_retry(self, func, *args, **kwargs):
         """Execute function with retry and backoff"""
-        return await func(*args, **kwargs)
+        with tracer.span('agent.execute_with_retry',
+                         provider=self.provider_name,
+                         model=kwargs.get('model')) as span:
+            response = await self._execute_attempts(span, func, *args, **kwargs)
+            record_usage(span, response, provider=self.provider_name)
+            report_usage(response)
+            return response
+
+    @property
+    def resilience(self) -> Resilience:
+        """Retry policy, circuit breaker and concurrency limit shared by the provider"""
+        return Resilience.for_provider(self.provider_name, self.settings.get('api_settings'))
+
+    async def _execute_attempts(self, span, func, *args, **kwargs):
+        # Fatal errors (bad key, bad request) are raised at once; rate
+        # limits and server errors are retried, honouring Retry-After
+        resilience = self.resilience
+        async for attempt in resilience.retrying():
+            with attempt:
+                span.increment('attempts')
+                if getattr(span, 'attributes', {}).get('attempts', 0) > 1:
+                    tracer.count('agent.retries', provider=self.provider_name)
+                return await resilience.call(func, *args, **kwargs)
+
+    async def cached_chat_completion(self,
+                                     model: str,
+                                     messages: List[Dict[str, str]],
+                                     temperature: float,
+                                     max_tokens: int,
+                                     **kwargs) -> str:
+        """
+        Run a chat completion with retry and return the message content.
+        
+        Identical requests are served from self.cache when one is set.
+        """
+        async def complete() -> str:
+            response = await self.execute_with_retry(
+                self.client.chat.completions.create,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+            return response.choices[0].message.content
+
+        if self.cache is None:
+            return await complete()
+        return await self.cache.aget_or_compute(
+            complete,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            prompt=messages,
+            **kwargs
+        )
 
     async def parse_json_response(self, content: str) -> Dict[str, Any]:
         """Parse JSON response safely"""
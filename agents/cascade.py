@@ -0,0 +1,221 @@
+from typing import Dict, Any, Optional, List, Callable, Iterable
+import re
+import random
+import threading
+from collections import defaultdict
+
+from .tracing import tracer
+
+# best_for tags of models meant for hard tasks; the rest count as fast tiers
+STRONG_CATEGORIES = ('complex_systems', 'algorithms', 'architecture')
+DEFAULT_CATEGORY = 'simple_scripts'
+
+# Words that put a task description in one of the best_for categories;
+# the category with the most hits wins, earlier ones on a tie
+CATEGORY_KEYWORDS = {
+    'code_fixes': ('fix', 'bug', 'error', 'exception', 'traceback', 'broken', 'crash'),
+    'refactoring': ('refactor', 'clean up', 'cleanup', 'rename', 'simplif', 'restructur'),
+    'architecture': ('architecture', 'design', 'framework', 'plugin', 'microservice', 'layer'),
+    'complex_systems': ('class', 'system', 'server', 'database', 'api', 'concurren', 'async', 'thread',
+                        'pipeline', 'cache', 'queue', 'inventory', 'schedul'),
+    'algorithms': ('algorithm', 'sort', 'search', 'graph', 'tree', 'shortest', 'dynamic programming',
+                   'recursi', 'permutation', 'combination', 'prime', 'optimi', 'matrix'),
+}
+CATEGORY_PATTERNS = {
+    category: re.compile('|'.join(r'\b' + re.escape(keyword) for keyword in keywords))
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+# Skip a tier for a category once this share of its runs needed a stronger one
+DEFAULT_SKIP_THRESHOLD = 0.5
+DEFAULT_MIN_SAMPLES = 5
+# Share of runs that start at the first tier anyway, so skipped tiers are re-checked
+DEFAULT_EXPLORE = 0.1
+
+
+def categorize(task_description: str) -> str:
+    """best_for category of a task description, DEFAULT_CATEGORY if none matches"""
+    text = task_description.lower()
+    best, best_hits = DEFAULT_CATEGORY, 0
+    for category, pattern in CATEGORY_PATTERNS.items():
+        hits = len(pattern.findall(text))
+        if hits > best_hits:
+            best, best_hits = category, hits
+    return best
+
+
+def order_models(models: Dict[str, Any]) -> List[str]:
+    """
+    Model names of a settings `models:` section, fastest first.
+
+    Models tagged best_for a strong category come after the others; within
+    each group models are ordered by their response_time when given.
+    """
+    def key(item):
+        name, settings = item
+        settings = settings if isinstance(settings, dict) else {}
+        strong = any(tag in STRONG_CATEGORIES for tag in settings.get('best_for', ()))
+        return (strong, settings.get('response_time', 0), settings.get('context_length', 0))
+    return [name for name, _ in sorted(models.items(), key=key)]
+
+
+class EscalationStats:
+    """
+    Per-category record of the tier each run started at and finished on.
+
+    The escalation rate of a tier is the share of runs that tried it and
+    still needed a stronger model (or failed on every model).
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, category: str, start_tier: int, final_tier: int, succeeded: bool) -> None:
+        with self._lock:
+            self.samples[category].append((start_tier, final_tier if succeeded else None))
+
+    def escalation_rate(self, category: str, tier: int) -> Optional[float]:
+        """Share of runs that escalated past tier, None without samples"""
+        with self._lock:
+            tried = [final for start, final in self.samples[category]
+                     if start <= tier and (final is None or final >= tier)]
+        if not tried:
+            return None
+        return sum(1 for final in tried if final is None or final > tier) / len(tried)
+
+    def tried(self, category: str, tier: int) -> int:
+        with self._lock:
+            return sum(1 for start, final in self.samples[category]
+                       if start <= tier and (final is None or final >= tier))
+
+    def rates(self, tiers: int) -> Dict[str, List[Optional[float]]]:
+        return {category: [self.escalation_rate(category, tier) for tier in range(tiers)]
+                for category in list(self.samples)}
+
+
+class CascadeRun:
+    """Tier bookkeeping of one task going through a ModelCascade"""
+
+    def __init__(self, cascade: 'ModelCascade', category: str, start_tier: int):
+        self.cascade = cascade
+        self.category = category
+        self.start_tier = start_tier
+        self.calls = 0
+        self.tier = start_tier
+
+    @property
+    def model(self) -> str:
+        return self.cascade.models[self.tier]
+
+    def next_model(self) -> str:
+        """Model for the next LLM call; every call after the first follows a failure"""
+        tier = min(len(self.cascade.models) - 1,
+                   self.start_tier + self.calls // self.cascade.failures_per_tier)
+        if tier > self.tier:
+            tracer.count('cascade.escalations', category=self.category, model=self.cascade.models[tier])
+        self.tier = tier
+        self.calls += 1
+        return self.model
+
+    def wrap(self, call_llm: Callable) -> Callable:
+        """A run_and_fix call_llm strategy that picks the model for every step"""
+        async def call(step, *args):
+            return await call_llm(step, *args, llm_kwargs={'model': self.next_model()})
+        return call
+
+    def summary(self, succeeded: bool) -> Dict[str, Any]:
+        return {
+            'category': self.category,
+            'start_model': self.cascade.models[self.start_tier],
+            'final_model': self.model,
+            'escalations': self.tier - self.start_tier,
+            'succeeded': succeeded
+        }
+
+    def finish(self, succeeded: bool) -> Dict[str, Any]:
+        """Record the outcome and return its summary (for result metadata)"""
+        if self.calls:
+            self.cascade.stats.record(self.category, self.start_tier, self.tier, succeeded)
+        return self.summary(succeeded)
+
+
+class ModelCascade:
+    """
+    Try the fastest model first and escalate only when it fails.
+
+    models are ordered fastest (cheapest) first. A task starts on the first
+    model; each failed run or validation moves the next call one model up
+    (after failures_per_tier failures). Outcomes are tracked per task
+    category, and once a category's runs have needed a stronger model more
+    than skip_threshold of the time on some model, its tasks start past
+    it. The statistics are learned from history on first use: records
+    whose metadata carries a 'cascade' summary, as saved by run_to_clipboard.
+    """
+
+    def __init__(self,
+                 models: List[str],
+                 history: Any = None,
+                 failures_per_tier: int = 1,
+                 skip_threshold: float = DEFAULT_SKIP_THRESHOLD,
+                 min_samples: int = DEFAULT_MIN_SAMPLES,
+                 explore: float = DEFAULT_EXPLORE):
+        if not models:
+            raise ValueError("A model cascade needs at least one model")
+        self.models = list(models)
+        self.history = history
+        self.failures_per_tier = max(1, failures_per_tier)
+        self.skip_threshold = skip_threshold
+        self.min_samples = min_samples
+        self.explore = explore
+        self.stats = EscalationStats()
+        self._learned = history is None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings_path: str, **kwargs: Any) -> 'ModelCascade':
+        """Cascade over every model of a provider settings YAML"""
+        from .config_registry import get_registry
+        return cls(order_models(get_registry().load(settings_path).get('models') or {}), **kwargs)
+
+    def learn(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Add the cascade outcomes stored in history records, returns how many"""
+        learned = 0
+        for record in records:
+            summary = (record.get('metadata') or {}).get('cascade')
+            if not summary or summary.get('start_model') not in self.models \
+                    or summary.get('final_model') not in self.models:
+                continue
+            self.stats.record(summary['category'], self.models.index(summary['start_model']),
+                              self.models.index(summary['final_model']), summary.get('succeeded', True))
+            learned += 1
+        return learned
+
+    def _ensure_learned(self) -> None:
+        with self._lock:
+            if self._learned:
+                return
+            self._learned = True
+        self.learn(self.history.records())
+
+    def start_tier(self, category: str) -> int:
+        """First model worth trying for a category"""
+        self._ensure_learned()
+        tier = 0
+        while tier < len(self.models) - 1 and self.stats.tried(category, tier) >= self.min_samples:
+            if self.stats.escalation_rate(category, tier) < self.skip_threshold:
+                break
+            tier += 1
+        return tier
+
+    def plan(self, task_description: str, category: Optional[str] = None) -> CascadeRun:
+        category = category or categorize(task_description)
+        start = self.start_tier(category)
+        if start and random.random() < self.explore:
+            start = 0
+        return CascadeRun(self, category, start)
+
+    def escalation_rates(self) -> Dict[str, List[Optional[float]]]:
+        """{category: [escalation rate of each model]}"""
+        self._ensure_learned()
+        return self.stats.rates(len(self.models))
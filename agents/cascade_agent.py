@@ -0,0 +1,100 @@
+from typing import Dict, Any, Optional, List
+
+from .base_agent import BaseAgent, AgentError, AgentResponse
+from .cascade import ModelCascade
+from .tracing import tracer
+
+# improve_code requests have no task description to categorize
+IMPROVEMENT_CATEGORY = 'refactoring'
+
+
+class CascadeAgent(BaseAgent):
+    """
+    Runs another agent's requests through a ModelCascade
+
+    generate_code and improve_code start on the agent's fastest model and
+    move to a stronger one when the request fails, the returned code does
+    not compile or, with validate=True, the agent's validate_code rejects
+    it. The wrapped agent's generate_code and improve_code must accept a
+    `model` keyword. By default the cascade covers every model in the
+    agent's settings, fastest first, and learns from `history` (anything
+    with records(), e.g. a HistoryStore).
+    """
+
+    def __init__(self,
+                 agent: BaseAgent,
+                 cascade: Optional[ModelCascade] = None,
+                 validate: bool = False,
+                 history: Any = None):
+        self.agent = agent
+        super().__init__(agent.config_path, agent.cache)
+        self.cascade = cascade or ModelCascade.from_settings(agent.config_path, history=history)
+        self.validate = validate
+
+    def setup_client(self):
+        """Requests go through the wrapped agent's client"""
+        self.client = self.agent.client
+
+    def _load_config(self, config_path: str):
+        """Same configuration as the wrapped agent"""
+        return self.agent.config
+
+    async def _acceptable(self, code: str) -> bool:
+        try:
+            compile(code, '<generated>', 'exec')
+        except SyntaxError:
+            return False
+        if not self.validate:
+            return True
+        try:
+            return await self.agent.validate_code(code)
+        except AgentError:
+            # Validation itself failed, which says nothing about the code
+            return True
+
+    async def _run(self, plan, method: str, *args, **kwargs) -> AgentResponse:
+        response = None
+        last_error = None
+        attempts = (len(self.cascade.models) - plan.start_tier) * self.cascade.failures_per_tier
+        with tracer.span('cascade.' + method, category=plan.category) as span:
+            for _ in range(attempts):
+                model = plan.next_model()
+                span.increment('attempts')
+                try:
+                    response = await getattr(self.agent, method)(*args, model=model, **kwargs)
+                except AgentError as e:
+                    last_error = e
+                    continue
+                if await self._acceptable(response.code):
+                    response.metadata['cascade'] = plan.finish(True)
+                    return response
+            summary = plan.finish(False)
+        if response is None:
+            raise last_error
+        # Even the strongest model's code did not pass, return it flagged
+        response.metadata['cascade'] = summary
+        return response
+
+    async def generate_code(self,
+                            prompt_template: str,
+                            requirements: str,
+                            considerations: Optional[List[str]] = None) -> AgentResponse:
+        """Generate code, escalating to stronger models on failure"""
+        plan = self.cascade.plan(requirements)
+        return await self._run(plan, 'generate_code', prompt_template, requirements, considerations)
+
+    async def validate_code(self, code: str) -> bool:
+        """Validate code with the wrapped agent"""
+        return await self.agent.validate_code(code)
+
+    async def improve_code(self, code: str, aspects: List[str]) -> AgentResponse:
+        """Improve code, escalating to stronger models on failure"""
+        plan = self.cascade.plan(' '.join(aspects), category=IMPROVEMENT_CATEGORY)
+        return await self._run(plan, 'improve_code', code, aspects)
+
+    def get_capabilities(self) -> Dict[str, Any]:
+        """The wrapped agent's capabilities plus the cascade's models and escalation rates"""
+        capabilities = dict(self.agent.get_capabilities())
+        capabilities['models'] = list(self.cascade.models)
+        capabilities['escalation_rates'] = self.cascade.escalation_rates()
+        return capabilities
@@ -1,5 +1,8 @@
-from anthropic import Anthropic
-from .base_agent import BaseAgent, BaseAgentConfig, AgentError
+from typing import Optional, List
+import os
+
+from .base_agent import BaseAgent, BaseAgentConfig, AgentError, AgentResponse
+from .clients import get_registry
 
 class ClaudeConfig(BaseAgentConfig):
     """Claude-specific configuration"""
@@ -18,12 +21,12 @@ class ClaudeAgent(BaseAgent):
     """Claude-specific implementation"""
     
     def setup_client(self):
-        """Set up Anthropic client"""
+        """Set up Anthropic client on the shared connection pool"""
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise AgentError(self.config.settings['error_messages']['api_key_missing']
                            .format(provider='Anthropic'))
-        self.client = Anthropic(api_key=api_key)
+        self.client = get_registry().get_async_client('anthropic', api_key)
     
     def _load_config(self, config_path: str) -> ClaudeConfig:
         """Load Claude configuration"""
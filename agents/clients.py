@@ -0,0 +1,217 @@
+from typing import Dict, Any, Optional, Tuple, Callable
+import os
+import asyncio
+import weakref
+import threading
+import importlib.util
+
+import httpx
+
+from .base_agent import AgentError
+
+# provider -> (module, sync client class, async client class, API key variable)
+PROVIDERS = {
+    'anthropic': ('anthropic', 'Anthropic', 'AsyncAnthropic', 'ANTHROPIC_API_KEY'),
+    'groq': ('groq', 'Groq', 'AsyncGroq', 'GROQ_API_KEY'),
+    'openai': ('openai', 'OpenAI', 'AsyncOpenAI', 'OPENAI_API_KEY'),
+}
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 60.0
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class LoopLocal:
+    """
+    Proxy to one instance of an async client per event loop.
+
+    An httpx.AsyncClient, and any SDK client or LLM built on one, belongs
+    to the loop that opened its connections: used again after that loop
+    is closed (e.g. the next asyncio.run) it fails with "Event loop is
+    closed". Attribute access is forwarded to the running loop's
+    instance, built by factory() on first use there; code running outside
+    any loop shares one more instance. Instances of closed loops are
+    dropped.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instances = weakref.WeakKeyDictionary()
+        self._outside_loop = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """The instance for the running loop (or for code outside any loop)"""
+        loop = _running_loop()
+        with self._lock:
+            if loop is None:
+                if self._outside_loop is None:
+                    self._outside_loop = self._factory()
+                return self._outside_loop
+            instance = self._instances.get(loop)
+            if instance is None:
+                for stale in [other for other in self._instances if other.is_closed()]:
+                    del self._instances[stale]
+                instance = self._instances[loop] = self._factory()
+            return instance
+
+    def pop(self, loop: Optional[asyncio.AbstractEventLoop]) -> Any:
+        """Forget the instance of a loop (None: outside any loop) and return it"""
+        with self._lock:
+            if loop is None:
+                instance, self._outside_loop = self._outside_loop, None
+                return instance
+            return self._instances.pop(loop, None)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ('_factory', '_instances', '_outside_loop', '_lock'):
+            # Not set up yet (e.g. while copying), don't build an instance
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of provider SDK clients.
+
+    Every provider gets one keep-alive HTTP connection pool (HTTP/2 when
+    the `h2` package is installed) for sync callers and one per event
+    loop for async callers, and SDK clients are built on top of those
+    pools once per provider and API key (async ones once per loop, see
+    LoopLocal). Use it as an async (or sync) context manager, or call
+    aclose()/close(), to release the sockets; aclose() releases those of
+    the running loop.
+    """
+
+    def __init__(self,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self.http2 = importlib.util.find_spec('h2') is not None
+        self._async_http: Dict[str, LoopLocal] = {}
+        self._sync_http: Dict[str, httpx.Client] = {}
+        self._clients: Dict[Tuple[str, str, bool], Any] = {}
+        self._lock = threading.Lock()
+
+    def _provider(self, provider: str) -> Tuple[str, str, str, str]:
+        if provider not in PROVIDERS:
+            raise AgentError(f"Unknown provider: {provider}")
+        return PROVIDERS[provider]
+
+    def async_http_client(self, provider: str) -> httpx.AsyncClient:
+        """The running loop's async connection pool for a provider"""
+        with self._lock:
+            if provider not in self._async_http:
+                self._async_http[provider] = LoopLocal(lambda: httpx.AsyncClient(
+                    http2=self.http2, limits=self.limits, timeout=self.timeout
+                ))
+            pools = self._async_http[provider]
+        return pools.get()
+
+    def sync_http_client(self, provider: str) -> httpx.Client:
+        """Shared sync connection pool for a provider"""
+        with self._lock:
+            if provider not in self._sync_http:
+                self._sync_http[provider] = httpx.Client(
+                    http2=self.http2, limits=self.limits, timeout=self.timeout
+                )
+            return self._sync_http[provider]
+
+    def _get_client(self, provider: str, api_key: Optional[str], is_async: bool) -> Any:
+        module_name, sync_class, async_class, key_variable = self._provider(provider)
+        api_key = api_key or os.getenv(key_variable)
+        if not api_key:
+            raise AgentError(f"{provider} API key not found in environment variables")
+
+        cache_key = (provider, api_key, is_async)
+        if cache_key not in self._clients:
+            module = importlib.import_module(module_name)
+            if is_async:
+                client_class = getattr(module, async_class)
+                # Built lazily in each loop, on that loop's pool
+                client = LoopLocal(lambda: client_class(
+                    api_key=api_key, http_client=self.async_http_client(provider)
+                ))
+            else:
+                client = getattr(module, sync_class)(
+                    api_key=api_key, http_client=self.sync_http_client(provider)
+                )
+            with self._lock:
+                self._clients.setdefault(cache_key, client)
+        return self._clients[cache_key]
+
+    def get_async_client(self, provider: str, api_key: Optional[str] = None) -> LoopLocal:
+        """Async SDK client (e.g. AsyncGroq) riding the running loop's pool"""
+        return self._get_client(provider, api_key, is_async=True)
+
+    def get_sync_client(self, provider: str, api_key: Optional[str] = None) -> Any:
+        """Sync SDK client (e.g. Anthropic) riding the shared pool"""
+        return self._get_client(provider, api_key, is_async=False)
+
+    def anthropic_llm(self, **kwargs) -> LoopLocal:
+        """
+        llama_index Anthropic LLM, one instance per event loop.
+
+        llama_index keeps its SDK clients private, so each instance has
+        its own connection pools; sync calls made outside any loop share
+        one instance.
+        """
+        from llama_index.llms.anthropic import Anthropic
+        return LoopLocal(lambda: Anthropic(**kwargs))
+
+    async def aclose(self):
+        """Close the running loop's async pools and every sync pool"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            local_pools = list(self._async_http.values())
+            local_clients = [client for key, client in self._clients.items() if key[2]]
+        async_pools = [pool for pool in (pools.pop(loop) for pools in local_pools) if pool is not None]
+        for client in local_clients:
+            client.pop(loop)
+        self.close()
+        for pool in async_pools:
+            await pool.aclose()
+
+    def close(self):
+        """Close the sync pools; async pools need aclose() in their loop"""
+        with self._lock:
+            sync_pools = list(self._sync_http.values())
+            self._sync_http.clear()
+            self._clients = {key: client for key, client in self._clients.items() if key[2]}
+        for pool in sync_pools:
+            pool.close()
+
+    async def __aenter__(self) -> 'ClientRegistry':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.aclose()
+
+    def __enter__(self) -> 'ClientRegistry':
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+registry = ClientRegistry()
+
+
+def get_registry() -> ClientRegistry:
+    """The process-wide client registry"""
+    return registry
@@ -0,0 +1,269 @@
+from typing import Dict, Any, Tuple
+import os
+import time
+import string
+import threading
+from functools import lru_cache
+
+from .tracing import tracer
+
+# How often (in seconds) a cached file is stat'ed for changes
+DEFAULT_CHECK_INTERVAL = 1.0
+MAX_TEMPLATES = 256
+
+
+class ConfigError(Exception):
+    """Invalid settings file or prompt template"""
+    pass
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict for settings shared between agents.
+
+    Still a dict, so isinstance checks and json.dumps work; copy() and
+    deepcopy() return ordinary mutable dicts.
+    """
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Settings are shared between agents and cannot be modified, copy them first")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value: Any) -> Any:
+    """Recursively turn dicts into FrozenDicts and lists into tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Mutable copy of frozen settings"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class PromptTemplate:
+    """
+    A prompt template parsed once.
+
+    Placeholders must be plain names ({requirements}, not {0} or {a.b});
+    this is checked when the template is compiled, so a bad template fails
+    when its settings are loaded instead of on the first request. Templates
+    without format specs or conversions are rendered with a precompiled
+    %-format string, about twice as fast as str.format.
+    """
+    __slots__ = ('text', 'fields', '_pattern')
+
+    def __init__(self, text: str):
+        self.text = text
+        fields = []
+        parts = []
+        simple = True
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise ConfigError(f"Invalid prompt template: {e}")
+        for literal, field, format_spec, conversion in parsed:
+            parts.append(literal.replace('%', '%%'))
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ConfigError(f"Prompt placeholder {{{field}}} must be a name")
+            if format_spec or conversion:
+                simple = False
+            parts.append(f"%({field})s")
+            fields.append(field)
+        self.fields = frozenset(fields)
+        self._pattern = ''.join(parts) if simple else None
+
+    def format(self, **kwargs: Any) -> str:
+        missing = self.fields.difference(kwargs)
+        if missing:
+            raise ConfigError(f"Missing prompt parameters: {', '.join(sorted(missing))}")
+        if self._pattern is None:
+            return self.text.format(**kwargs)
+        return self._pattern % kwargs
+
+    def __repr__(self):
+        return f"PromptTemplate(fields={sorted(self.fields)})"
+
+
+@lru_cache(maxsize=MAX_TEMPLATES)
+def compile_template(text: str) -> PromptTemplate:
+    """Shared PromptTemplate for a template string"""
+    return PromptTemplate(text)
+
+
+def merge_settings(base: Dict[str, Any], provider: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge base and provider-specific settings"""
+    settings = thaw(base)
+
+    # Merge prompts with additions
+    if 'prompt_additions' in provider:
+        for key, addition in provider['prompt_additions'].items():
+            if key in settings['prompts']:
+                settings['prompts'][key] = f"{settings['prompts'][key]}\n{addition}"
+
+    # Update with provider-specific settings
+    for key, value in provider.items():
+        if key != 'prompt_additions':
+            if isinstance(value, dict) and key in settings:
+                settings[key].update(thaw(value))
+            else:
+                settings[key] = thaw(value)
+
+    return settings
+
+
+class MergedConfig:
+    """Base and provider settings of one agent type, merged and compiled"""
+    __slots__ = ('base', 'provider', 'settings', 'templates', 'error')
+
+    def __init__(self, base: FrozenDict, provider: FrozenDict):
+        self.base = base
+        self.provider = provider
+        self.error = None
+        self.settings = freeze(merge_settings(base, provider))
+        templates = {}
+        for name, text in (self.settings.get('prompts') or {}).items():
+            try:
+                templates[name] = compile_template(text)
+            except ConfigError as e:
+                raise ConfigError(f"Prompt template '{name}': {e}")
+        self.templates = FrozenDict(templates)
+
+    def stale(self, base: FrozenDict, provider: FrozenDict, error: Exception) -> 'MergedConfig':
+        """These settings standing in for files that failed to merge"""
+        stale = object.__new__(MergedConfig)
+        stale.base = base
+        stale.provider = provider
+        stale.settings = self.settings
+        stale.templates = self.templates
+        stale.error = error
+        return stale
+
+
+class _File:
+    __slots__ = ('stamp', 'checked', 'data')
+
+    def __init__(self, stamp, checked, data):
+        self.stamp = stamp
+        self.checked = checked
+        self.data = data
+
+
+class ConfigRegistry:
+    """
+    Process-wide cache of parsed settings files.
+
+    Each YAML file is parsed once and handed out as frozen, shared
+    settings. A file is stat'ed at most every check_interval seconds and
+    parsed again only when its mtime or size changed, so edits are picked
+    up without restarting. Merged base + provider settings and their
+    compiled prompt templates are cached until either file changes.
+    """
+
+    def __init__(self, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._files: Dict[str, _File] = {}
+        self._merged: Dict[Tuple[str, str], MergedConfig] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, path: str) -> FrozenDict:
+        """Frozen contents of a YAML file, parsed again only after it changes"""
+        path = os.path.abspath(path)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and now - entry.checked < self.check_interval:
+                return entry.data
+        stamp = self._stamp(path)
+        if entry is not None and entry.stamp == stamp:
+            entry.checked = now
+            return entry.data
+
+        import yaml
+        try:
+            with open(path, 'r') as f:
+                data = freeze(yaml.safe_load(f) or {})
+        except Exception:
+            if entry is not None:
+                # Try the broken file again after check_interval, not on every call
+                entry.checked = now
+            raise
+        tracer.count('config.parses')
+        with self._lock:
+            self._files[path] = _File(stamp, now, data)
+        return data
+
+    def merged(self, config_path: str, base_path: str, strict: bool = True) -> MergedConfig:
+        """
+        Merged settings of a provider YAML on top of the base YAML.
+
+        With strict=False a file that was edited into an invalid state
+        does not break running agents: the last valid settings are served
+        until the files are fixed.
+        """
+        key = (os.path.abspath(base_path), os.path.abspath(config_path))
+        with self._lock:
+            previous = self._merged.get(key)
+        try:
+            base = self.load(base_path)
+            provider = self.load(config_path)
+        except Exception:
+            if strict or previous is None:
+                raise
+            tracer.count('config.reload_errors')
+            return previous
+        # A reloaded file is a new object, so identity tells if it changed
+        if previous is not None and previous.base is base and previous.provider is provider:
+            if strict and previous.error is not None:
+                raise previous.error
+            return previous
+        try:
+            merged = MergedConfig(base, provider)
+        except ConfigError as e:
+            if strict or previous is None:
+                raise
+            tracer.count('config.reload_errors')
+            # Remembered so the broken files are not merged again on every call
+            merged = previous.stale(base, provider, e)
+        with self._lock:
+            self._merged[key] = merged
+        return merged
+
+    def template(self, text: str) -> PromptTemplate:
+        return compile_template(text)
+
+    def clear(self) -> None:
+        """Forget every cached file, e.g. after replacing settings in tests"""
+        with self._lock:
+            self._files.clear()
+            self._merged.clear()
+
+
+registry = ConfigRegistry()
+
+
+def get_registry() -> ConfigRegistry:
+    """The process-wide config registry"""
+    return registry
@@ -1,9 +1,13 @@
-from typing import Dict, Any, Optional, List, AsyncIterator
+from typing import Dict, Any, Optional, List, AsyncIterator, Union, Callable
 import os
-from groq import AsyncGroq
-from groq.types import ChatCompletion, AsyncChatCompletionChunk
+import ast
+import asyncio
 
 from .base_agent import BaseAgent, BaseAgentConfig, AgentError, AgentResponse
+from .rate_limit import RateLimiter
+from .clients import get_registry
+from .tracing import tracer
+from .streaming import StreamingCodeValidator, StreamValidationError
 
 class GroqConfig(BaseAgentConfig):
     """Groq-specific configuration"""
@@ -41,17 +45,19 @@ class GroqAgent(BaseAgent):
                 self.config.settings['error_messages']['api_key_missing']
                 .format(provider='Groq')
             )
-        self.client = AsyncGroq(api_key=api_key)
+        self.client = get_registry().get_async_client('groq', api_key)
     
     def _load_config(self, config_path: str) -> GroqConfig:
         """Load Groq configuration"""
         return GroqConfig(config_path)
 
+    @tracer.traced('groq.generate_code')
     async def generate_code(self,
                           prompt_template: str,
                           requirements: str,
                           considerations: Optional[List[str]] = None,
-                          stream: bool = False) -> AgentResponse:
+                          stream: bool = False,
+                          model: Optional[str] = None) -> AgentResponse:
         """
         Generate code using Groq
         
@@ -60,7 +66,9 @@ class GroqAgent(BaseAgent):
             requirements: Code generation requirements
             considerations: Optional list of considerations
             stream: Whether to stream the response
+            model: Model to use instead of the configured default_model
         """
+        model = model or self.config.settings['default_model']
         try:
             # Get and format prompt
             template = self.get_prompt_template('code_generation')
@@ -84,11 +92,10 @@ class GroqAgent(BaseAgent):
             
             # Generate response
             if stream:
-                return await self._stream_code_generation(messages)
+                return self._stream_code_generation(messages, model)
             
-            response = await self.execute_with_retry(
-                self.client.chat.completions.create,
-                model=self.config.settings['default_model'],
+            content = await self.cached_chat_completion(
+                model=model,
                 messages=messages,
                 temperature=self.config.settings['default_temperature'],
                 max_tokens=self.config.settings['default_max_tokens'],
@@ -97,7 +104,7 @@ class GroqAgent(BaseAgent):
             )
             
             # Process response
-            result = await self.parse_json_response(response.choices[0].message.content)
+            result = await self.parse_json_response(content)
             
             if not self.validate_response_schema(result, 'code_generation'):
                 raise AgentError(
@@ -108,7 +115,7 @@ class GroqAgent(BaseAgent):
             return AgentResponse(
                 code=result['code'],
                 metadata={
-                    "model": self.config.settings['default_model'],
+                    "model": model,
                     "explanation": result.get('explanation', ''),
                     "considerations": result.get('considerations', [])
                 }
@@ -121,11 +128,13 @@ class GroqAgent(BaseAgent):
             )
 
     async def _stream_code_generation(self, 
-                                    messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+                                    messages: List[Dict[str, str]],
+                                    model: Optional[str] = None) -> AsyncIterator[str]:
         """Stream code generation response"""
+        stream = None
         try:
             stream = await self.client.chat.completions.create(
-                model=self.config.settings['default_model'],
+                model=model or self.config.settings['default_model'],
                 messages=messages,
                 temperature=self.config.settings['default_temperature'],
                 max_tokens=self.config.settings['default_max_tokens'],
@@ -140,15 +149,69 @@ class GroqAgent(BaseAgent):
                     
         except Exception as e:
             raise AgentError(f"Streaming failed: {str(e)}")
+        finally:
+            # Closing the response early stops the remaining tokens
+            # from being generated when a consumer cancels
+            if stream is not None:
+                await stream.close()
+
+    @tracer.traced('groq.generate_code_streaming')
+    async def generate_code_streaming(self,
+                                      requirements: str,
+                                      considerations: Optional[List[str]] = None,
+                                      on_statement: Optional[Callable[[ast.stmt], None]] = None,
+                                      check_imports: bool = True) -> AgentResponse:
+        """
+        Generate code while validating it as the tokens arrive
+        
+        Each top-level statement is syntax- and import-checked as soon as
+        it closes. The stream is cancelled on the first failure and a
+        StreamValidationError carrying the code received so far is raised.
+        
+        Args:
+            requirements: Code generation requirements
+            considerations: Optional list of considerations
+            on_statement: Optional callback for every validated statement
+            check_imports: Whether to resolve imports while streaming
+        """
+        template = self.get_prompt_template('code_generation_stream')
+        prompt = self.format_prompt(
+            template,
+            requirements=requirements,
+            considerations=self.format_list_items(considerations or [])
+        )
+        messages = [
+            {
+                "role": "system",
+                "content": self.config.settings['system_prompts']['base']
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+        
+        validator = StreamingCodeValidator(check_imports=check_imports,
+                                           on_statement=on_statement)
+        code = await validator.consume(self._stream_code_generation(messages))
+        
+        return AgentResponse(
+            code=code,
+            metadata={
+                "model": self.config.settings['default_model'],
+                "streamed": True,
+                "statements": validator.statement_count
+            }
+        )
 
+    @tracer.traced('groq.validate_code')
     async def validate_code(self, code: str) -> bool:
         """Validate code using Groq"""
         try:
             template = self.get_prompt_template('code_validation')
             prompt = self.format_prompt(template, code=code)
             
-            response = await self.execute_with_retry(
-                self.client.chat.completions.create,
+            content = await self.cached_chat_completion(
                 model=self.config.settings['default_model'],
                 messages=[
                     {
@@ -164,7 +227,7 @@ class GroqAgent(BaseAgent):
                 max_tokens=500
             )
             
-            result = await self.parse_json_response(response.choices[0].message.content)
+            result = await self.parse_json_response(content)
             return result.get('is_valid', False)
             
         except Exception as e:
@@ -173,10 +236,13 @@ class GroqAgent(BaseAgent):
                 .format(details=str(e))
             )
 
+    @tracer.traced('groq.improve_code')
     async def improve_code(self, 
                          code: str,
-                         aspects: List[str]) -> AgentResponse:
-        """Improve code using Groq"""
+                         aspects: List[str],
+                         model: Optional[str] = None) -> AgentResponse:
+        """Improve code using Groq, with `model` instead of default_model if given"""
+        model = model or self.config.settings['default_model']
         try:
             template = self.get_prompt_template('code_improvement')
             prompt = self.format_prompt(
@@ -185,9 +251,8 @@ class GroqAgent(BaseAgent):
                 aspects=self.format_list_items(aspects)
             )
             
-            response = await self.execute_with_retry(
-                self.client.chat.completions.create,
-                model=self.config.settings['default_model'],
+            content = await self.cached_chat_completion(
+                model=model,
                 messages=[
                     {
                         "role": "system",
@@ -202,7 +267,7 @@ class GroqAgent(BaseAgent):
                 max_tokens=self.config.settings['default_max_tokens']
             )
             
-            result = await self.parse_json_response(response.choices[0].message.content)
+            result = await self.parse_json_response(content)
             
             if not self.validate_response_schema(result, 'code_improvement'):
                 raise AgentError(
@@ -213,7 +278,7 @@ class GroqAgent(BaseAgent):
             return AgentResponse(
                 code=result['code'],
                 metadata={
-                    "model": self.config.settings['default_model'],
+                    "model": model,
                     "improvements": result.get('improvements', []),
                     "explanation": result.get('explanation', '')
                 }
@@ -241,16 +306,54 @@ class GroqAgent(BaseAgent):
             "batch_processing": self.config.settings['api_settings']['batch_processing']
         }
 
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Rate limiter shared by every batch this agent runs"""
+        if getattr(self, '_rate_limiter', None) is None:
+            self._rate_limiter = RateLimiter.from_settings(
+                self.config.settings['api_settings']
+            )
+        return self._rate_limiter
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        Rough token budget for a request: prompt plus maximum completion.
+
+        batch_generate reserves this up front and settles it against the
+        usage the provider reports once the request is done.
+        """
+        return len(text) // 4 + self.config.settings['default_max_tokens']
+
+    @tracer.traced('groq.batch_generate')
     async def batch_generate(self, 
                            prompts: List[str], 
-                           **kwargs) -> List[AgentResponse]:
-        """Batch generate code for multiple prompts"""
-        if not self.config.settings['api_settings']['batch_processing']:
+                           concurrency: Optional[int] = None,
+                           **kwargs) -> List[Union[AgentResponse, AgentError]]:
+        """
+        Batch generate code for multiple prompts
+        
+        Requests run concurrently, bounded by `concurrency` (default
+        `api_settings.batch_concurrency`) and by the requests/tokens per
+        minute limits in `api_settings`. Results are returned in input
+        order; a failed prompt yields its AgentError instead of failing
+        the whole batch.
+        """
+        api_settings = self.config.settings['api_settings']
+        if not api_settings['batch_processing']:
             raise AgentError("Batch processing not supported")
             
-        responses = []
-        for prompt in prompts:
-            response = await self.generate_code(prompt, **kwargs)
-            responses.append(response)
+        semaphore = asyncio.Semaphore(
+            concurrency or api_settings.get('batch_concurrency', 8)
+        )
+        
+        async def generate(prompt: str) -> Union[AgentResponse, AgentError]:
+            async with semaphore:
+                async with self.rate_limiter.reserve(self.estimate_tokens(prompt)):
+                    try:
+                        return await self.generate_code('code_generation', prompt, **kwargs)
+                    except AgentError as e:
+                        return e
+                    except Exception as e:
+                        return AgentError(str(e))
             
-        return responses
\ No newline at end of file
+        return await asyncio.gather(*(generate(prompt) for prompt in prompts))
@@ -0,0 +1,121 @@
+from typing import Dict, Any, Optional
+from contextlib import asynccontextmanager
+import time
+import asyncio
+import weakref
+import contextvars
+
+from .tracing import token_usage
+
+# Reservation of the request being made in this task, see RateLimiter.reserve
+_reservation: contextvars.ContextVar = contextvars.ContextVar('pycoder_token_reservation', default=None)
+
+
+class TokenBucket:
+    """Async token bucket that refills continuously at a per-minute rate"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        # asyncio locks belong to one loop, and run_sync starts a new loop
+        # per call, so waiters get a lock per loop
+        self._locks = weakref.WeakKeyDictionary()
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Wait until `amount` tokens are available and take them, returns how many were taken"""
+        # A request larger than the bucket can never fit, cap it so it
+        # waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self._get_lock():
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return amount
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def credit(self, amount: float) -> None:
+        """Return unused tokens, or take more when amount is negative (the bucket may go into debt)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Reservation:
+    """Tokens taken for a request, and what the provider reported it used"""
+
+    def __init__(self, reserved: float):
+        self.reserved = reserved
+        self.used = 0
+        # A response came back without usage, the estimate has to stand
+        self.unknown = False
+
+
+def report_usage(response: Any) -> None:
+    """Count a provider response's token usage against the current reservation"""
+    reservation = _reservation.get()
+    if reservation is None:
+        return
+    input_tokens, output_tokens = token_usage(response)
+    if input_tokens is None and output_tokens is None:
+        reservation.unknown = True
+    else:
+        reservation.used += (input_tokens or 0) + (output_tokens or 0)
+
+
+class RateLimiter:
+    """Request and token rate limits for a single provider"""
+
+    def __init__(self,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    @classmethod
+    def from_settings(cls, api_settings: Dict[str, Any]) -> 'RateLimiter':
+        """Build a limiter from the `api_settings` section of a provider YAML"""
+        return cls(
+            requests_per_minute=api_settings.get('requests_per_minute'),
+            tokens_per_minute=api_settings.get('tokens_per_minute')
+        )
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """Wait for one request slot and `tokens` tokens of budget, returns the tokens taken"""
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            return await self.tokens.acquire(tokens)
+        return 0
+
+    @asynccontextmanager
+    async def reserve(self, tokens: int = 0):
+        """
+        acquire() for the requests made inside the block, then settle up.
+
+        Responses passed to report_usage inside the block (BaseAgent does
+        this for every call) are added up; once the block exits the unused
+        part of the estimate goes back to the bucket, or an overrun is
+        taken from it. Cached responses use nothing and are fully refunded.
+        """
+        reservation = Reservation(await self.acquire(tokens))
+        reset = _reservation.set(reservation)
+        try:
+            yield reservation
+        finally:
+            _reservation.reset(reset)
+            if self.tokens is not None and reservation.reserved and not reservation.unknown:
+                self.tokens.credit(reservation.reserved - reservation.used)
@@ -0,0 +1,315 @@
+from typing import Dict, Any, Optional, Callable
+import time
+import random
+import asyncio
+import threading
+import weakref
+from email.utils import parsedate_to_datetime
+
+from tenacity import AsyncRetrying, stop_after_attempt, retry_if_exception
+
+from .tracing import tracer
+
+# Error kinds, from the point of view of whether a retry can help
+RATE_LIMITED = 'rate_limited'   # 429: slow down, the provider is fine
+OVERLOADED = 'overloaded'       # 5xx / 529: the provider is struggling
+TRANSIENT = 'transient'         # timeouts and dropped connections
+FATAL = 'fatal'                 # bad key, bad request, unknown model...
+
+RATE_LIMIT_STATUSES = {429}
+OVERLOAD_STATUSES = {500, 502, 503, 504, 529}
+TRANSIENT_STATUSES = {408, 409, 425}
+# Exception class names (anywhere in the MRO) of the SDKs' and httpx's
+# network errors, matched by name so none of them has to be imported
+TRANSIENT_EXCEPTIONS = {
+    'APIConnectionError', 'APITimeoutError', 'TimeoutException', 'TransportError',
+    'TimeoutError', 'ConnectionError',
+}
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_MIN_BACKOFF = 4
+DEFAULT_MAX_BACKOFF = 10
+# Server hints longer than this are not waited out, the error is raised
+DEFAULT_MAX_RETRY_AFTER = 60
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class CircuitOpenError(Exception):
+    """The provider failed repeatedly and is not being called for now"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"Circuit for {provider} is open after repeated failures, "
+                         f"retrying in {retry_in:.1f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an SDK or httpx error, if it has one"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def classify(error: BaseException) -> str:
+    """One of RATE_LIMITED, OVERLOADED, TRANSIENT or FATAL"""
+    status = status_code(error)
+    if status is not None:
+        if status in RATE_LIMIT_STATUSES:
+            return RATE_LIMITED
+        if status in OVERLOAD_STATUSES or status >= 500:
+            return OVERLOADED
+        if status in TRANSIENT_STATUSES:
+            return TRANSIENT
+        return FATAL
+    if any(cls.__name__ in TRANSIENT_EXCEPTIONS for cls in type(error).__mro__):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms)"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        # Retry-After may also be an HTTP date
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Stops calling a provider after failure_threshold consecutive failures.
+
+    While open every call fails fast with CircuitOpenError. After
+    reset_timeout one probe call is let through (half-open): its success
+    closes the circuit, its failure opens it again. Only OVERLOADED and
+    TRANSIENT errors count as failures; a 429 or a bad request says
+    nothing about the provider's health.
+    """
+
+    def __init__(self,
+                 provider: str,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return
+            retry_in = max(0.0, self.reset_timeout - waited)
+        tracer.count('resilience.circuit_rejections', provider=self.provider)
+        raise CircuitOpenError(self.provider, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self, kind: str) -> None:
+        with self._lock:
+            if kind not in (OVERLOADED, TRANSIENT):
+                # The probe reached the provider, which is all it had to show
+                if self._probing:
+                    self.opened_at = None
+                    self._probing = False
+                return
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    tracer.count('resilience.circuit_opened', provider=self.provider)
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def abandon_probe(self) -> None:
+        """A probe was cancelled before it could tell anything"""
+        with self._lock:
+            self._probing = False
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit for one provider.
+
+    Additive increase, multiplicative decrease, as in TCP: every success
+    raises the limit by 1/limit (about one slot per round of requests),
+    every 429 or 5xx halves it, at most once per cooldown so a burst of
+    errors from requests sent together only counts once.
+    """
+
+    def __init__(self,
+                 initial: float = DEFAULT_MAX_CONCURRENCY,
+                 min_limit: float = 1,
+                 max_limit: float = DEFAULT_MAX_CONCURRENCY,
+                 decrease_factor: float = 0.5,
+                 cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._decreased_at = float('-inf')
+        # asyncio primitives belong to one loop, and run_sync starts a new
+        # loop per call, so waiters get a condition per loop
+        self._conditions = weakref.WeakKeyDictionary()
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        condition = self._conditions.get(loop)
+        if condition is None:
+            condition = self._conditions[loop] = asyncio.Condition()
+        return condition
+
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        # Counted before taking the lock so a cancelled release cannot leak a slot
+        self.in_flight -= 1
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    async def __aenter__(self) -> 'AIMDLimiter':
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.release()
+
+    def on_success(self) -> None:
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_throttle(self) -> None:
+        now = time.monotonic()
+        if now - self._decreased_at < self.cooldown:
+            return
+        self._decreased_at = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+class Resilience:
+    """
+    Retry policy, circuit breaker and concurrency limit of one provider.
+
+    Shared by every agent of the provider (see for_provider), so they back
+    off together. Settings come from the provider's `api_settings`:
+    retry_attempts, min_backoff and max_backoff for retries, plus the
+    optional circuit_failure_threshold, circuit_reset_timeout and
+    batch_concurrency (the ceiling of the adaptive limit).
+    """
+
+    _instances: Dict[str, 'Resilience'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, provider: str, api_settings: Optional[Dict[str, Any]] = None):
+        api_settings = api_settings or {}
+        self.provider = provider
+        self.attempts = api_settings.get('retry_attempts', DEFAULT_RETRY_ATTEMPTS)
+        self.min_backoff = api_settings.get('min_backoff', DEFAULT_MIN_BACKOFF)
+        self.max_backoff = api_settings.get('max_backoff', DEFAULT_MAX_BACKOFF)
+        self.max_retry_after = api_settings.get('max_retry_after', DEFAULT_MAX_RETRY_AFTER)
+        self.breaker = CircuitBreaker(
+            provider,
+            api_settings.get('circuit_failure_threshold', DEFAULT_FAILURE_THRESHOLD),
+            api_settings.get('circuit_reset_timeout', DEFAULT_RESET_TIMEOUT)
+        )
+        max_concurrency = api_settings.get('batch_concurrency', DEFAULT_MAX_CONCURRENCY)
+        self.limiter = AIMDLimiter(initial=max_concurrency, max_limit=max_concurrency)
+
+    @classmethod
+    def for_provider(cls, provider: str, api_settings: Optional[Dict[str, Any]] = None) -> 'Resilience':
+        """Shared instance for a provider, built from the first settings seen"""
+        with cls._instances_lock:
+            if provider not in cls._instances:
+                cls._instances[provider] = cls(provider, api_settings)
+            return cls._instances[provider]
+
+    def should_retry(self, error: BaseException) -> bool:
+        if isinstance(error, CircuitOpenError) or classify(error) == FATAL:
+            return False
+        hint = retry_after(error)
+        return hint is None or hint <= self.max_retry_after
+
+    def wait(self, retry_state) -> float:
+        """Seconds before the next attempt: the server's hint, else jittered exponential"""
+        error = retry_state.outcome.exception()
+        hint = retry_after(error) if error is not None else None
+        if hint is not None:
+            return hint
+        ceiling = min(self.max_backoff, self.min_backoff * 2 ** (retry_state.attempt_number - 1))
+        return random.uniform(self.min_backoff, max(self.min_backoff, ceiling))
+
+    def retrying(self, before_sleep: Optional[Callable] = None) -> AsyncRetrying:
+        """tenacity AsyncRetrying configured with this policy"""
+        return AsyncRetrying(
+            stop=stop_after_attempt(self.attempts),
+            wait=self.wait,
+            retry=retry_if_exception(self.should_retry),
+            before_sleep=before_sleep,
+            reraise=True
+        )
+
+    async def call(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """One attempt: through the circuit breaker and the concurrency limit"""
+        self.breaker.before_call()
+        async with self.limiter:
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                kind = classify(e)
+                self.breaker.record_failure(kind)
+                if kind in (RATE_LIMITED, OVERLOADED):
+                    self.limiter.on_throttle()
+                tracer.count('resilience.errors', provider=self.provider, kind=kind)
+                raise
+            except BaseException:
+                # Cancelled: free the half-open probe slot for the next call
+                self.breaker.abandon_probe()
+                raise
+        self.breaker.record_success()
+        self.limiter.on_success()
+        return result
@@ -0,0 +1,191 @@
+from typing import Dict, Any, Optional, Callable, Awaitable
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+from .tracing import tracer
+
+DEFAULT_CACHE_PATH = os.getenv(
+    'PYCODER_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pycoder', 'responses.sqlite')
+)
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    Persistent, size-bounded LRU cache for LLM responses.
+
+    Entries are keyed by a SHA-256 of the model, temperature, max_tokens,
+    any extra request parameters and the fully formatted prompt, and are
+    stored in a SQLite database so they survive notebook restarts.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_CACHE_PATH,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so constructing a cache costs nothing
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access "
+                "ON responses (last_access)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(model: Optional[str],
+                 temperature: Optional[float],
+                 max_tokens: Optional[int],
+                 prompt: Any,
+                 **extra: Any) -> str:
+        """Hash the request parameters into a cache key"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "prompt": prompt,
+                "extra": extra
+            },
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                tracer.count('cache.misses')
+                return None
+            conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            conn.commit()
+            self.hits += 1
+            tracer.count('cache.hits')
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response and evict least recently used entries if needed"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), time.time())
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        entries, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        )
+        stale = []
+        for key, size in rows:
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            stale.append((key,))
+            entries -= 1
+            total_bytes -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def get_or_compute(self,
+                       compute: Callable[[], str],
+                       bypass: bool = False,
+                       **key_params: Any) -> str:
+        """Return a cached response or call compute() and cache its result"""
+        if bypass:
+            return compute()
+        key = self.make_key(**key_params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    async def aget_or_compute(self,
+                              compute: Callable[[], Awaitable[str]],
+                              bypass: bool = False,
+                              **key_params: Any) -> str:
+        """Async variant of get_or_compute for coroutine-based clients"""
+        if bypass:
+            return await compute()
+        key = self.make_key(**key_params)
+        value = self.get(key)
+        if value is None:
+            value = await compute()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics for this process plus the current cache size"""
+        with self._lock:
+            entries, total_bytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total_bytes
+        }
+
+    def delete(self, key: str) -> None:
+        """Remove one cached response, if present"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+
+    def clear(self) -> None:
+        """Remove every cached response"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,239 @@
+from typing import Dict, Any, Optional, List
+from collections import deque
+from pathlib import Path
+import time
+import asyncio
+
+from .base_agent import BaseAgent, BaseAgentConfig, AgentError, AgentResponse
+from .tracing import tracer
+
+ROUTER_SETTINGS_PATH = Path(__file__).parent / 'router_settings.yaml'
+# Until real samples exist the p95 is assumed to be this multiple of the prior
+PRIOR_TAIL_FACTOR = 2.0
+
+
+class RouterConfig(BaseAgentConfig):
+    """Router-specific configuration"""
+    def __init__(self, config_path: str):
+        super().__init__(config_path)
+        if 'router' not in self.provider_settings:
+            raise AgentError("Missing required router config: router")
+
+
+class LatencyTracker:
+    """
+    Rolling latency percentiles and error rate of one routed agent
+
+    Requests cancelled before they finished (hedge losers) are kept apart
+    as lower bounds: a bound above a percentile says the agent is slower
+    than measured and raises it, one below says nothing and is ignored.
+    """
+
+    def __init__(self, name: str, prior: float, context_length: Optional[int], window: int, min_samples: int):
+        self.name = name
+        self.prior = prior
+        self.context_length = context_length
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.censored = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self.outcomes.append(True)
+
+    def record_cancelled(self, seconds: float) -> None:
+        """A request was abandoned after `seconds`, it would have taken longer"""
+        self.censored.append(seconds)
+
+    def record_failure(self) -> None:
+        self.outcomes.append(False)
+
+    @staticmethod
+    def _quantile(ordered: List[float], q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def percentile(self, q: float) -> float:
+        if len(self.latencies) < self.min_samples:
+            # Cold start: trust what the provider's settings claim
+            return self.prior if q <= 0.5 else self.prior * PRIOR_TAIL_FACTOR
+        ordered = sorted(self.latencies)
+        measured = self._quantile(ordered, q)
+        above = [seconds for seconds in self.censored if seconds > measured]
+        if not above:
+            return measured
+        return self._quantile(sorted(ordered + above), q)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def expected_latency(self) -> float:
+        # Median latency, inflated by how often the provider fails
+        return self.percentile(0.5) * (1 + self.error_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "samples": len(self.latencies),
+            "cancelled": len(self.censored),
+            "error_rate": self.error_rate
+        }
+
+
+class RouterAgent(BaseAgent):
+    """
+    Routes every request to the fastest healthy agent among several
+
+    Each agent's latency is tracked over a rolling window; until enough
+    samples exist the response_time from its get_capabilities() is used.
+    Agents whose circuit breaker is open, or whose context_length is too
+    small for the request, are skipped. When the chosen agent has not
+    answered by its p95 latency, the same request is sent to the next
+    agent, the first answer wins and the other request is cancelled. A
+    failed request falls over to the next agent straight away.
+    """
+
+    def __init__(self,
+                 agents: List[BaseAgent],
+                 config_path: str = ROUTER_SETTINGS_PATH,
+                 cache=None):
+        if not agents:
+            raise AgentError("RouterAgent needs at least one agent")
+        self.agents = list(agents)
+        super().__init__(config_path, cache)
+        router_settings = self.settings['router']
+        self.hedge_quantile = router_settings.get('hedge_quantile', 0.95)
+        self.hedge_multiplier = router_settings.get('hedge_multiplier', 1.0)
+        self.min_hedge_delay = router_settings.get('min_hedge_delay', 0.05)
+        self.trackers = {}
+        for agent in self.agents:
+            capabilities = agent.get_capabilities()
+            self.trackers[agent] = LatencyTracker(
+                f"{capabilities.get('provider', agent.provider_name)}:{capabilities.get('model', '')}",
+                capabilities.get('response_time') or router_settings.get('default_response_time', 5.0),
+                capabilities.get('context_length'),
+                router_settings.get('window', 100),
+                router_settings.get('min_samples', 5)
+            )
+
+    def setup_client(self):
+        """The router calls its agents, it has no client of its own"""
+        self.client = None
+
+    def _load_config(self, config_path: str) -> RouterConfig:
+        """Load router configuration"""
+        return RouterConfig(config_path)
+
+    @staticmethod
+    def _healthy(agent: BaseAgent) -> bool:
+        breaker = getattr(getattr(agent, 'resilience', None), 'breaker', None)
+        return breaker is None or breaker.state != 'open'
+
+    def candidates(self, tokens: int = 0) -> List[BaseAgent]:
+        """Agents able to take a request of `tokens` tokens, fastest first"""
+        fitting = [
+            agent for agent in self.agents
+            if (self.trackers[agent].context_length or tokens) >= tokens
+        ] or self.agents
+        healthy = [agent for agent in fitting if self._healthy(agent)] or fitting
+        return sorted(healthy, key=lambda agent: self.trackers[agent].expected_latency)
+
+    def hedge_delay(self, agent: BaseAgent) -> float:
+        """How long to wait for agent before sending a duplicate elsewhere"""
+        return max(self.min_hedge_delay,
+                   self.trackers[agent].percentile(self.hedge_quantile) * self.hedge_multiplier)
+
+    async def _timed(self, agent: BaseAgent, method: str, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            result = await getattr(agent, method)(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Not a finished sample: the loser would have taken longer
+            self.trackers[agent].record_cancelled(time.monotonic() - start)
+            raise
+        except Exception:
+            self.trackers[agent].record_failure()
+            raise
+        self.trackers[agent].record(time.monotonic() - start)
+        return result
+
+    @staticmethod
+    def _discard(task: asyncio.Task) -> None:
+        task.cancel()
+        # Retrieve the outcome so a late failure is not reported as unhandled
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def route(self, method: str, *args, tokens: int = 0, **kwargs):
+        """Call `method` on the best agent, hedging and failing over as needed"""
+        queue = self.candidates(tokens)
+        with tracer.span('router.route', method=method) as span:
+            running = {}
+            last_error = None
+            try:
+                while queue or running:
+                    if not running:
+                        agent = queue.pop(0)
+                        running[asyncio.ensure_future(self._timed(agent, method, *args, **kwargs))] = agent
+                        span.set('provider', self.trackers[agent].name)
+                        deadline = self.hedge_delay(agent)
+                    else:
+                        deadline = None
+                    done, _ = await asyncio.wait(
+                        running, timeout=deadline if queue else None, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not done:
+                        # The first agent is slower than usual: race a duplicate
+                        agent = queue.pop(0)
+                        running[asyncio.ensure_future(self._timed(agent, method, *args, **kwargs))] = agent
+                        span.increment('hedges')
+                        tracer.count('router.hedges', provider=self.trackers[agent].name)
+                        continue
+                    for task in done:
+                        agent = running.pop(task)
+                        if task.exception() is None:
+                            span.set('winner', self.trackers[agent].name)
+                            tracer.count('router.wins', provider=self.trackers[agent].name)
+                            return task.result()
+                        last_error = task.exception()
+                        span.increment('failovers')
+            finally:
+                # The loser of a hedge, or everything if the caller gave up
+                for task in running:
+                    self._discard(task)
+            raise last_error if isinstance(last_error, AgentError) else AgentError(f"All providers failed: {last_error}")
+
+    @tracer.traced('router.generate_code')
+    async def generate_code(self,
+                            prompt_template: str,
+                            requirements: str,
+                            considerations: Optional[List[str]] = None) -> AgentResponse:
+        """Generate code with the fastest healthy agent"""
+        return await self.route('generate_code', prompt_template, requirements, considerations,
+                                tokens=len(requirements) // 4)
+
+    @tracer.traced('router.validate_code')
+    async def validate_code(self, code: str) -> bool:
+        """Validate code with the fastest healthy agent"""
+        return await self.route('validate_code', code, tokens=len(code) // 4)
+
+    @tracer.traced('router.improve_code')
+    async def improve_code(self, code: str, aspects: List[str]) -> AgentResponse:
+        """Improve code with the fastest healthy agent"""
+        return await self.route('improve_code', code, aspects, tokens=len(code) // 4)
+
+    def get_capabilities(self) -> Dict[str, Any]:
+        """Capabilities of the routed agents, with their current latencies"""
+        capabilities = [agent.get_capabilities() for agent in self.agents]
+        return {
+            "provider": "router",
+            "providers": [tracker.name for tracker in self.trackers.values()],
+            "context_length": max((c.get('context_length') or 0) for c in capabilities),
+            "best_for": sorted({item for c in capabilities for item in c.get('best_for', ())}),
+            "response_time": min(tracker.expected_latency for tracker in self.trackers.values()),
+            "latency": {tracker.name: tracker.stats() for tracker in self.trackers.values()}
+        }
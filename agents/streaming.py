@@ -0,0 +1,195 @@
+from typing import Dict, List, Optional, Callable, AsyncIterator
+import ast
+import importlib.util
+
+from .base_agent import AgentError
+
+# SyntaxError messages that only mean "more source is still on its way"
+INCOMPLETE_MARKERS = (
+    'was never closed',
+    'unexpected EOF',
+    'unterminated triple-quoted string',
+    'expected an indented block',
+)
+
+# Column-zero lines that continue the previous statement instead of starting one
+CONTINUATION_KEYWORDS = ('else', 'elif', 'except', 'finally', 'case')
+
+
+class StreamValidationError(AgentError):
+    """Raised when streamed code fails a static check before the stream ends"""
+    def __init__(self, message: str, source: str):
+        super().__init__(message)
+        self.source = source
+
+
+class IncrementalCodeParser:
+    """
+    Assemble streamed text into complete top-level Python statements.
+
+    Chunks are buffered until a full line arrives, and a pending block is
+    parsed once the next top-level line starts, so each statement is
+    emitted as soon as it is closed. Once a Markdown fence appears only
+    the lines inside fences are code: prose before the first fence and
+    between or after fenced blocks is dropped. Until then lines are held
+    back, and a reply without any fence is parsed as code when it ends.
+    """
+
+    def __init__(self):
+        self.source = ''
+        self._partial_line = ''
+        self._block: List[str] = []
+        self._block_start = 1
+        self._seen_fence = False
+        self._in_fence = False
+        self._unfenced: List[str] = []
+
+    def feed(self, chunk: str) -> List[ast.stmt]:
+        """Add a chunk and return any statements it completed"""
+        text = self._partial_line + chunk
+        *lines, self._partial_line = text.split('\n')
+        statements = []
+        for line in lines:
+            statements.extend(self._add_line(line))
+        return statements
+
+    def finish(self) -> List[ast.stmt]:
+        """Flush the remaining buffer at the end of the stream"""
+        statements = []
+        if self._partial_line:
+            statements.extend(self._add_line(self._partial_line))
+            self._partial_line = ''
+        if not self._seen_fence:
+            # No fence at all: the whole reply is code
+            for line in self._unfenced:
+                statements.extend(self._add_code_line(line))
+            self._unfenced = []
+        if self._block:
+            statements.extend(self._parse_block(final=True))
+        return statements
+
+    def _add_line(self, line: str) -> List[ast.stmt]:
+        if line.lstrip().startswith('```'):
+            if not self._seen_fence:
+                # Whatever came before the first fence was prose
+                self._seen_fence = True
+                self._unfenced = []
+            self._in_fence = not self._in_fence
+            return []
+        if not self._seen_fence:
+            self._unfenced.append(line)
+            return []
+        if not self._in_fence:
+            return []
+        return self._add_code_line(line)
+
+    def _add_code_line(self, line: str) -> List[ast.stmt]:
+        statements = []
+        if self._block and self._starts_statement(line):
+            statements = self._parse_block(final=False)
+        self._block.append(line)
+        return statements
+
+    def _starts_statement(self, line: str) -> bool:
+        if not line or line[0].isspace() or line.startswith('#'):
+            return False
+        words = line.split(':')[0].split()
+        if words and words[0] in CONTINUATION_KEYWORDS:
+            return False
+        if line[0] in ')]}':
+            return False
+        # A decorator belongs to the definition that follows it
+        previous = [l for l in self._block if l.strip()]
+        return not (previous and previous[-1].startswith('@'))
+
+    def _parse_block(self, final: bool) -> List[ast.stmt]:
+        block = '\n'.join(self._block) + '\n'
+        try:
+            tree = ast.parse(block)
+        except SyntaxError as e:
+            if not final and any(marker in str(e.msg) for marker in INCOMPLETE_MARKERS):
+                # Still inside a bracket or string, keep accumulating
+                return []
+            lineno = (e.lineno or 1) + self._block_start - 1
+            raise StreamValidationError(
+                f"Syntax error on line {lineno}: {e.msg}", self.source + block
+            )
+        for node in ast.walk(tree):
+            if hasattr(node, 'lineno'):
+                node.lineno += self._block_start - 1
+                if getattr(node, 'end_lineno', None):
+                    node.end_lineno += self._block_start - 1
+        self.source += block
+        self._block_start += len(self._block)
+        self._block = []
+        return tree.body
+
+
+def unresolved_imports(statement: ast.stmt,
+                       cache: Optional[Dict[str, bool]] = None) -> List[str]:
+    """Return the top-level modules imported by statement that can't be found"""
+    if isinstance(statement, ast.Import):
+        names = [alias.name for alias in statement.names]
+    elif isinstance(statement, ast.ImportFrom) and not statement.level:
+        names = [statement.module]
+    else:
+        return []
+
+    cache = {} if cache is None else cache
+    missing = []
+    for name in names:
+        root = name.split('.')[0]
+        if root not in cache:
+            try:
+                cache[root] = importlib.util.find_spec(root) is not None
+            except (ImportError, ValueError):
+                cache[root] = False
+        if not cache[root]:
+            missing.append(root)
+    return missing
+
+
+class StreamingCodeValidator:
+    """
+    Consume a stream of code chunks, checking each statement as it closes.
+
+    Every completed top-level statement is checked for syntax and import
+    resolution. On the first failure the stream is closed, so a doomed
+    generation stops consuming output tokens, and StreamValidationError
+    is raised.
+    """
+
+    def __init__(self,
+                 check_imports: bool = True,
+                 on_statement: Optional[Callable[[ast.stmt], None]] = None):
+        self.check_imports = check_imports
+        self.on_statement = on_statement
+        self.parser = IncrementalCodeParser()
+        self.statement_count = 0
+        self._import_cache: Dict[str, bool] = {}
+
+    def _check(self, statements: List[ast.stmt]):
+        for statement in statements:
+            if self.check_imports:
+                missing = unresolved_imports(statement, self._import_cache)
+                if missing:
+                    raise StreamValidationError(
+                        f"Unresolvable import on line {statement.lineno}: "
+                        f"{', '.join(missing)}",
+                        self.parser.source
+                    )
+            self.statement_count += 1
+            if self.on_statement is not None:
+                self.on_statement(statement)
+
+    async def consume(self, chunks: AsyncIterator[str]) -> str:
+        """Validate a chunk stream and return the complete source"""
+        try:
+            async for chunk in chunks:
+                self._check(self.parser.feed(chunk))
+            self._check(self.parser.finish())
+        except StreamValidationError:
+            if hasattr(chunks, 'aclose'):
+                await chunks.aclose()
+            raise
+        return self.parser.source
@@ -0,0 +1,326 @@
+from typing import Dict, Any, Optional, List, Tuple
+import re
+import json
+import time
+import functools
+import itertools
+import threading
+import contextvars
+
+# inspect.CO_COROUTINE, without importing inspect
+CO_COROUTINE = 0x80
+
+
+class Span:
+    """
+    A timed operation with attributes, nested under the active span.
+
+    start and end are wall-clock timestamps for display; duration is
+    measured with time.perf_counter so clock adjustments don't skew it.
+    """
+    __slots__ = ('name', 'span_id', 'parent_id', 'attributes', 'start', 'end', 'duration',
+                 'error', '_started', '_token')
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = 0.0
+        self.end = 0.0
+        self.duration = 0.0
+        self.error = None
+        self._started = 0.0
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def increment(self, key: str, value: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """Shared stand-in returned while tracing is disabled"""
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def increment(self, key, value=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar('pycoder_span', default=None)
+
+
+class _ActiveSpan:
+    __slots__ = ('tracer', 'span')
+
+    def __init__(self, tracer: 'Tracer', span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.span._token = _current_span.set(self.span)
+        self.span.start = time.time()
+        self.span._started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, tb):
+        span = self.span
+        span.duration = time.perf_counter() - span._started
+        span.end = span.start + span.duration
+        if exc_value is not None:
+            span.error = f"{exc_type.__name__}: {exc_value}"
+        _current_span.reset(span._token)
+        self.tracer._export_span(span)
+        return False
+
+
+class Tracer:
+    """
+    Lightweight spans and counters with pluggable exporters.
+
+    Disabled by default: span() then hands back a shared no-op object and
+    count() returns immediately, so instrumented code pays one attribute
+    check per call.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.exporters: List[Any] = []
+        self._ids = itertools.count(1)
+
+    def enable(self, *exporters):
+        """Turn tracing on, adding exporters (an InMemoryExporter by default)"""
+        self.exporters.extend(exporters or [InMemoryExporter()])
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        self.exporters = []
+
+    def span(self, name: str, **attributes):
+        """Context manager timing a block as a span"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        span = Span(name, next(self._ids), parent.span_id if parent else None, attributes)
+        return _ActiveSpan(self, span)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Add value to a counter; labels that are None are left out"""
+        if not self.enabled:
+            return
+        labels = {key: label for key, label in labels.items() if label is not None}
+        for exporter in self.exporters:
+            exporter.export_counter(name, value, labels)
+
+    def current_span(self):
+        """Innermost active span, or the no-op span"""
+        return _current_span.get() or NOOP_SPAN
+
+    def _export_span(self, span: Span):
+        for exporter in self.exporters:
+            exporter.export_span(span)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator wrapping a sync or async function in a span"""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            if func.__code__.co_flags & CO_COROUTINE:
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def token_usage(response: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(input, output) token counts from a provider or llama_index response"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        raw = getattr(response, 'raw', None)
+        usage = raw.get('usage') if isinstance(raw, dict) else getattr(raw, 'usage', None)
+    if usage is None:
+        return None, None
+    if isinstance(usage, dict):
+        get = usage.get
+    else:
+        get = lambda key: getattr(usage, key, None)
+    input_tokens = get('prompt_tokens') or get('input_tokens')
+    output_tokens = get('completion_tokens') or get('output_tokens')
+    return input_tokens, output_tokens
+
+
+def record_usage(span: Any, response: Any, **labels):
+    """Attach token usage from a response to a span and the token counters"""
+    if not tracer.enabled:
+        return
+    input_tokens, output_tokens = token_usage(response)
+    if input_tokens is not None:
+        span.set('input_tokens', input_tokens)
+        tracer.count('llm.input_tokens', input_tokens, **labels)
+    if output_tokens is not None:
+        span.set('output_tokens', output_tokens)
+        tracer.count('llm.output_tokens', output_tokens, **labels)
+
+
+class InMemoryExporter:
+    """Keeps spans and counter totals in memory, handy for notebooks and tests"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self._lock = threading.Lock()
+
+    def export_span(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, total and mean duration per span name"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            entry = totals.setdefault(span.name, {"count": 0, "total": 0.0})
+            entry["count"] += 1
+            entry["total"] += span.duration
+        for entry in totals.values():
+            entry["mean"] = entry["total"] / entry["count"]
+        return totals
+
+
+class JsonlExporter:
+    """Appends one JSON line per finished span or counter increment"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    def export_span(self, span: Span):
+        self._write({"type": "span", **span.to_dict()})
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]):
+        self._write({"type": "counter", "name": name, "value": value,
+                     "labels": labels, "time": time.time()})
+
+
+class PrometheusExporter:
+    """Aggregates counters and span durations into Prometheus text format"""
+
+    def __init__(self, namespace: str = 'pycoder'):
+        self.namespace = namespace
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def export_span(self, span: Span):
+        with self._lock:
+            entry = self.durations.setdefault(span.name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += span.duration
+            if span.error:
+                entry[2] += 1
+
+    def export_counter(self, name: str, value: float, labels: Dict[str, Any]):
+        # Exposition label values are strings, keying on them keeps render's sort well defined
+        key = (name, tuple(sorted((label, str(item)) for label, item in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def _metric(self, name: str) -> str:
+        return f"{self.namespace}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+    @staticmethod
+    def _escape(value: Any) -> str:
+        # Label values may not contain raw backslashes, quotes or newlines
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @classmethod
+    def _labels(cls, labels) -> str:
+        if not labels:
+            return ''
+        pairs = ','.join(f'{key}="{cls._escape(value)}"' for key, value in labels)
+        return '{' + pairs + '}'
+
+    def render(self) -> str:
+        """The current metrics in Prometheus exposition format"""
+        lines = []
+        with self._lock:
+            durations = dict(self.durations)
+            counters = dict(self.counters)
+
+        metric = self._metric('span_duration_seconds')
+        lines.append(f"# TYPE {metric} summary")
+        for name, (count, total, _) in sorted(durations.items()):
+            lines.append(f'{metric}_sum{self._labels([("span", name)])} {total}')
+            lines.append(f'{metric}_count{self._labels([("span", name)])} {count}')
+        metric = self._metric('span_errors_total')
+        lines.append(f"# TYPE {metric} counter")
+        for name, (_, _, errors) in sorted(durations.items()):
+            lines.append(f'{metric}{self._labels([("span", name)])} {errors}')
+
+        declared = set()
+        for (name, labels), value in sorted(counters.items()):
+            metric = self._metric(name) + '_total'
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{self._labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Write the metrics to a file, e.g. for the node exporter textfile collector"""
+        with open(path, 'w') as f:
+            f.write(self.render())
+
+
+tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer"""
+    return tracer
@@ -0,0 +1,183 @@
+"""
+Benchmark for the single-pass analyzer behind extract_functions and
+analyze_python_content.
+
+Builds a synthetic module of a few thousand lines (nested functions,
+classes, many returns), checks that the new views return exactly what the
+previous ast.walk-based implementations did, and reports the speedup.
+
+    python benchmarks/bench_analysis.py [--functions 400] [--repeat 5]
+"""
+import os
+import sys
+import ast
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coding_agents import extract_functions, analyze_python_content
+
+
+def make_module(n_functions):
+    blocks = ['import os', 'import json', '']
+    for i in range(n_functions):
+        blocks.append(f"""
+def outer_{i}(a, b, c=None):
+    \"\"\"Function {i}\"\"\"
+    def inner_{i}(x):
+        if x:
+            return x
+        return a, b
+    total = inner_{i}(a)
+    for item in range(b):
+        total += item
+    if c is None:
+        return total
+    return total, c
+
+class Holder{i}:
+    def get(self, key):
+        value = json.dumps(key)
+        return value
+
+    def put(self, key, value):
+        def check(v):
+            return v
+        return check(value)
+""")
+    return '\n'.join(blocks)
+
+
+# Previous implementations, kept as the baseline and equivalence oracle
+def legacy_extract_functions(code_string):
+    try:
+        # Parse code string into AST
+        tree = ast.parse(code_string)
+        
+        functions = {}
+        
+        # Walk through AST nodes
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef):
+                # Get function name
+                func_name = node.name
+                
+                # Get input arguments
+                args = []
+                for arg in node.args.args:
+                    args.append(arg.arg)
+                    
+                # Find return statements
+                returns = []
+                for child in ast.walk(node):
+                    if isinstance(child, ast.Return):
+                        # Extract return value
+                        if isinstance(child.value, ast.Name):
+                            returns.append(child.value.id)
+                        elif isinstance(child.value, ast.Tuple):
+                            for elt in child.value.elts:
+                                if isinstance(elt, ast.Name):
+                                    returns.append(elt.id)
+                
+                # Store in dictionary
+                functions[func_name] = {
+                    'arguments': args,
+                    'returns': returns
+                }
+                
+        return functions
+        
+    except SyntaxError:
+        return "Invalid Python code"
+    except Exception as e:
+        return f"Error parsing code: {str(e)}"
+
+def legacy_analyze_python_content(content):
+    try:
+        # Read the file content
+            
+        # Parse the Python code into an AST
+        tree = ast.parse(content)
+        
+        # Dictionary to store function details
+        functions = []
+        
+        # Find all function definitions
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef):
+                # Get function name
+                func_name = node.name
+                # print(f"Found function: {func_name}")
+                
+                # Get original function code
+                func_lines = content.split('\n')[node.lineno-1:node.end_lineno]
+                original_func = '\n'.join(func_lines)
+                
+                # Get function header (first line)
+                header = func_lines[0]
+                
+                # Get arguments
+                args = []
+                for arg in node.args.args:
+                    args.append(arg.arg)
+                    
+                # Find return statements
+                returns = []
+                for child in ast.walk(node):
+                    if isinstance(child, ast.Return):
+                        return_line = content.split('\n')[child.lineno-1].strip()
+                        returns.append(return_line)
+                
+                # Store in dictionary
+                functions.append({
+                    'original': original_func,
+                    'header': header,
+                    'arguments': args,
+                    'returns': returns
+                }
+                )
+        return functions
+        
+    except SyntaxError:
+        print(f"Error: Invalid Python syntax in")
+        return None
+    except Exception as e:
+        print(f"Error analyzing file: {str(e)}")
+        return None
+
+
+
+def best_of(func, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="extract_functions/analyze_python_content benchmark")
+    parser.add_argument('--functions', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = make_module(args.functions)
+    print(f"module: {content.count(chr(10)) + 1} lines, {args.functions * 5} functions")
+
+    for name, new, old in [
+        ('extract_functions', extract_functions, legacy_extract_functions),
+        ('analyze_python_content', analyze_python_content, legacy_analyze_python_content),
+    ]:
+        old_time, old_result = best_of(old, content, args.repeat)
+        new_time, new_result = best_of(new, content, args.repeat)
+        if old_result != new_result:
+            print(f"{name}: results differ from the previous implementation")
+            sys.exit(1)
+        print(f"{name}: {old_time * 1000:.1f} ms -> {new_time * 1000:.1f} ms "
+              f"({old_time / new_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
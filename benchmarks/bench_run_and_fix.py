@@ -0,0 +1,244 @@
+"""
+Benchmark for the generate -> run -> fix loop against a local mock LLM.
+
+Replays benchmarks/recordings.json with configurable latency, so no API
+credits are spent, and reports p50/p95 end-to-end latency, fix iterations,
+script execution time and peak memory for:
+
+- run_and_fix, in-process execution
+- run_and_fix, fix_mode='patch' (diff replies instead of full rewrites)
+- run_and_fix, SandboxPool execution
+- run_and_fix_many, concurrent batch
+- arun_and_fix, every task gathered on one event loop
+- astream_run_and_fix, time to the first streamed event against the
+  time to the finished run (what a user of gardio_app waits for)
+- GroqAgent / batch_generate over a mock chat-completions client
+  (skipped when the groq SDK is not installed)
+- RouterAgent over two mock providers, one fast with latency spikes and
+  one slower but steady, against the spiky one alone
+
+    python benchmarks/bench_run_and_fix.py [--repeat 5] [--latency 0.05]
+"""
+import os
+import sys
+import math
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import coding_agents
+from mock_llm import Recordings, Latency, MockLLM, MockChatClient
+
+RECORDINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings.json')
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return float('nan')
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class TimingExecutor:
+    """run_code executor that records how long each execution takes"""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.timings = []
+
+    def run(self, code_string):
+        start = time.perf_counter()
+        if self.inner is None:
+            result = coding_agents.run_code(code_string)
+        else:
+            result = self.inner.run(code_string)
+        self.timings.append(time.perf_counter() - start)
+        return result
+
+
+def report(name, latencies, fix_iterations=None, exec_timings=None, peak_bytes=None, wall=None, count=None, tail=False):
+    line = (f"{name:<32} n={len(latencies):<4} "
+            f"p50={percentile(latencies, 50) * 1000:8.1f} ms  "
+            f"p95={percentile(latencies, 95) * 1000:8.1f} ms")
+    if tail:
+        line += f"  p99={percentile(latencies, 99) * 1000:8.1f} ms"
+    if fix_iterations:
+        line += f"  fixes/task={sum(fix_iterations) / len(fix_iterations):.2f}"
+    if exec_timings:
+        line += (f"  exec p50={percentile(exec_timings, 50) * 1000:.2f} ms"
+                 f" p95={percentile(exec_timings, 95) * 1000:.2f} ms")
+    if wall is not None:
+        line += f"  wall={wall:.2f} s ({(count or len(latencies)) / wall:.1f} tasks/s)"
+    if peak_bytes is not None:
+        line += f"  peak={peak_bytes / 1024 / 1024:.1f} MiB"
+    print(line)
+
+
+def bench_run_and_fix(name, tasks, llm, repeat, inner=None, fix_mode='rewrite'):
+    executor = TimingExecutor(inner)
+    latencies, fix_iterations = [], []
+    for _ in range(repeat):
+        for task in tasks:
+            start = time.perf_counter()
+            results = coding_agents.run_and_fix(task, llm=llm, executor=executor, cache=None, fix_mode=fix_mode)
+            latencies.append(time.perf_counter() - start)
+            fix_iterations.append(results[-1]['fix_iterations'])
+
+    # Separate traced pass so tracemalloc overhead doesn't skew latency
+    tracemalloc.start()
+    for task in tasks:
+        coding_agents.run_and_fix(task, llm=llm, executor=executor, cache=None, fix_mode=fix_mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report(name, latencies, fix_iterations, executor.timings, peak)
+
+
+async def bench_run_and_fix_many(tasks, llm, repeat, concurrency, executor):
+    batch = tasks * repeat
+    latencies, fix_iterations = [], []
+    start = time.perf_counter()
+    async for _, results in coding_agents.run_and_fix_many(
+            batch, concurrency=concurrency, llm=llm, executor=executor, cache=None):
+        latencies.append(time.perf_counter() - start)
+        fix_iterations.append(results[-1]['fix_iterations'])
+    wall = time.perf_counter() - start
+    report(f"run_and_fix_many (c={concurrency})", latencies, fix_iterations, wall=wall)
+
+
+async def bench_arun_and_fix(tasks, llm, repeat, executor):
+    batch = tasks * repeat
+    latencies = []
+
+    async def timed(task):
+        start = time.perf_counter()
+        results = await coding_agents.arun_and_fix(task, llm=llm, executor=executor, cache=None)
+        latencies.append(time.perf_counter() - start)
+        return results
+
+    start = time.perf_counter()
+    all_results = await asyncio.gather(*(timed(task) for task in batch))
+    wall = time.perf_counter() - start
+    report(f"arun_and_fix (gather x{len(batch)})", latencies,
+           [results[-1]['fix_iterations'] for results in all_results], wall=wall)
+
+
+async def bench_astream_run_and_fix(tasks, llm, repeat, executor):
+    first_event, finished = [], []
+    for task in tasks * repeat:
+        start = time.perf_counter()
+        first = None
+        async for event in coding_agents.astream_run_and_fix(task, llm=llm, executor=executor, cache=None):
+            if first is None:
+                first = time.perf_counter() - start
+        first_event.append(first)
+        finished.append(time.perf_counter() - start)
+    report("astream_run_and_fix first event", first_event)
+    report("astream_run_and_fix finished", finished)
+
+
+async def bench_groq_agent(recordings, latency, repeat):
+    try:
+        from agents.groq_agent import GroqAgent
+        from agents.rate_limit import RateLimiter
+    except ImportError as e:
+        print(f"{'GroqAgent':<32} skipped ({e})")
+        return
+
+    client = MockChatClient(recordings, latency)
+
+    class MockGroqAgent(GroqAgent):
+        def setup_client(self):
+            self.client = client
+
+    agent = MockGroqAgent(os.path.join(ROOT, 'agents', 'groq_settings.yaml'))
+    # The mock has no provider quota, measure scheduling rather than waiting
+    agent._rate_limiter = RateLimiter()
+    tasks = recordings.task_descriptions()
+
+    latencies = []
+    for _ in range(repeat):
+        for task in tasks:
+            start = time.perf_counter()
+            await agent.generate_code('code_generation', task)
+            latencies.append(time.perf_counter() - start)
+    report("GroqAgent.generate_code", latencies)
+
+    start = time.perf_counter()
+    await agent.batch_generate(tasks * repeat)
+    wall = time.perf_counter() - start
+    report("GroqAgent.batch_generate", [wall], wall=wall, count=len(tasks) * repeat)
+
+
+async def bench_router(recordings, latency, repeat):
+    try:
+        from agents.groq_agent import GroqAgent
+        from agents.router_agent import RouterAgent
+    except ImportError as e:
+        print(f"{'RouterAgent':<32} skipped ({e})")
+        return
+
+    def mock_agent(client):
+        class MockGroqAgent(GroqAgent):
+            def setup_client(self):
+                self.client = client
+        return MockGroqAgent(os.path.join(ROOT, 'agents', 'groq_settings.yaml'))
+
+    # 5% of the fast provider's calls take 10x longer
+    spiky = mock_agent(MockChatClient(recordings, Latency(latency.base, spike=0.05, seed=1)))
+    steady = mock_agent(MockChatClient(recordings, Latency(latency.base * 1.5, jitter=latency.jitter, seed=2)))
+    router = RouterAgent([spiky, steady])
+    tasks = recordings.task_descriptions()
+
+    for name, agent in (("spiky provider alone", spiky), ("RouterAgent (hedged)", router)):
+        latencies = []
+        for _ in range(repeat * 10):
+            for task in tasks:
+                start = time.perf_counter()
+                await agent.generate_code('code_generation', task)
+                latencies.append(time.perf_counter() - start)
+        report(name, latencies, tail=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate/run/fix loop benchmark")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="fixed mock LLM latency per call in seconds")
+    parser.add_argument('--per-token', type=float, default=0.0,
+                        help="additional mock latency per output token")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="SandboxPool workers (default: CPU count)")
+    args = parser.parse_args()
+
+    recordings = Recordings.load(RECORDINGS_PATH)
+    latency = Latency(args.latency, args.per_token, args.jitter)
+    llm = MockLLM(recordings, latency)
+    tasks = recordings.task_descriptions()
+
+    print(f"{len(tasks)} tasks x {args.repeat} repeats, "
+          f"mock latency {args.latency * 1000:.0f} ms (+{args.jitter * 1000:.0f} ms jitter)")
+
+    bench_run_and_fix("run_and_fix (in-process)", tasks, llm, args.repeat)
+    bench_run_and_fix("run_and_fix (patch)", tasks, llm, args.repeat, fix_mode='patch')
+
+    from sandbox import SandboxPool
+    with SandboxPool(workers=args.workers) as pool:
+        bench_run_and_fix("run_and_fix (SandboxPool)", tasks, llm, args.repeat, pool)
+        asyncio.run(bench_run_and_fix_many(tasks, llm, args.repeat, args.concurrency, pool))
+        asyncio.run(bench_arun_and_fix(tasks, llm, args.repeat, pool))
+        asyncio.run(bench_astream_run_and_fix(tasks, llm, args.repeat, pool))
+
+    asyncio.run(bench_groq_agent(recordings, latency, args.repeat))
+    asyncio.run(bench_router(recordings, latency, args.repeat))
+    print(f"mock LLM calls: {llm.calls}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Startup benchmark for the entry modules.
+
+Imports each module in a fresh interpreter with `python -X importtime`,
+reports the median cumulative import time and the slowest imports, and
+exits non-zero when a module goes over its budget or eagerly imports a
+provider SDK.
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 100]
+"""
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['coding_agents', 'functions']
+
+# Heavy modules that must only be imported on first use
+LAZY_MODULES = ['llama_index', 'anthropic', 'groq', 'openai', 'httpx',
+                'pyperclip', 'dotenv']
+
+DEFAULT_BUDGET_MS = 100
+LINE_PATTERN = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def import_times(module):
+    """Return [(self_us, cumulative_us, depth, name)] for one cold import"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr}")
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return rows
+
+
+def bench_module(module, runs, budget_ms):
+    totals = []
+    for _ in range(runs):
+        rows = import_times(module)
+        totals.append(next(cum for _, cum, _, name in rows if name == module))
+    median_ms = statistics.median(totals) / 1000
+
+    imported = {name.split('.')[0] for _, _, _, name in rows}
+    eager = sorted(imported.intersection(LAZY_MODULES))
+
+    print(f"{module}: median {median_ms:.1f} ms over {runs} runs (budget {budget_ms} ms)")
+    for self_us, _, _, name in sorted(rows, reverse=True)[:10]:
+        print(f"    {self_us / 1000:7.2f} ms  {name}")
+    if eager:
+        print(f"    eagerly imported: {', '.join(eager)}")
+    return median_ms <= budget_ms and not eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    results = [bench_module(module, args.runs, args.budget_ms) for module in args.modules]
+    if not all(results):
+        print("Startup budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
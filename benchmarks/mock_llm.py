@@ -0,0 +1,243 @@
+"""
+Deterministic stand-in LLMs for benchmarks.
+
+Responses are replayed from a recordings file instead of calling a
+provider. Every recorded script carries a marker comment
+
+    # bench: <task_id> step <k>
+
+so a fix prompt (which embeds the previous script) is answered with step
+k + 1 of the same task (as a unified diff from step k when the prompt asks
+for one, see coding_agents.patch_correction_prompt), while a generation prompt is matched to its task
+by a substring. Lookup is stateless, so concurrent callers get the same
+answers in any order.
+
+Three interfaces are provided over the same replay data:
+- MockLLM: llama_index `complete`/`acomplete` (used by coding_agents)
+- MockChatClient: Groq/OpenAI `client.chat.completions.create`
+- MockAnthropicClient: Anthropic `client.messages.create`
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import difflib
+from types import SimpleNamespace
+
+STEP_PATTERN = re.compile(r'# bench: (\S+) step (\d+)')
+FENCE_PATTERN = re.compile(r'```\w*\n?')
+PATCH_MARKER = 'unified diff'
+
+
+class Recordings:
+    """Recorded responses per task, see recordings.json"""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(json.load(f)['tasks'])
+
+    def task_descriptions(self):
+        return [task['description'] for task in self.tasks]
+
+    def respond(self, prompt):
+        steps = STEP_PATTERN.findall(prompt)
+        if steps:
+            task_id, step = steps[-1]
+            task = next(task for task in self.tasks if task['id'] == task_id)
+            responses = task['responses']
+            response = responses[min(int(step) + 1, len(responses) - 1)]
+            if PATCH_MARKER in prompt:
+                return self._diff(responses[min(int(step), len(responses) - 1)], response)
+            return response
+        for task in self.tasks:
+            if task['match'] in prompt:
+                return task['responses'][0]
+        return "print('no recorded response')"
+
+    @staticmethod
+    def _diff(previous, response):
+        old = FENCE_PATTERN.sub('', previous).strip('\n').split('\n')
+        new = FENCE_PATTERN.sub('', response).strip('\n').split('\n')
+        if old == new:
+            return response
+        diff = difflib.unified_diff(old, new, 'script.py', 'script.py', lineterm='')
+        return "```diff\n" + '\n'.join(diff) + "\n```"
+
+
+class Latency:
+    """
+    Simulated provider latency: fixed cost + per output token + jitter,
+    with a `spike` probability of a call taking `spike_factor` times longer
+    """
+
+    def __init__(self, base=0.05, per_token=0.0, jitter=0.0, seed=0, spike=0.0, spike_factor=10):
+        self.base = base
+        self.per_token = per_token
+        self.jitter = jitter
+        self.spike = spike
+        self.spike_factor = spike_factor
+        self._random = random.Random(seed)
+
+    def seconds(self, text):
+        delay = self.base + self.per_token * count_tokens(text)
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if self.spike and self._random.random() < self.spike:
+            delay *= self.spike_factor
+        return delay
+
+
+def count_tokens(text):
+    return len(re.findall(r'\w+|[^\w\s]', text))
+
+
+def _usage(prompt, text):
+    return SimpleNamespace(
+        prompt_tokens=count_tokens(prompt),
+        completion_tokens=count_tokens(text),
+        input_tokens=count_tokens(prompt),
+        output_tokens=count_tokens(text)
+    )
+
+
+class MockLLM:
+    """llama_index-style LLM replaying recorded responses"""
+
+    def __init__(self, recordings, latency=None, model='mock-llm', temperature=0.0, max_tokens=8192):
+        self.recordings = recordings
+        self.latency = latency or Latency()
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.calls = 0
+
+    def _response(self, prompt):
+        self.calls += 1
+        text = self.recordings.respond(prompt)
+        usage = _usage(prompt, text)
+        return SimpleNamespace(text=text, raw={'usage': vars(usage)}), self.latency.seconds(text)
+
+    def complete(self, prompt, **kwargs):
+        response, delay = self._response(prompt)
+        time.sleep(delay)
+        return response
+
+    async def acomplete(self, prompt, **kwargs):
+        response, delay = self._response(prompt)
+        await asyncio.sleep(delay)
+        return response
+
+    async def astream_complete(self, prompt, **kwargs):
+        response, delay = self._response(prompt)
+        pieces = re.findall(r'\s*\S+', response.text)
+
+        async def stream():
+            text = ''
+            for piece in pieces:
+                await asyncio.sleep(delay / max(len(pieces), 1))
+                text += piece
+                yield SimpleNamespace(text=text, delta=piece)
+        return stream()
+
+
+def _prompt_of(messages):
+    return '\n'.join(message['content'] for message in messages)
+
+
+class _ChatCompletions:
+    def __init__(self, client):
+        self._client = client
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        client = self._client
+        client.calls += 1
+        prompt = _prompt_of(messages)
+        code = client.recordings.respond(prompt)
+        delay = client.latency.seconds(code)
+
+        if stream:
+            pieces = re.findall(r'\s*\S+', f"```python\n{code}\n```")
+            return _ChunkStream(pieces, delay)
+
+        content = code
+        if client.json_response:
+            # Agents ask for JSON with the code and a short explanation
+            content = json.dumps({
+                "code": code,
+                "explanation": "recorded response",
+                "improvements": [],
+                "considerations": [],
+                "is_valid": True,
+                "issues": []
+            })
+        await asyncio.sleep(delay)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=_usage(prompt, content),
+            model=model
+        )
+
+
+class _ChunkStream:
+    """Async iterator of chat-completion chunks, closable like SDK streams"""
+
+    def __init__(self, pieces, delay):
+        self._pieces = iter(pieces)
+        self._delay = delay / max(len(pieces), 1)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        piece = next(self._pieces, None)
+        if piece is None or self.closed:
+            raise StopAsyncIteration
+        await asyncio.sleep(self._delay)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+    async def close(self):
+        self.closed = True
+
+
+class MockChatClient:
+    """Groq/OpenAI-style async client: client.chat.completions.create"""
+
+    def __init__(self, recordings, latency=None, json_response=True):
+        self.recordings = recordings
+        self.latency = latency or Latency()
+        self.json_response = json_response
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_ChatCompletions(self))
+
+
+class _Messages:
+    def __init__(self, client):
+        self._client = client
+
+    async def create(self, model, messages, max_tokens=None, **kwargs):
+        client = self._client
+        client.calls += 1
+        prompt = _prompt_of(messages)
+        text = client.recordings.respond(prompt)
+        await asyncio.sleep(client.latency.seconds(text))
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            usage=_usage(prompt, text),
+            model=model
+        )
+
+
+class MockAnthropicClient:
+    """Anthropic-style async client: client.messages.create"""
+
+    def __init__(self, recordings, latency=None):
+        self.recordings = recordings
+        self.latency = latency or Latency()
+        self.calls = 0
+        self.messages = _Messages(self)
@@ -0,0 +1,339 @@
+import ast
+
+MODULE_SCOPE = '<module>'
+
+
+class FunctionInfo:
+    """A function or method found by analyze()"""
+    __slots__ = ('name', 'qualname', 'lineno', 'end_lineno', 'arguments',
+                 'return_names', 'return_lines', 'is_async', 'class_name',
+                 'calls', '_lines', '_position', '_returns')
+
+    def __init__(self, node, qualname, class_name, position, lines):
+        self.name = node.name
+        self.qualname = qualname
+        self.lineno = node.lineno
+        self.end_lineno = node.end_lineno
+        self._lines = lines
+        self.arguments = [arg.arg for arg in node.args.args]
+        self.return_names = []
+        self.return_lines = []
+        self.is_async = isinstance(node, ast.AsyncFunctionDef)
+        self.class_name = class_name
+        self.calls = []
+        self._position = position
+        self._returns = []
+
+    @property
+    def is_method(self):
+        return self.class_name is not None
+
+    @property
+    def header(self):
+        return self._lines[self.lineno - 1]
+
+    @property
+    def source(self):
+        return '\n'.join(self._lines[self.lineno - 1:self.end_lineno])
+
+    def __repr__(self):
+        return f"FunctionInfo({self.qualname!r}, lines {self.lineno}-{self.end_lineno})"
+
+
+class ClassInfo:
+    """A class definition found by analyze()"""
+    __slots__ = ('name', 'qualname', 'lineno', 'end_lineno', 'bases', 'methods')
+
+    def __init__(self, node, qualname):
+        self.name = node.name
+        self.qualname = qualname
+        self.lineno = node.lineno
+        self.end_lineno = node.end_lineno
+        self.bases = [dotted_name(base) or ast.unparse(base) for base in node.bases]
+        self.methods = []
+
+    def __repr__(self):
+        return f"ClassInfo({self.qualname!r}, lines {self.lineno}-{self.end_lineno})"
+
+
+class ModuleAnalysis:
+    """Everything analyze() collects from one module"""
+    __slots__ = ('lines', 'functions', 'classes', 'imports', 'call_graph')
+
+    def __init__(self, lines):
+        self.lines = lines
+        # Functions are ordered like ast.walk (breadth first) so views built
+        # on top keep the order the old analyzers produced
+        self.functions = []
+        self.classes = []
+        # (module, name or None, alias or None, line number)
+        self.imports = []
+        # qualname (or MODULE_SCOPE) -> names called from that scope
+        self.call_graph = {}
+
+    def function(self, name):
+        """First function with the given name or qualname, else None"""
+        for function in self.functions:
+            if function.qualname == name or function.name == name:
+                return function
+        return None
+
+
+def dotted_name(node):
+    """'a.b.c' for Name/Attribute chains, else None"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return '.'.join(reversed(parts))
+    return None
+
+
+# Fields holding nested statements, in AST order; the only ones visited without the call graph
+STATEMENT_FIELDS = ('body', 'handlers', 'orelse', 'finalbody', 'cases')
+
+
+def analyze(content, calls=True):
+    """
+    Analyze Python source in a single traversal of its AST.
+
+    Lines are split once; functions, async functions, methods, classes,
+    return statements, imports and the call graph are all collected in the
+    same pass. With calls=False the call graph is left empty and expressions
+    are not visited, which is all names, arguments and returns need.
+    Raises SyntaxError for invalid source.
+    """
+    tree = ast.parse(content)
+    analysis = ModuleAnalysis(content.split('\n'))
+    lines = analysis.lines
+
+    # Explicit stack instead of recursion: (node, depth, exiting)
+    stack = [(tree, 0, False)]
+    scopes = []
+    open_functions = []
+    position = 0
+
+    while stack:
+        node, depth, exiting = stack.pop()
+        if exiting:
+            scope = scopes.pop()
+            if isinstance(scope, FunctionInfo):
+                open_functions.pop()
+            continue
+
+        position += 1
+        node_type = type(node)
+
+        if node_type is ast.FunctionDef or node_type is ast.AsyncFunctionDef:
+            parent = scopes[-1] if scopes else None
+            qualname = f"{parent.qualname}.{node.name}" if parent else node.name
+            class_name = parent.name if isinstance(parent, ClassInfo) else None
+            function = FunctionInfo(node, qualname, class_name, (depth, position), lines)
+            if class_name is not None:
+                parent.methods.append(function)
+            analysis.functions.append(function)
+            scopes.append(function)
+            open_functions.append(function)
+            stack.append((node, depth, True))
+        elif node_type is ast.ClassDef:
+            parent = scopes[-1] if scopes else None
+            qualname = f"{parent.qualname}.{node.name}" if parent else node.name
+            class_info = ClassInfo(node, qualname)
+            analysis.classes.append(class_info)
+            scopes.append(class_info)
+            stack.append((node, depth, True))
+        elif node_type is ast.Return:
+            for function in open_functions:
+                function._returns.append(((depth, position), node))
+        elif node_type is ast.Import:
+            for alias in node.names:
+                analysis.imports.append((alias.name, None, alias.asname, node.lineno))
+        elif node_type is ast.ImportFrom:
+            module = '.' * node.level + (node.module or '')
+            for alias in node.names:
+                analysis.imports.append((module, alias.name, alias.asname, node.lineno))
+        elif node_type is ast.Call:
+            callee = dotted_name(node.func)
+            if callee is not None:
+                caller = open_functions[-1].qualname if open_functions else MODULE_SCOPE
+                analysis.call_graph.setdefault(caller, []).append(callee)
+                if open_functions:
+                    open_functions[-1].calls.append(callee)
+
+        if calls:
+            children = list(ast.iter_child_nodes(node))
+        else:
+            children = [child for field in STATEMENT_FIELDS for child in getattr(node, field, ())]
+        for child in reversed(children):
+            stack.append((child, depth + 1, False))
+
+    analysis.functions.sort(key=lambda function: function._position)
+    for function in analysis.functions:
+        function._returns.sort(key=lambda item: item[0])
+        for _, node in function._returns:
+            function.return_lines.append(lines[node.lineno - 1].strip())
+            if isinstance(node.value, ast.Name):
+                function.return_names.append(node.value.id)
+            elif isinstance(node.value, ast.Tuple):
+                for elt in node.value.elts:
+                    if isinstance(elt, ast.Name):
+                        function.return_names.append(elt.id)
+        function._returns = []
+    return analysis
+
+
+def _definition_span(node):
+    # Decorators belong to the definition they decorate
+    start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+    return start, node.end_lineno
+
+
+def _reindent(source, indent):
+    return '\n'.join(indent + line if line.strip() else line for line in source.split('\n'))
+
+
+def _class_body_indent(class_node, lines):
+    first = class_node.body[0]
+    return lines[first.lineno - 1][:first.col_offset]
+
+
+def _is_docstring(node):
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+
+
+def is_definition_fragment(tree):
+    """True when a module holds only imports, functions and classes"""
+    definition_types = (ast.Import, ast.ImportFrom, ast.FunctionDef,
+                        ast.AsyncFunctionDef, ast.ClassDef)
+    return bool(tree.body) and all(
+        isinstance(node, definition_types) or _is_docstring(node) for node in tree.body
+    )
+
+
+def _calls_nothing(node):
+    return node.value is None or not any(isinstance(child, ast.Call) for child in ast.walk(node.value))
+
+
+def definitions_only(fragment, constants=False):
+    """
+    The imports, functions and classes of fragment, without its other
+    top-level statements. With constants=True top-level assignments whose
+    value calls nothing (e.g. `LIMIT = 10`) are kept as well.
+    """
+    tree = ast.parse(fragment)
+    lines = fragment.split('\n')
+    kept = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            start, end = node.lineno, node.end_lineno
+        elif constants and isinstance(node, (ast.Assign, ast.AnnAssign)) and _calls_nothing(node):
+            start, end = node.lineno, node.end_lineno
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start, end = _definition_span(node)
+        else:
+            continue
+        kept.append('\n'.join(lines[start - 1:end]))
+    return '\n\n'.join(kept)
+
+
+def merge_definitions(script, fragment):
+    """
+    Splice the functions, classes and imports defined in fragment into script.
+
+    Top-level functions and classes replace the script's definitions of the
+    same name, a method replaces the method of the same name in the matching
+    class (or in the only class defining it, when the fragment gives a bare
+    function), new definitions go after the script's last definition and new
+    imports after its last top-level import. Raises SyntaxError if either
+    source does not parse and ValueError if fragment is not made of
+    definitions only.
+    """
+    tree = ast.parse(script)
+    fragment_tree = ast.parse(fragment)
+    if not is_definition_fragment(fragment_tree):
+        raise ValueError("fragment contains statements other than definitions")
+    lines = script.split('\n')
+    fragment_lines = fragment.split('\n')
+
+    def source_of(node, source_lines):
+        start, end = _definition_span(node)
+        return '\n'.join(source_lines[start - 1:end])
+
+    definition_types = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    top_level = {node.name: node for node in tree.body if isinstance(node, definition_types)}
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+
+    def method_of(class_node, name):
+        for child in class_node.body:
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child.name == name:
+                return child
+        return None
+
+    def method_edit(class_node, node, new_source, source_indent):
+        # Replace or add one method, re-indented to the class body
+        method = method_of(class_node, node.name)
+        if method is not None:
+            indent = lines[method.lineno - 1][:method.col_offset]
+            start, end = _definition_span(method)
+        else:
+            indent = _class_body_indent(class_node, lines)
+            start, end = class_node.end_lineno + 1, class_node.end_lineno
+        dedented = '\n'.join(line[len(source_indent):] if line.startswith(source_indent) else line
+                             for line in new_source.split('\n'))
+        return start, end, _reindent(dedented, indent).split('\n')
+
+    # (start, end, replacement lines); end < start marks an insertion
+    edits = []
+    appended = []
+
+    for node in fragment_tree.body:
+        if not isinstance(node, definition_types):
+            continue
+        new_source = source_of(node, fragment_lines)
+        existing = top_level.get(node.name)
+        if isinstance(node, ast.ClassDef) and isinstance(existing, ast.ClassDef):
+            # Merge the methods of a class the script already defines
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    child_indent = fragment_lines[child.lineno - 1][:child.col_offset]
+                    edits.append(method_edit(existing, child, source_of(child, fragment_lines), child_indent))
+        elif existing is not None:
+            start, end = _definition_span(existing)
+            edits.append((start, end, new_source.split('\n')))
+        elif isinstance(node, ast.ClassDef):
+            appended.append(new_source)
+        else:
+            owners = [class_node for class_node in classes.values() if method_of(class_node, node.name)]
+            if len(owners) == 1:
+                edits.append(method_edit(owners[0], node, new_source, ''))
+            else:
+                appended.append(new_source)
+
+    existing_imports = {ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))}
+    new_imports = []
+    for node in fragment_tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            statement = ast.unparse(node)
+            if statement not in existing_imports and statement not in new_imports:
+                new_imports.append(statement)
+
+    if appended:
+        definitions = [node for node in tree.body if isinstance(node, definition_types)]
+        after = definitions[-1].end_lineno if definitions else 0
+        block = []
+        for source in appended:
+            block.extend(['', ''] + source.split('\n'))
+        edits.append((after + 1, after, block))
+    if new_imports:
+        imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+        after = imports[-1].end_lineno if imports else 0
+        edits.append((after + 1, after, new_imports))
+
+    # Apply bottom-up so earlier line numbers stay valid; edits at the same
+    # position are applied last-first so they end up in fragment order
+    ordered = sorted(enumerate(edits), key=lambda item: (item[1][0], item[1][1], item[0]), reverse=True)
+    for _, (start, end, replacement) in ordered:
+        lines[start - 1:end] = replacement
+    return '\n'.join(lines)
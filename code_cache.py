@@ -0,0 +1,267 @@
+import os
+import re
+import sys
+import ast
+import marshal
+import hashlib
+import importlib.util
+import importlib.abc
+import importlib.machinery
+import threading
+from collections import OrderedDict
+
+# Generated scripts are compiled under this name so tracebacks point at
+# "<string>" frames, as prompt_budget.trim_traceback expects
+SCRIPT_FILENAME = '<string>'
+DEFAULT_MAX_ENTRIES = 256
+
+# Persisted code objects are only valid for the interpreter that wrote them
+BYTECODE_FOLDER = '.bytecode'
+BYTECODE_HEADER = importlib.util.MAGIC_NUMBER + (sys.implementation.cache_tag or 'none').encode('ascii') + b'\0'
+HISTORY_PACKAGE = 'pycoder_history'
+
+
+class CompiledScript:
+    """A script compiled once: its body plus its final expression, if any"""
+    __slots__ = ('body', 'last_expression')
+
+    def __init__(self, body, last_expression):
+        self.body = body
+        self.last_expression = last_expression
+
+    def run(self, namespace, local_namespace=None):
+        """Execute in namespace and return the value of the final expression"""
+        exec(self.body, namespace, local_namespace)
+        if self.last_expression is None:
+            return None
+        return eval(self.last_expression, namespace, local_namespace)
+
+    def dumps(self):
+        return BYTECODE_HEADER + marshal.dumps((self.body, self.last_expression))
+
+    @classmethod
+    def loads(cls, data):
+        """CompiledScript from dumps() output, None if another interpreter wrote it"""
+        if not data.startswith(BYTECODE_HEADER):
+            return None
+        try:
+            body, last_expression = marshal.loads(data[len(BYTECODE_HEADER):])
+        except (EOFError, ValueError, TypeError):
+            return None
+        return cls(body, last_expression)
+
+
+class CodeCache:
+    """
+    LRU cache of compiled scripts keyed by a hash of their source.
+
+    The source is parsed once; a trailing expression statement is split off
+    and compiled in 'eval' mode so its value can be returned without
+    executing anything twice (the way IPython displays the last line).
+
+    With a directory, compiled scripts are also marshalled to disk, tagged
+    with the interpreter's magic number and cache tag, so later processes
+    skip parsing and compiling too.
+    """
+    _folders = {}
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_folder(cls, history_folder='history'):
+        """Shared cache persisting into history_folder/.bytecode"""
+        directory = os.path.join(os.path.abspath(history_folder), BYTECODE_FOLDER)
+        if directory not in cls._folders:
+            cls._folders[directory] = cls(directory=directory)
+        return cls._folders[directory]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{sys.implementation.cache_tag}.bin")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return CompiledScript.loads(f.read())
+        except OSError:
+            return None
+
+    def _store(self, key, compiled):
+        # Write to a temporary file first so readers never see half a file
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, 'wb') as f:
+                f.write(compiled.dumps())
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def key(source, filename=SCRIPT_FILENAME):
+        return hashlib.sha256(f"{filename}\0{source}".encode('utf-8')).hexdigest()
+
+    def compile(self, source, filename=SCRIPT_FILENAME):
+        """CompiledScript for source; raises SyntaxError for invalid code"""
+        key = self.key(source, filename)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+
+        compiled = self._load(key) if self.directory is not None else None
+        if compiled is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            compiled = compile_script(source, filename)
+            if self.directory is not None:
+                self._store(key, compiled)
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def compile_script(source, filename=SCRIPT_FILENAME):
+    """Parse source once and compile its body and trailing expression"""
+    tree = ast.parse(source, filename)
+    last_expression = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        expression = ast.Expression(tree.body.pop().value)
+        last_expression = compile(expression, filename, 'eval')
+    return CompiledScript(compile(tree, filename, 'exec'), last_expression)
+
+
+def new_namespace(main=False):
+    # One dict for globals and locals, so functions defined by the script
+    # can see each other and its imports. Scripts are not run as __main__
+    # unless asked to: an `if __name__ == '__main__':` block may wait on
+    # input() or start a long-running main
+    namespace = {'__builtins__': __builtins__}
+    if main:
+        namespace['__name__'] = '__main__'
+    return namespace
+
+
+code_cache = CodeCache()
+
+
+def run_script(source, namespace=None, cache=code_cache):
+    """
+    Execute source in namespace (a fresh one by default) and return the
+    value of its final expression, or None when it ends in a statement.
+    """
+    if namespace is None:
+        namespace = new_namespace()
+    compiled = cache.compile(source) if cache is not None else compile_script(source)
+    return compiled.run(namespace)
+
+
+HISTORY_SCRIPT_PATTERN = re.compile(r'ca_code_(\d+)$')
+
+
+def history_origin(index, history_folder='history'):
+    # Filename history scripts are compiled under, one per stored run
+    return f"{os.path.abspath(history_folder)}/ca_code_{index}"
+
+
+def history_source(index, history_folder='history'):
+    """Script stored under index in the folder's HistoryStore"""
+    from history_store import HistoryStore
+    source = HistoryStore.for_folder(history_folder).script(index)
+    if source is None:
+        raise KeyError(f"No history record {index} in {history_folder}")
+    return source
+
+
+class HistoryLoader(importlib.abc.Loader):
+    """Executes a history script as a module through the code cache"""
+
+    def __init__(self, index, history_folder, cache):
+        self.index = index
+        self.history_folder = history_folder
+        self.cache = cache
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        source = history_source(self.index, self.history_folder)
+        origin = history_origin(self.index, self.history_folder)
+        module.__file__ = origin
+        self.cache.compile(source, origin).run(module.__dict__)
+
+
+class HistoryFinder(importlib.abc.MetaPathFinder):
+    """
+    Makes the scripts in a history store importable as
+    `pycoder_history.ca_code_<id>`, e.g. `from pycoder_history import ca_code_3`.
+    """
+
+    def __init__(self, history_folder='history', package=HISTORY_PACKAGE):
+        self.history_folder = os.path.abspath(history_folder)
+        self.package = package
+        self.cache = CodeCache.for_folder(history_folder)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname == self.package:
+            spec = importlib.machinery.ModuleSpec(fullname, None, is_package=True)
+            spec.submodule_search_locations = []
+            return spec
+        package, _, name = fullname.rpartition('.')
+        if package != self.package:
+            return None
+        match = HISTORY_SCRIPT_PATTERN.match(name)
+        if match is None:
+            return None
+        from history_store import HistoryStore
+        index = int(match.group(1))
+        if HistoryStore.for_folder(self.history_folder).script(index) is None:
+            return None
+        loader = HistoryLoader(index, self.history_folder, self.cache)
+        return importlib.util.spec_from_loader(fullname, loader, origin=history_origin(index, self.history_folder))
+
+
+def install_history_importer(history_folder='history', package=HISTORY_PACKAGE):
+    """
+    Register a HistoryFinder for history_folder, once per package name.
+    A package serves a single folder; importing another folder needs its own package.
+    """
+    for finder in sys.meta_path:
+        if isinstance(finder, HistoryFinder) and finder.package == package:
+            if finder.history_folder != os.path.abspath(history_folder):
+                raise ValueError(f"Package {package} already imports from {finder.history_folder}, "
+                                 f"not {history_folder}")
+            return finder
+    finder = HistoryFinder(history_folder, package)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def import_history_script(index, history_folder='history', package=HISTORY_PACKAGE):
+    """Import the script stored under index as a module"""
+    install_history_importer(history_folder, package)
+    return importlib.import_module(f"{package}.ca_code_{index}")
+
+
+def run_history_script(index, history_folder='history', namespace=None):
+    """
+    Run the script stored under index, like run_code without the output
+    capture, using bytecode persisted next to the history store.
+    """
+    return run_script(history_source(index, history_folder), namespace, CodeCache.for_folder(history_folder))
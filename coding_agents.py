@@ -1,20 +1,21 @@
 import sys
 import os
-from dotenv import load_dotenv
-import warnings
-import nest_asyncio
-import pyperclip
-from llama_index.llms.anthropic import Anthropic
-from llama_index.multi_modal_llms.anthropic import AnthropicMultiModal
-import sys
 from io import StringIO
-import inspect 
 import ast
 import re
+import asyncio
+import traceback
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import code_analysis
+import code_cache
+import prompt_budget
+import patching
+from agents.response_cache import ResponseCache
+from agents.tracing import tracer, record_usage
 
-nest_asyncio.apply()
-# warnings.filterwarnings('ignore')
-load_dotenv()
+# Provider SDKs, the LLM and pyperclip are loaded on first use so importing this module (and spawning workers) stays fast
 
 
 coding_agent_prompt = """
@@ -46,176 +47,665 @@ Please analyze the error and suggest a corrected version of the script, explaini
 Provide only the corrected script below:
 """
 
-llm = Anthropic(model= 'claude-3-5-sonnet-20241022', max_tokens=8192)
+patch_correction_prompt = """
+The following script has an error:
+
+### Original Script:
+{original_script}
+
+### Error Message:
+{error_string}
+
+Fix the error with the smallest possible change. Reply with either:
+- a unified diff against the original script (with ---/+++ headers and @@ hunks), or
+- only the complete corrected definitions of the functions or classes that change, plus any new imports.
+
+Do not repeat the rest of the script and do not explain the changes.
+"""
+
+FIX_MODES = ('rewrite', 'patch')
+
+DEFAULT_MODEL = 'claude-3-5-sonnet-20241022'
+DEFAULT_MAX_TOKENS = 8192
+
+_llm = None
+
+def get_llm():
+    # Build the default LLM on first use, through the client registry so
+    # async calls get an instance (and connection pool) per event loop
+    global _llm
+    if _llm is None:
+        from dotenv import load_dotenv
+        from agents.clients import get_registry
+        # warnings.filterwarnings('ignore')
+        load_dotenv()
+        _llm = get_registry().anthropic_llm(model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS)
+    return _llm
+
+def __getattr__(name):
+    # Keep `coding_agents.llm` working without building it at import time
+    if name == 'llm':
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def remove_non_python(text):
     return text.replace("```python", "").replace("```", "")
 
-def generate_script(task_description, llm=llm, coding_agent_prompt=coding_agent_prompt):
+response_cache = ResponseCache()
+
+# listener(kind, text) of the astream_run_and_fix in progress: LLM replies
+# arrive as 'token' pieces, printed script output as 'output'
+_stream_listener = contextvars.ContextVar('pycoder_stream_listener', default=None)
+
+def _llm_complete(prompt, llm, llm_kwargs):
+    model = llm_kwargs.get('model', getattr(llm, 'model', None))
+    with tracer.span('llm.complete', model=model) as span:
+        response = llm.complete(prompt, **llm_kwargs)
+        record_usage(span, response, model=model)
+    return response.text
+
+async def _astream_complete(prompt, llm, llm_kwargs, listener):
+    # Pass each delta on as it arrives; the last response has the full text
+    response = None
+    async for response in await llm.astream_complete(prompt, **llm_kwargs):
+        if response.delta:
+            listener('token', response.delta)
+    return response
+
+async def _allm_complete(prompt, llm, llm_kwargs):
+    model = llm_kwargs.get('model', getattr(llm, 'model', None))
+    listener = _stream_listener.get()
+    with tracer.span('llm.acomplete', model=model) as span:
+        if listener is not None and hasattr(llm, 'astream_complete'):
+            response = await _astream_complete(prompt, llm, llm_kwargs, listener)
+        elif hasattr(llm, 'acomplete'):
+            response = await llm.acomplete(prompt, **llm_kwargs)
+        else:
+            response = await _in_thread(None, lambda: llm.complete(prompt, **llm_kwargs))
+        record_usage(span, response, model=model)
+    return response.text
+
+def _cache_params(llm, llm_kwargs):
+    return {
+        'model': getattr(llm, 'model', None),
+        'temperature': getattr(llm, 'temperature', None),
+        'max_tokens': getattr(llm, 'max_tokens', None),
+        **llm_kwargs
+    }
+
+def complete(prompt, llm=None, cache=response_cache, llm_kwargs=None):
+    # Pass cache=None to bypass the response cache. llm_kwargs (e.g.
+    # temperature or model) override the LLM's own settings for this call
+    if llm is None:
+        llm = get_llm()
+    llm_kwargs = llm_kwargs or {}
+    if cache is None:
+        return _llm_complete(prompt, llm, llm_kwargs)
+    return cache.get_or_compute(
+        lambda: _llm_complete(prompt, llm, llm_kwargs),
+        prompt=prompt,
+        **_cache_params(llm, llm_kwargs)
+    )
+
+async def acomplete(prompt, llm=None, cache=response_cache, llm_kwargs=None):
+    # complete() through the provider's async API (llm.acomplete)
+    if llm is None:
+        llm = get_llm()
+    llm_kwargs = llm_kwargs or {}
+    if cache is None:
+        return await _allm_complete(prompt, llm, llm_kwargs)
+    return await cache.aget_or_compute(
+        lambda: _allm_complete(prompt, llm, llm_kwargs),
+        prompt=prompt,
+        **_cache_params(llm, llm_kwargs)
+    )
+
+class _ReplyLog:
+    # The cache as seen by one run_and_fix: remembers the keys of the replies
+    # behind the script being run, so a script that fails doesn't keep
+    # coming back from the cache on every retry of the task
+    def __init__(self, cache):
+        self.cache = cache
+        self.keys = []
+
+    def get_or_compute(self, compute, bypass=False, **key_params):
+        self.keys.append(self.cache.make_key(**key_params))
+        return self.cache.get_or_compute(compute, bypass, **key_params)
+
+    async def aget_or_compute(self, compute, bypass=False, **key_params):
+        self.keys.append(self.cache.make_key(**key_params))
+        return await self.cache.aget_or_compute(compute, bypass, **key_params)
+
+    def settle(self, failed):
+        # Drop the replies of a failed run, keep those of a working one
+        if failed:
+            for key in self.keys:
+                self.cache.delete(key)
+        self.keys = []
+
+def _fix_request(script, result, llm, coding_agent_prompt, budget):
+    # Large scripts are cut down to the failing functions to fit budget (a
+    # prompt_budget.PromptBudget, by default derived from the LLM's model)
+    if llm is None:
+        llm = get_llm()
+    if budget is None:
+        budget = prompt_budget.PromptBudget.for_llm(llm)
+    prompt, compacted = prompt_budget.build_fix_prompt(script, result, coding_agent_prompt, budget)
+    return llm, prompt, compacted
+
+def _fix_reply(script, reply, compacted):
+    # Definitions returned for a compacted prompt are spliced back into the script
+    fix = remove_non_python(reply)
+    if compacted:
+        return prompt_budget.apply_fix(script, fix)
+    return fix
+
+def _patch_request(script, result, llm, budget):
+    if llm is None:
+        llm = get_llm()
+    if budget is None:
+        budget = prompt_budget.PromptBudget.for_llm(llm)
+    prompt = patch_correction_prompt.format(original_script=script, error_string=prompt_budget.trim_traceback(result, script))
+    return llm, budget, prompt
+
+@tracer.traced('generate_script')
+def generate_script(task_description, llm=None, coding_agent_prompt=coding_agent_prompt, cache=response_cache, llm_kwargs=None):
     prompt = coding_agent_prompt.format(task_description=task_description)
-    response = llm.complete(prompt)
-    return remove_non_python(response.text)
+    return remove_non_python(complete(prompt, llm, cache, llm_kwargs))
 
-def fix_script(script, result, llm=llm, coding_agent_prompt=coding_agent_prompt):
-    prompt = coding_agent_prompt.format(task_description=f"The following script was generated to solve a task, but it did not work. Please correct it: {script}. The result of running the script was: {result}")
-    response = llm.complete(prompt)
-    return remove_non_python(response.text)
+@tracer.traced('generate_script')
+async def agenerate_script(task_description, llm=None, coding_agent_prompt=coding_agent_prompt, cache=response_cache, llm_kwargs=None):
+    prompt = coding_agent_prompt.format(task_description=task_description)
+    return remove_non_python(await acomplete(prompt, llm, cache, llm_kwargs))
+
+@tracer.traced('fix_script')
+def fix_script(script, result, llm=None, coding_agent_prompt=coding_agent_prompt, cache=response_cache, budget=None, llm_kwargs=None):
+    llm, prompt, compacted = _fix_request(script, result, llm, coding_agent_prompt, budget)
+    return _fix_reply(script, complete(prompt, llm, cache, llm_kwargs), compacted)
 
+@tracer.traced('fix_script')
+async def afix_script(script, result, llm=None, coding_agent_prompt=coding_agent_prompt, cache=response_cache, budget=None, llm_kwargs=None):
+    llm, prompt, compacted = _fix_request(script, result, llm, coding_agent_prompt, budget)
+    return _fix_reply(script, await acomplete(prompt, llm, cache, llm_kwargs), compacted)
+
+@tracer.traced('patch_script')
+def patch_script(script, result, llm=None, coding_agent_prompt=coding_agent_prompt, cache=response_cache, budget=None, llm_kwargs=None):
+    # Ask for a diff or replacement definitions instead of the whole script,
+    # falling back to fix_script when the reply doesn't apply
+    llm, budget, prompt = _patch_request(script, result, llm, budget)
+    if not budget.fits(prompt):
+        return fix_script(script, result, llm, coding_agent_prompt, cache, budget, llm_kwargs)
+    try:
+        return patching.apply_patch(script, complete(prompt, llm, cache, llm_kwargs))
+    except patching.PatchError:
+        tracer.count('patch.fallbacks')
+        return fix_script(script, result, llm, coding_agent_prompt, cache, budget, llm_kwargs)
 
-def run_code(code_string):
+@tracer.traced('patch_script')
+async def apatch_script(script, result, llm=None, coding_agent_prompt=coding_agent_prompt, cache=response_cache, budget=None, llm_kwargs=None):
+    llm, budget, prompt = _patch_request(script, result, llm, budget)
+    if not budget.fits(prompt):
+        return await afix_script(script, result, llm, coding_agent_prompt, cache, budget, llm_kwargs)
     try:
-        # Capture stdout
-        old_stdout = sys.stdout
+        return patching.apply_patch(script, await acomplete(prompt, llm, cache, llm_kwargs))
+    except patching.PatchError:
+        tracer.count('patch.fallbacks')
+        return await afix_script(script, result, llm, coding_agent_prompt, cache, budget, llm_kwargs)
+
+# Async counterpart of each LLM step, awaited by the async run loop
+ASYNC_STEPS = {
+    generate_script: agenerate_script,
+    fix_script: afix_script,
+    patch_script: apatch_script,
+}
+
+def fixer(fix_mode):
+    # fix_script or patch_script for run_and_fix's fix_mode
+    if fix_mode not in FIX_MODES:
+        raise ValueError(f"fix_mode must be one of {FIX_MODES}, got {fix_mode!r}")
+    return patch_script if fix_mode == 'patch' else fix_script
+
+def error_text(run_results):
+    # What fix_script is told about a failed run: the traceback when there is one
+    return run_results.get('traceback') or run_results['error_message']
+
+
+@tracer.traced('run_code')
+def run_code(code_string, executor=None, on_output=None):
+    # on_output(text) is called with the script's stdout as it is printed.
+    # Hand the script to a sandbox pool when one is given
+    if executor is not None:
+        if on_output is None:
+            return executor.run(code_string)
+        return executor.run(code_string, on_output=on_output)
+    # Capture stdout
+    old_stdout = sys.stdout
+    if on_output is None:
         redirected_output = sys.stdout = StringIO()
-        
-        # Create a dictionary to hold local variables
-        exec_locals = {}
-        
-        # Check if the code is an evaluable expression
+    else:
+        from sandbox import StreamingOutput
+        redirected_output = sys.stdout = StreamingOutput(on_output)
+    try:
+        # Parsed and compiled once (and cached); the value of a trailing
+        # expression is returned as the result
         try:
-            exec(f"_last_expr_result = {code_string}", {}, exec_locals)
-            exec_result = exec_locals.get('_last_expr_result')
-        except SyntaxError:
-            # If it's not an expression, just execute the code
-            exec(code_string, {}, exec_locals)
+            exec_result = code_cache.run_script(code_string)
+        except SystemExit as e:
+            # Like sandbox.execute: sys.exit() and sys.exit(0) are a clean finish
+            if e.code not in (0, None):
+                raise
             exec_result = None
-
-        # Get printed output
-        printed_output = redirected_output.getvalue()
-        
-        # Restore stdout
-        sys.stdout = old_stdout
-
         return {
             'is_error': False,
             'result': exec_result,
-            'output': printed_output.strip(),
+            'output': redirected_output.getvalue().strip(),
             'error_message': ''
         }
-        
-    except Exception as e:
+    except (Exception, SystemExit) as e:
+        tracer.count('run_code.errors')
         return {
             'is_error': True,
             'result': None,
-            'output': '',
-            'error_message': str(e)
+            'output': redirected_output.getvalue().strip(),
+            'error_message': str(e),
+            'traceback': traceback.format_exc()
         }
+    finally:
+        # Restore stdout, also when the script raised
+        sys.stdout = old_stdout
 
-def run_and_fix(task_description, max_iterations=3, llm=llm, coding_agent_prompt=coding_agent_prompt ):    
-    all_run_results = []
-    script = generate_script(task_description, llm, coding_agent_prompt)
-    run_results = run_code(script)
-    run_results['script'] = script
-    all_run_results.append(run_results)
-    if run_results['is_error']==False:
-        run_results['fix_iterations'] = 0
-        return all_run_results
+async def _in_thread(executor, func, *args):
+    # run_in_executor that keeps the caller's context (e.g. the active span)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, func, *args)
+
+_run_code_thread = None
+
+def _run_code_executor():
+    # In-process runs swap sys.stdout, so they take turns on one thread
+    global _run_code_thread
+    if _run_code_thread is None:
+        _run_code_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='run_code')
+    return _run_code_thread
+
+async def arun_code(code_string, executor=None, on_output=None):
+    # run_code without blocking the event loop: SandboxPool jobs are awaited
+    # directly, anything else runs off the loop. Inside astream_run_and_fix
+    # in-process and SandboxPool output is streamed unless on_output is given
+    if on_output is None and (executor is None or hasattr(executor, 'submit')):
+        listener = _stream_listener.get()
+        if listener is not None:
+            on_output = lambda text: listener('output', text)
+    if hasattr(executor, 'submit'):
+        if on_output is None:
+            return await asyncio.wrap_future(executor.submit(code_string))
+        return await asyncio.wrap_future(executor.submit(code_string, on_output=on_output))
+    return await _in_thread(_run_code_executor(), run_code, code_string, executor, on_output)
+
+def run_sync(coroutine):
+    # Run a coroutine from sync code. asyncio.run can't be nested, so inside
+    # a running loop (e.g. Jupyter) it gets a thread and a loop of its own
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='run_sync') as thread:
+        return thread.submit(contextvars.copy_context().run, asyncio.run, coroutine).result()
+
+def reuse_script(task_description, reuse, executor=None):
+    # Run the stored script for a similar task, if any, and keep it only if it works
+    match = reuse.find_script(task_description)
+    if match is None:
+        return None
+    run_results = run_code(match['script'], executor)
+    if run_results['is_error']:
+        return None
+    run_results['script'] = match['script']
+    run_results['fix_iterations'] = 0
+    run_results['reused_from'] = match['id']
+    return run_results
+
+def check_acceptance(run_results, script, tests, executor=None):
+    # A clean run only counts once the acceptance tests pass; failing tests
+    # become the error fix_script is asked to address
+    if tests is None or run_results['is_error']:
+        return run_results
+    results = tests.run(script, executor if hasattr(executor, 'submit') else None)
+    failures = tests.failures(results)
+    run_results['acceptance'] = results
+    if failures:
+        run_results['is_error'] = True
+        run_results['error_message'] = tests.describe(failures)
+    return run_results
+
+async def _async_step(step, *args, **kwargs):
+    return await ASYNC_STEPS[step](*args, **kwargs)
+
+async def _blocking_step(step, *args, **kwargs):
+    # The sync API's LLM path: blocking calls on a thread, so sync callers
+    # never touch async connection pools bound to some other event loop
+    return await _in_thread(None, lambda: step(*args, **kwargs))
+
+_cascades = {}
+_cascades_lock = threading.Lock()
+
+def resolve_cascade(cascade, history_folder='history'):
+    # cascade argument of run_and_fix: a ModelCascade, a list of model
+    # names (fastest first) or a provider settings YAML to take them from.
+    # Built cascades are shared per (models, history folder): the history
+    # is read once and outcomes learned since stay with the cascade
+    if cascade is None or hasattr(cascade, 'plan'):
+        return cascade
+    from agents.cascade import ModelCascade, order_models
+    from history_store import HistoryStore
+    if isinstance(cascade, str):
+        from agents.config_registry import get_registry
+        models = order_models(get_registry().load(cascade).get('models') or {})
     else:
-        for i in range(max_iterations):
-            script = fix_script(script, run_results['error_message'], llm, coding_agent_prompt)
-            run_results = run_code(script)
-            run_results['script'] = script
-            all_run_results.append(run_results)
-            if run_results['is_error']==False:
-                run_results['fix_iterations'] = i+1
-                all_run_results.append(run_results)
+        models = list(cascade)
+    key = (tuple(models), os.path.abspath(history_folder))
+    with _cascades_lock:
+        if key not in _cascades:
+            _cascades[key] = ModelCascade(models, history=HistoryStore.for_folder(history_folder))
+        return _cascades[key]
+
+async def _arun_and_fix(task_description, max_iterations, llm, coding_agent_prompt, executor, cache, call_llm, match=None, fix=fix_script, acceptance=None, cascade=None):
+    # The generate/run/fix loop behind run_and_fix and its async variants.
+    # call_llm(step, *args, **kwargs) performs one LLM step (generate_script,
+    # fix_script or patch_script); match is a stored script to try first
+    if cascade is not None:
+        # Every step after the first follows a failed run, so it may go to
+        # a stronger model
+        plan = cascade.plan(task_description)
+        all_run_results = await _arun_and_fix(task_description, max_iterations, llm, coding_agent_prompt, executor, cache, plan.wrap(call_llm), match, fix, acceptance)
+        if 'reused_from' not in all_run_results[-1]:
+            all_run_results[-1]['cascade'] = plan.finish(not all_run_results[-1]['is_error'])
+        return all_run_results
+    if match is not None:
+        run_results = await arun_code(match['script'], executor)
+        if not run_results['is_error']:
+            run_results['script'] = match['script']
+            run_results['fix_iterations'] = 0
+            run_results['reused_from'] = match['id']
+            return [run_results]
+    replies = _ReplyLog(cache) if cache is not None else None
+    script = await call_llm(generate_script, task_description, llm, coding_agent_prompt, replies)
+    tests = None
+    if acceptance is not None:
+        from acceptance import AcceptanceTests, resolve
+        tests = await _in_thread(None, resolve, acceptance, task_description, script, llm, cache)
+
+    async def run(script):
+        run_results = await arun_code(script, executor)
+        if tests is not None:
+            run_results = await _in_thread(None, check_acceptance, run_results, script, tests, executor)
+        run_results['script'] = script
+        if replies is not None:
+            replies.settle(run_results['is_error'])
+        return run_results
+
+    try:
+        all_run_results = []
+        run_results = await run(script)
+        all_run_results.append(run_results)
+        for i in range(max_iterations + 1):
+            if run_results['is_error'] == False:
+                run_results['fix_iterations'] = i
                 return all_run_results
-            else:
-                continue        
-    run_results['fix_iterations'] = max_iterations
-    all_run_results.append(run_results)
-    return all_run_results
+            if i == max_iterations:
+                break
+            script = await call_llm(fix, script, error_text(run_results), llm, coding_agent_prompt, replies)
+            run_results = await run(script)
+            all_run_results.append(run_results)
+        run_results['fix_iterations'] = max_iterations
+        return all_run_results
+    finally:
+        # Tests built here own their sandbox pool
+        if tests is not None and not isinstance(acceptance, AcceptanceTests):
+            tests.close()
+
+async def arun_and_fix(task_description, max_iterations=3, llm=None, coding_agent_prompt=coding_agent_prompt, executor=None, cache=response_cache, reuse=None, fix_mode='rewrite', acceptance=None, cascade=None):
+    """
+    Async run_and_fix, safe to await from any running event loop.
+
+    LLM calls go through the provider's async API (llm.acomplete) and
+    scripts run off the loop: as SandboxPool jobs when executor is a pool,
+    otherwise on a dedicated thread. Many calls can be in flight on one
+    loop, e.g. with asyncio.gather. Arguments are the same as run_and_fix.
+    """
+    fix = fixer(fix_mode)
+    match = reuse.find_script(task_description) if reuse is not None else None
+    return await _arun_and_fix(task_description, max_iterations, llm, coding_agent_prompt, executor, cache, _async_step, match, fix, acceptance, resolve_cascade(cascade))
+
+def run_and_fix(task_description, max_iterations=3, llm=None, coding_agent_prompt=coding_agent_prompt, executor=None, cache=response_cache, reuse=None, fix_mode='rewrite', acceptance=None, cascade=None):    
+    # reuse: an index with find_script(task_description), e.g. a HistoryIndex
+    # or TaskSimilarityIndex, tried before paying for a new generation.
+    # fix_mode='patch' asks for diffs instead of rewritten scripts.
+    # acceptance: True to have the LLM write tests for the generated
+    # functions, a list of examples, or acceptance.AcceptanceTests.
+    # cascade: models to escalate through, fastest first (see
+    # resolve_cascade); the last result gets a 'cascade' summary.
+    # A thin wrapper over the async loop, using the LLM's blocking API
+    fix = fixer(fix_mode)
+    match = reuse.find_script(task_description) if reuse is not None else None
+    return run_sync(_arun_and_fix(task_description, max_iterations, llm, coding_agent_prompt, executor, cache, _blocking_step, match, fix, acceptance, resolve_cascade(cascade)))
 
+async def astream_run_and_fix(task_description, max_iterations=3, llm=None, coding_agent_prompt=coding_agent_prompt, executor=None, cache=response_cache, reuse=None, fix_mode='rewrite', acceptance=None, cascade=None):
+    """
+    arun_and_fix that reports its progress as it goes.
+
+    Yields event dicts in order:
+    - {'type': 'token', 'text': ...}: a piece of an LLM reply, when the LLM
+      has astream_complete (cached replies only arrive as a 'script' event)
+    - {'type': 'script', 'step': ..., 'script': ...}: a generate_script,
+      fix_script or patch_script step finished
+    - {'type': 'output', 'text': ...}: stdout of the script being run
+    - {'type': 'done', 'run_results': ...}: what arun_and_fix returns
+    Closing the generator early cancels the run. Arguments are the same
+    as run_and_fix.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event):
+        # Tokens come from the loop, output from run threads: one FIFO for both
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def call_llm(step, *args, **kwargs):
+        script = await _async_step(step, *args, **kwargs)
+        emit({'type': 'script', 'step': step.__name__, 'script': script})
+        return script
+
+    fix = fixer(fix_mode)
+    match = reuse.find_script(task_description) if reuse is not None else None
+    reset = _stream_listener.set(lambda kind, text: emit({'type': kind, 'text': text}))
+    try:
+        # The task keeps a copy of the context, listener included
+        run = asyncio.ensure_future(_arun_and_fix(task_description, max_iterations, llm, coding_agent_prompt, executor, cache, call_llm, match, fix, acceptance, resolve_cascade(cascade)))
+    finally:
+        _stream_listener.reset(reset)
+    run.add_done_callback(lambda _: emit(None))
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        yield {'type': 'done', 'run_results': run.result()}
+    finally:
+        run.cancel()
+
+async def run_and_fix_many(tasks, concurrency=8, max_iterations=3, llm=None, coding_agent_prompt=coding_agent_prompt, executor=None, cache=response_cache, reuse=None, fix_mode='rewrite', cascade=None):
+    """
+    Run run_and_fix over many task descriptions concurrently.
+
+    At most `concurrency` LLM calls are in flight at once, while scripts run
+    in a SandboxPool (a private one is created when `executor` is None).
+    With `reuse`, stored scripts for all tasks are looked up in one batch
+    query via reuse.find_scripts and tried before generating.
+    fix_mode and cascade are passed on as in run_and_fix.
+    Yields (index, all_run_results) pairs as each task finishes.
+    """
+    fix = fixer(fix_mode)
+    cascade = resolve_cascade(cascade)
+    llm_semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def call_llm(step, *args, **kwargs):
+        async with llm_semaphore:
+            return await ASYNC_STEPS[step](*args, **kwargs)
+
+    tasks = list(tasks)
+    matches = reuse.find_scripts(tasks) if reuse is not None else [None] * len(tasks)
+
+    async def run_task(index, task_description):
+        return index, await _arun_and_fix(task_description, max_iterations, llm, coding_agent_prompt, executor, cache, call_llm, matches[index], fix, cascade=cascade)
+
+    own_executor = executor is None
+    if own_executor:
+        from sandbox import SandboxPool
+        # Starting the workers blocks, keep it off the event loop
+        executor = await loop.run_in_executor(None, SandboxPool)
+    pending = [asyncio.ensure_future(run_task(i, task)) for i, task in enumerate(tasks)]
+    try:
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        for task in pending:
+            task.cancel()
+        if own_executor:
+            await loop.run_in_executor(None, executor.close)
+
+# Default diversity for speculative candidates: one greedy, two sampled
+SPECULATIVE_TEMPERATURES = (0.0, 0.5, 1.0)
+
+def variants_from_settings(settings_path='openai_settings.yaml', temperature=None):
+    # [{'model': name, 'temperature': t}] for every model in a provider YAML,
+    # for use as arun_speculative variants with an LLM of that provider
+    from agents.config_registry import get_registry
+    settings = get_registry().load(settings_path)
+    if temperature is None:
+        temperature = settings.get('default_temperature', 0.7)
+    return [{'model': model, 'temperature': temperature} for model in settings.get('models', {})]
+
+async def arun_speculative(task_description, candidates=3, variants=None, max_iterations=1, stagger=0.0, llm=None, coding_agent_prompt=coding_agent_prompt, executor=None, cache=response_cache, fix_mode='rewrite'):
+    """
+    Race several generate/run/fix attempts at one task.
+
+    Each candidate gets its own variant of LLM settings (a dict of llm_kwargs
+    such as temperature or model, optionally with its own 'llm'), cycling
+    through `variants`, by default SPECULATIVE_TEMPERATURES. Candidates
+    call the LLM concurrently and run their scripts in parallel in a
+    SandboxPool; the first one whose script runs without error wins and
+    the rest are cancelled.
+
+    Cost knobs: `candidates` bounds how many attempts are made,
+    `max_iterations` how many fix rounds each candidate may use, and
+    `stagger` delays every further candidate by that many seconds so cheap
+    tasks are solved before the extra requests are sent.
+    Candidates past the end of `variants` repeat a variant and bypass the
+    response cache, so they get a fresh reply rather than a copy of the
+    first one. A candidate that raises (e.g. a provider error or a model
+    the provider doesn't know) loses with the exception recorded as its
+    result's 'candidate_error', the others keep racing.
+    Returns the winner's all_run_results, the last one tagged with
+    'candidate' and 'variant'. When no candidate succeeds, the results of
+    the lowest-numbered candidate that finished are returned.
+    """
+    if variants is None:
+        variants = [{'temperature': temperature} for temperature in SPECULATIVE_TEMPERATURES]
+    fix = fixer(fix_mode)
+    loop = asyncio.get_running_loop()
+    winner = asyncio.Event()
+
+    own_executor = executor is None
+    if own_executor:
+        from sandbox import SandboxPool
+        # Starting the workers blocks, keep it off the event loop
+        executor = await loop.run_in_executor(None, lambda: SandboxPool(workers=candidates))
+
+    async def run_candidate(index):
+        if index and stagger:
+            try:
+                await asyncio.wait_for(winner.wait(), stagger * index)
+                return index, None
+            except asyncio.TimeoutError:
+                pass
+        variant = dict(variants[index % len(variants)])
+        candidate_llm = variant.pop('llm', llm)
+        candidate_cache = cache if index < len(variants) else None
+
+        async def call_llm(step, *args):
+            return await ASYNC_STEPS[step](*args, llm_kwargs=variant)
+
+        tracer.count('speculative.candidates')
+        try:
+            all_run_results = await _arun_and_fix(task_description, max_iterations, candidate_llm, coding_agent_prompt, executor, candidate_cache, call_llm, fix=fix)
+        except Exception as e:
+            tracer.count('speculative.candidate_errors')
+            all_run_results = [{
+                'is_error': True,
+                'result': None,
+                'output': '',
+                'error_message': str(e),
+                'traceback': traceback.format_exc(),
+                'script': None,
+                'fix_iterations': 0,
+                'candidate_error': repr(e)
+            }]
+        all_run_results[-1]['candidate'] = index
+        all_run_results[-1]['variant'] = variants[index % len(variants)]
+        return index, all_run_results
+
+    pending = [asyncio.ensure_future(run_candidate(i)) for i in range(candidates)]
+    finished = {}
+    try:
+        with tracer.span('run_speculative', candidates=candidates) as span:
+            for next_done in asyncio.as_completed(pending):
+                index, all_run_results = await next_done
+                if all_run_results is None:
+                    continue
+                finished[index] = all_run_results
+                if not all_run_results[-1]['is_error']:
+                    winner.set()
+                    span.set('winner', index)
+                    return all_run_results
+            return finished[min(finished)]
+    finally:
+        # Cancelling the losers cancels their in-flight LLM requests and
+        # their queued sandbox jobs
+        for task in pending:
+            task.cancel()
+        if own_executor:
+            await loop.run_in_executor(None, executor.close)
+
+def run_speculative(task_description, **kwargs):
+    # Blocking wrapper around arun_speculative, same keyword arguments
+    return run_sync(arun_speculative(task_description, **kwargs))
 
 def extract_functions(code_string):
+    # {name: {'arguments': [...], 'returns': [returned names]}} for every function
     try:
-        # Parse code string into AST
-        tree = ast.parse(code_string)
-        
-        functions = {}
-        
-        # Walk through AST nodes
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                # Get function name
-                func_name = node.name
-                
-                # Get input arguments
-                args = []
-                for arg in node.args.args:
-                    args.append(arg.arg)
-                    
-                # Find return statements
-                returns = []
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Return):
-                        # Extract return value
-                        if isinstance(child.value, ast.Name):
-                            returns.append(child.value.id)
-                        elif isinstance(child.value, ast.Tuple):
-                            for elt in child.value.elts:
-                                if isinstance(elt, ast.Name):
-                                    returns.append(elt.id)
-                
-                # Store in dictionary
-                functions[func_name] = {
-                    'arguments': args,
-                    'returns': returns
-                }
-                
-        return functions
-        
+        analysis = code_analysis.analyze(code_string, calls=False)
     except SyntaxError:
         return "Invalid Python code"
     except Exception as e:
         return f"Error parsing code: {str(e)}"
 
+    functions = {}
+    for function in analysis.functions:
+        if not function.is_async:
+            functions[function.name] = {
+                'arguments': function.arguments,
+                'returns': function.return_names
+            }
+    return functions
+
+@tracer.traced('analyze_python_content')
 def analyze_python_content(content):
+    # [{'original', 'header', 'arguments', 'returns'}] for every function
     try:
-        # Read the file content
-            
-        # Parse the Python code into an AST
-        tree = ast.parse(content)
-        
-        # Dictionary to store function details
-        functions = []
-        
-        # Find all function definitions
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                # Get function name
-                func_name = node.name
-                # print(f"Found function: {func_name}")
-                
-                # Get original function code
-                func_lines = content.split('\n')[node.lineno-1:node.end_lineno]
-                original_func = '\n'.join(func_lines)
-                
-                # Get function header (first line)
-                header = func_lines[0]
-                
-                # Get arguments
-                args = []
-                for arg in node.args.args:
-                    args.append(arg.arg)
-                    
-                # Find return statements
-                returns = []
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Return):
-                        return_line = content.split('\n')[child.lineno-1].strip()
-                        returns.append(return_line)
-                
-                # Store in dictionary
-                functions.append({
-                    'original': original_func,
-                    'header': header,
-                    'arguments': args,
-                    'returns': returns
-                }
-                )
-        return functions
-        
+        analysis = code_analysis.analyze(content)
     except SyntaxError:
         print(f"Error: Invalid Python syntax in")
         return None
@@ -223,6 +713,17 @@ def analyze_python_content(content):
         print(f"Error analyzing file: {str(e)}")
         return None
 
+    return [
+        {
+            'original': function.source,
+            'header': function.header,
+            'arguments': function.arguments,
+            'returns': function.return_lines
+        }
+        for function in analysis.functions
+        if not function.is_async
+    ]
+
 def analyze_python_file(file_path):
     try:
         with open(file_path, 'r') as file:
@@ -232,56 +733,39 @@ def analyze_python_file(file_path):
         print(f"Error: File {file_path} not found")
         return None
 def get_largest_index(backup_folder):
-    try:
-        # Get list of files in backup folder
-        files = os.listdir(backup_folder)
-        
-        # Initialize max index
-        max_index = -1
-        
-        # Pattern to match ca[i]_prompt.txt format
-        pattern = r'ca_(\d+)_prompt\.txt'
-        
-        # Check each file
-        for file in files:
-            match = re.match(pattern, file)
-            if match:
-                # Extract index number and update max if larger
-                index = int(match.group(1))
-                max_index = max(max_index, index)
-                
-        return max_index if max_index >= 0 else None
-        
-    except OSError:
-        # Handle case where folder doesn't exist or can't be accessed
-        return None
+    # Highest id in the folder's history store, or None when it is empty
+    from history_store import HistoryStore
+    return HistoryStore.for_folder(backup_folder).last_id()
 
 
-def save_as_descriptive_name(script, task_description, output_folder='history'):
-    i = get_largest_index(output_folder) + 1
-    result = analyze_python_content(script)
-    function_name = result[0]['header'].replace("def ","")
-    code_path = output_folder + f'/ca_code_{i}_{function_name}.py'
-    with open(code_path, 'w') as f:
-        f.write(script)
-    prompt_path = output_folder+f'/ca_{i}_prompt.txt'
-    code_path = output_folder + f'/ca_code_{i}.py'
-    with open(prompt_path, 'w') as f:
-        f.write(task_description)
-    with open(code_path, 'w') as f:
-        f.write(script)
+@tracer.traced('save_as_descriptive_name')
+def save_as_descriptive_name(script, task_description, output_folder='history', index=None, run_results=None, metadata=None):
+    # Appends the run to the folder's HistoryStore and returns its id.
+    # The id is allocated by the store, so concurrent saves never collide.
+    from history_index import HistoryIndex
+    if index is None:
+        index = HistoryIndex.for_folder(output_folder)
+    functions = analyze_python_content(script) or []
+    metadata = dict(metadata or {})
+    if functions:
+        metadata.setdefault('name', functions[0]['header'].strip().removeprefix('def ').split('(')[0])
+    i = index.store.append(task_description, script, run_results, metadata)
+    # Catch the search index up with the store, this run and any records
+    # it has not seen yet (e.g. runs migrated from legacy files)
+    index.sync()
+    return i
 
 def run_code_in_context(code_str):
     try:
         # Get the caller's frame
-        caller_frame = inspect.currentframe().f_back
+        caller_frame = sys._getframe(1)
         
         # Get caller's global and local variables
         caller_globals = caller_frame.f_globals
         caller_locals = caller_frame.f_locals
         
-        # Execute code in caller's context
-        exec(code_str, caller_globals, caller_locals)
+        # Execute code in caller's context, compiled once per distinct script
+        code_cache.code_cache.compile(code_str).run(caller_globals, caller_locals)
         
     except Exception as e:
         print(f"Error executing code: {str(e)}")
@@ -289,11 +773,15 @@ def run_code_in_context(code_str):
         # Clean up frame reference
         del caller_frame
 
-def run_to_clipboard(task_description):
-    all_run_results = run_and_fix(task_description)
+def run_to_clipboard(task_description, reuse=None, cascade=None):
+    import pyperclip
+    all_run_results = run_and_fix(task_description, reuse=reuse, cascade=cascade)
     script = all_run_results[-1]['script']
     pyperclip.copy(script)
-    save_as_descriptive_name(script, task_description)
+    if 'reused_from' not in all_run_results[-1]:
+        # The cascade summary is what later cascades learn escalation rates from
+        metadata = {'cascade': all_run_results[-1]['cascade']} if 'cascade' in all_run_results[-1] else None
+        save_as_descriptive_name(script, task_description, run_results=all_run_results[-1], metadata=metadata)
     print(analyze_python_content(script))
     run_code_in_context(script)
     return script
@@ -1,61 +1,141 @@
+"""
+Gradio front end for the coding agents.
+
+Every message is a task for coding_agents.astream_run_and_fix. The LLM's
+reply streams into the chat and the code pane as it is written, and the
+script's output streams into the output pane while it runs. Requests go
+through Gradio's queue, so a slow generation only holds its own slot:
+PYCODER_CONCURRENCY generations run at once per app process (default 4)
+and up to PYCODER_QUEUE_SIZE more wait their turn (default 64).
+Generated scripts run in a SandboxPool started on first use, never in
+the web server's process, however the app is launched.
+
+    python gardio_app.py
+"""
+import os
+import time
+import atexit
+import threading
 
 import gradio as gr
 from pygments import highlight
-from pygments.lexers import PythonLexer 
+from pygments.lexers import PythonLexer
 from pygments.formatters import HtmlFormatter
 
-# Initialize chat history
-chat_history = []
+import coding_agents
+
+CONCURRENCY = int(os.environ.get('PYCODER_CONCURRENCY', 4))
+QUEUE_SIZE = int(os.environ.get('PYCODER_QUEUE_SIZE', 64))
+MAX_ITERATIONS = int(os.environ.get('PYCODER_MAX_ITERATIONS', 3))
+# Highlighting the whole script on every token is wasted work, the UI is
+# refreshed at most this often (seconds) while text streams in
+UPDATE_INTERVAL = 0.05
+
+FORMATTER = HtmlFormatter(style='monokai')
+HIGHLIGHT_CSS = FORMATTER.get_style_defs('.highlight')
 
-# Chat function
-def chat(message, history):
-    history.append((message, f"Bot: You said: {message}"))
-    return "", history
+# Shared SandboxPool, see get_executor()
+_executor = None
+_executor_lock = threading.Lock()
 
-# Code display function with syntax highlighting 
+def get_executor():
+    # Started on first use rather than by main(), so `gradio gardio_app.py`
+    # and importing the module don't run scripts in the server process
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from sandbox import SandboxPool
+            _executor = SandboxPool()
+            atexit.register(_executor.close)
+        return _executor
+
+# Code display function with syntax highlighting
 def display_code(code):
     try:
-        # Apply syntax highlighting
-        highlighted = highlight(code, PythonLexer(), HtmlFormatter(style='monokai'))
-        # Add CSS for styling
-        css = HtmlFormatter(style='monokai').get_style_defs('.highlight')
-        # Combine CSS and highlighted code
-        html = f"<style>{css}</style><div class='highlight'>{highlighted}</div>"
-        return html
+        highlighted = highlight(code, PythonLexer(), FORMATTER)
+        return f"<style>{HIGHLIGHT_CSS}</style><div class='highlight'>{highlighted}</div>"
     except Exception as e:
         return f"Error highlighting code: {str(e)}"
 
-# Sample Python code to display
-default_code = '''
-def hello_world():
-    print("Hello, World!")
-    
-class Example:
-    def __init__(self):
-        self.value = 42
-        
-    def get_value(self):
-        return self.value
-'''
+def format_reply(status, code, output):
+    # Chat message for the run so far: status line, script, output
+    reply = f"**{status}**\n\n```python\n{code.strip()}\n```"
+    if output:
+        reply += f"\n\nOutput:\n```\n{output.strip()}\n```"
+    return reply
+
+def final_status(run_results):
+    last = run_results[-1]
+    if 'reused_from' in last:
+        return f"Reused script {last['reused_from']}"
+    if last['is_error']:
+        return f"Failed after {last['fix_iterations']} fixes: {last['error_message']}"
+    return f"Done after {last['fix_iterations']} fixes"
+
+# Chat function: streams one run_and_fix into the chat, code and output panes
+async def chat(message, history):
+    history = history + [{"role": "user", "content": message}, {"role": "assistant", "content": ""}]
+    status, code, output = "Generating", "", ""
+    steps = 0
+    streaming = False
+    last_update = 0.0
+    yield "", history, display_code(code), output
+    async for event in coding_agents.astream_run_and_fix(message, max_iterations=MAX_ITERATIONS, executor=get_executor()):
+        kind = event['type']
+        if kind == 'token':
+            if not streaming:
+                # A new reply replaces the script shown so far
+                code, streaming = "", True
+                status = "Generating" if steps == 0 else f"Fixing (attempt {steps})"
+            code += event['text']
+        elif kind == 'script':
+            code, streaming, steps = event['script'], False, steps + 1
+            status, output = "Running", ""
+        elif kind == 'output':
+            output += event['text']
+        else:
+            run_results = event['run_results']
+            code = run_results[-1]['script']
+            output = run_results[-1]['output'] or run_results[-1]['error_message']
+            status = final_status(run_results)
+        now = time.monotonic()
+        if kind in ('token', 'output') and now - last_update < UPDATE_INTERVAL:
+            continue
+        last_update = now
+        shown = coding_agents.remove_non_python(code)
+        history[-1]["content"] = format_reply(status, shown, output)
+        yield "", history, display_code(shown), output
 
 # Create Gradio interface
 with gr.Blocks() as demo:
     gr.HTML("<h1>Python Code Chat Interface</h1>")
-    
+
     with gr.Row():
         # Chat interface on the left
-        chatbot = gr.Chatbot()
         with gr.Column():
-            msg = gr.Textbox(label="Message")
-            clear = gr.Button("Clear")
-        
-        # Code display on the right
-        code_display = gr.HTML(value=display_code(default_code))
-    
+            chatbot = gr.Chatbot(type='messages')
+            msg = gr.Textbox(label="Task")
+            with gr.Row():
+                stop = gr.Button("Stop")
+                clear = gr.Button("Clear")
+
+        # Code and run output on the right
+        with gr.Column():
+            code_display = gr.HTML(value=display_code(""))
+            run_output = gr.Textbox(label="Output", lines=10, interactive=False)
+
     # Handle events
-    msg.submit(chat, [msg, chatbot], [msg, chatbot])
+    run_event = msg.submit(chat, [msg, chatbot], [msg, chatbot, code_display, run_output],
+                           concurrency_limit=CONCURRENCY)
+    # Cancelling the handler cancels the run behind it
+    stop.click(None, None, None, cancels=[run_event], queue=False)
     clear.click(lambda: [], None, chatbot, queue=False)
 
+demo.queue(default_concurrency_limit=CONCURRENCY, max_size=QUEUE_SIZE)
+
+def main():
+    demo.launch()
+
 # Launch the interface
 if __name__ == "__main__":
-    demo.launch()
+    main()
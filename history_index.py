@@ -0,0 +1,275 @@
+import os
+import re
+import ast
+import json
+import sqlite3
+import hashlib
+import textwrap
+import threading
+
+import code_analysis
+from history_store import HistoryStore
+
+# Words too common in task descriptions to say anything about similarity
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'to', 'of', 'in', 'on', 'for', 'from', 'with',
+    'that', 'it', 'as', 'is', 'are', 'be', 'by', 'all', 'get', 'write',
+    'function', 'python', 'code', 'return', 'returns', 'this', 'its', 'or',
+}
+
+
+def stem(word):
+    # Crude suffix stripping so "runs"/"running" match "run"
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 3 and word[-1] == word[-2]:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    words = re.findall(r'[a-z0-9]+', text.lower().replace('_', ' '))
+    stems = (stem(word) for word in words)
+    return [word for word in stems if word not in STOPWORDS and len(word) > 1]
+
+
+def normalized_ast_hash(source):
+    """Hash a function's AST ignoring its name, docstring and formatting"""
+    try:
+        node = ast.parse(textwrap.dedent(source)).body[0]
+    except (SyntaxError, IndexError):
+        return None
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        node.name = '_'
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], 'value', None), ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+    return hashlib.sha1(ast.dump(node, include_attributes=False).encode('utf-8')).hexdigest()
+
+
+class HistoryIndex:
+    """
+    Search index over every script in a history folder's HistoryStore.
+
+    Stores each script's prompt and source plus its functions (name,
+    arguments, return lines and a normalized-AST hash) in SQLite next to
+    the store. Since the store is append-only, catching up only reads the
+    records added after the last one indexed, including those saved by
+    other processes.
+    """
+
+    _instances = {}
+
+    def __init__(self, history_folder='history', path=None, store=None):
+        self.history_folder = history_folder
+        self.path = path or os.path.join(history_folder, 'index.sqlite')
+        self.store = store or HistoryStore.for_folder(history_folder)
+        self._conn = None
+        self._has_fts = False
+        self._indexed_to = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_folder(cls, history_folder='history'):
+        """Shared index instance for a history folder"""
+        key = os.path.abspath(history_folder)
+        if key not in cls._instances:
+            cls._instances[key] = cls(history_folder)
+        return cls._instances[key]
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        os.makedirs(self.history_folder, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scripts (
+                id INTEGER PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                script TEXT NOT NULL,
+                mtime REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS functions (
+                script_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                header TEXT NOT NULL,
+                arguments TEXT NOT NULL,
+                returns TEXT NOT NULL,
+                ast_hash TEXT,
+                source TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS functions_script ON functions (script_id);
+            CREATE INDEX IF NOT EXISTS functions_name ON functions (name);
+            CREATE INDEX IF NOT EXISTS functions_hash ON functions (ast_hash);
+        """)
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS scripts_fts "
+                "USING fts5(prompt, names, tokenize='porter')"
+            )
+            self._has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5, fall back to scanning the prompts
+            self._has_fts = False
+        conn.commit()
+        self._conn = conn
+        indexed_to, indexed = conn.execute("SELECT MAX(id), COUNT(*) FROM scripts").fetchone()
+        if indexed_to is not None and self.store.count(through=indexed_to) > indexed:
+            # Records below the mark were skipped (e.g. migrated runs), index everything again
+            indexed_to = None
+        self._indexed_to = indexed_to
+        return conn
+
+    def add_script(self, index, script, task_description, mtime=0):
+        """
+        Index (or re-index) the script saved under the given history index.
+
+        Only a script right after the last one indexed moves sync()'s
+        mark, so store records below it are never skipped.
+        """
+        try:
+            functions = code_analysis.analyze(script, calls=False).functions
+        except SyntaxError:
+            functions = []
+        rows = [
+            (
+                index,
+                function.name,
+                function.header.strip(),
+                json.dumps(function.arguments),
+                json.dumps(function.return_lines),
+                normalized_ast_hash(function.source),
+                function.source
+            )
+            for function in functions
+        ]
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM functions WHERE script_id = ?", (index,))
+            conn.execute(
+                "INSERT OR REPLACE INTO scripts (id, prompt, script, mtime) VALUES (?, ?, ?, ?)",
+                (index, task_description, script, mtime)
+            )
+            conn.executemany("INSERT INTO functions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            if index == (self._indexed_to or 0) + 1:
+                self._indexed_to = index
+            if self._has_fts:
+                conn.execute("DELETE FROM scripts_fts WHERE rowid = ?", (index,))
+                conn.execute(
+                    "INSERT INTO scripts_fts (rowid, prompt, names) VALUES (?, ?, ?)",
+                    (index, task_description, ' '.join(row[1].replace('_', ' ') for row in rows))
+                )
+            conn.commit()
+
+    def sync(self):
+        """Index the store records added since the last sync"""
+        with self._lock:
+            self._connect()
+            last_id = self.store.last_id()
+            if last_id is None or (self._indexed_to is not None and last_id <= self._indexed_to):
+                return
+            for record in self.store.records(after=self._indexed_to):
+                self.add_script(record['id'], record['script'], record['prompt'], record['created'])
+                self._indexed_to = record['id']
+
+    def largest_index(self):
+        """Highest history index, or None when the history is empty"""
+        with self._lock:
+            self.sync()
+            return self._indexed_to
+
+    def next_index(self):
+        # Only a guess under concurrency, HistoryStore.append allocates ids
+        largest = self.largest_index()
+        return 0 if largest is None else largest + 1
+
+    def find_functions(self, name=None, ast_hash=None):
+        """Indexed functions matching a name and/or normalized-AST hash"""
+        query = "SELECT script_id, name, header, arguments, returns, ast_hash, source FROM functions WHERE 1=1"
+        params = []
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        if ast_hash is not None:
+            query += " AND ast_hash = ?"
+            params.append(ast_hash)
+        with self._lock:
+            self.sync()
+            rows = self._connect().execute(query, params).fetchall()
+        return [
+            {
+                'script_id': script_id,
+                'name': name,
+                'header': header,
+                'arguments': json.loads(arguments),
+                'returns': json.loads(returns),
+                'ast_hash': ast_hash,
+                'original': source
+            }
+            for script_id, name, header, arguments, returns, ast_hash, source in rows
+        ]
+
+    def search(self, task_description, limit=5):
+        """Rank saved scripts by word overlap with a task description"""
+        words = set(tokenize(task_description))
+        if not words:
+            return []
+        # The FTS table stems with porter, so it gets the words as written rather than our stems
+        terms = {word for word in re.findall(r'[a-z0-9]+', task_description.lower().replace('_', ' '))
+                 if word not in STOPWORDS and len(word) > 1}
+        with self._lock:
+            self.sync()
+            conn = self._connect()
+            if self._has_fts:
+                rows = conn.execute(
+                    "SELECT s.id, s.prompt, f.names FROM scripts_fts f JOIN scripts s ON s.id = f.rowid "
+                    "WHERE scripts_fts MATCH ? ORDER BY bm25(scripts_fts) LIMIT ?",
+                    (' OR '.join(f'"{term}"' for term in terms), limit * 4)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT s.id, s.prompt, group_concat(f.name, ' ') FROM scripts s "
+                    "LEFT JOIN functions f ON f.script_id = s.id GROUP BY s.id"
+                ).fetchall()
+
+        scored = []
+        for index, prompt, names in rows:
+            candidate = set(tokenize(prompt)) | set(tokenize(names or ''))
+            score = len(words & candidate) / len(words | candidate)
+            scored.append((score, index))
+        scored.sort(reverse=True)
+        return [{'id': index, 'score': score} for score, index in scored[:limit]]
+
+    def find_script(self, task_description, min_score=0.6):
+        """Best saved script for a similar task, or None below min_score"""
+        matches = self.search(task_description, limit=1)
+        if not matches or matches[0]['score'] < min_score:
+            return None
+        with self._lock:
+            script = self._connect().execute(
+                "SELECT script FROM scripts WHERE id = ?", (matches[0]['id'],)
+            ).fetchone()[0]
+        return {'id': matches[0]['id'], 'score': matches[0]['score'], 'script': script}
+
+    def find_scripts(self, task_descriptions, min_score=0.6):
+        """find_script for many tasks at once"""
+        return [self.find_script(task, min_score) for task in task_descriptions]
+
+    def records(self):
+        """(index, prompt, script) for every indexed script"""
+        with self._lock:
+            self.sync()
+            return self._connect().execute(
+                "SELECT id, prompt, script FROM scripts ORDER BY id"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
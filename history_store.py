@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+STORE_FILENAME = 'history.sqlite'
+SCHEMA_VERSION = 1
+
+# Files written by save_as_descriptive_name before the store existed
+LEGACY_PROMPT_PATTERN = re.compile(r'ca_(\d+)_prompt\.txt$')
+LEGACY_CODE_PATTERN = re.compile(r'ca_code_(\d+)(?:_.*)?\.py$')
+
+
+def _dumps(value):
+    # Run results can hold arbitrary objects (e.g. a script's return value)
+    return None if value is None else json.dumps(value, default=repr)
+
+
+def _loads(value):
+    return None if value is None else json.loads(value)
+
+
+class HistoryStore:
+    """
+    Append-only store of every run: prompt, script, run results and metadata.
+
+    Records live in one SQLite database in WAL mode, so readers never block
+    the writer and a crash mid-save leaves either the whole record or none
+    of it. Ids come from the INSERT itself (AUTOINCREMENT), which makes
+    allocation atomic across threads and processes and never reuses an id,
+    and every lookup is by primary key instead of a directory listing.
+
+    Files from the old one-file-per-run layout (ca_{i}_prompt.txt and
+    ca_code_{i}.py) are imported once, keeping their ids, when the store is
+    first opened. The files themselves are left where they are.
+    """
+
+    _instances = {}
+
+    def __init__(self, history_folder='history', path=None):
+        self.history_folder = history_folder
+        self.path = path or os.path.join(history_folder, STORE_FILENAME)
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_folder(cls, history_folder='history'):
+        """Shared store instance for a history folder"""
+        key = os.path.abspath(history_folder)
+        if key not in cls._instances:
+            cls._instances[key] = cls(history_folder)
+        return cls._instances[key]
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        os.makedirs(self.history_folder, exist_ok=True)
+        # Autocommit mode, transactions are opened explicitly below
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL never corrupts the database; a power cut can
+        # at worst lose the last few commits
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                prompt TEXT NOT NULL,
+                script TEXT NOT NULL,
+                run_results TEXT,
+                metadata TEXT
+            )
+        """)
+        self._conn = conn
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._migrate(conn)
+        return conn
+
+    def _migrate(self, conn):
+        # BEGIN IMMEDIATE takes the write lock, so when several processes
+        # open a fresh store only the first one imports the legacy files
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO runs (id, created, prompt, script, run_results, metadata) "
+                    "VALUES (?, ?, ?, ?, NULL, ?)",
+                    legacy_records(self.history_folder)
+                )
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def append(self, prompt, script, run_results=None, metadata=None):
+        """Store a run and return its newly allocated id"""
+        with self._lock:
+            cursor = self._connect().execute(
+                "INSERT INTO runs (created, prompt, script, run_results, metadata) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), prompt, script, _dumps(run_results), _dumps(metadata))
+            )
+            return cursor.lastrowid
+
+    def get(self, run_id):
+        """The record stored under run_id, or None"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, created, prompt, script, run_results, metadata FROM runs WHERE id = ?", (run_id,)
+            ).fetchone()
+        return self._record(row) if row is not None else None
+
+    def script(self, run_id):
+        """Just the script stored under run_id, or None"""
+        with self._lock:
+            row = self._connect().execute("SELECT script FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def records(self, after=None):
+        """Every record in id order, or only those with an id above `after`"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, created, prompt, script, run_results, metadata FROM runs WHERE id > ? ORDER BY id",
+                (-1 if after is None else after,)
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def last_id(self):
+        """Highest id in the store, or None when it is empty"""
+        with self._lock:
+            return self._connect().execute("SELECT MAX(id) FROM runs").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def count(self, through=None):
+        """Number of records, or of those with an id up to `through`"""
+        if through is None:
+            return len(self)
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM runs WHERE id <= ?", (through,)).fetchone()[0]
+
+    @staticmethod
+    def _record(row):
+        run_id, created, prompt, script, run_results, metadata = row
+        return {
+            'id': run_id,
+            'created': created,
+            'prompt': prompt,
+            'script': script,
+            'run_results': _loads(run_results),
+            'metadata': _loads(metadata) or {}
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def legacy_records(history_folder):
+    """(id, created, prompt, script, metadata) rows for the old per-run files"""
+    try:
+        files = os.listdir(history_folder)
+    except OSError:
+        return []
+    rows = []
+    for file in sorted(files):
+        match = LEGACY_PROMPT_PATTERN.match(file)
+        if not match:
+            continue
+        index = int(match.group(1))
+        prompt_path = os.path.join(history_folder, file)
+        code_path = os.path.join(history_folder, f'ca_code_{index}.py')
+        try:
+            with open(prompt_path, 'r') as f:
+                prompt = f.read()
+            with open(code_path, 'r') as f:
+                script = f.read()
+            created = max(os.path.getmtime(prompt_path), os.path.getmtime(code_path))
+        except OSError:
+            continue
+        migrated_from = [file] + sorted(
+            other for other in files
+            if (code_match := LEGACY_CODE_PATTERN.match(other)) and int(code_match.group(1)) == index
+        )
+        rows.append((index, created, prompt, script, _dumps({'migrated_from': migrated_from})))
+    return rows
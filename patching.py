@@ -0,0 +1,140 @@
+import re
+import ast
+import code_analysis
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+FENCE_PATTERN = re.compile(r'```[\w+-]*\n(.*?)```', re.DOTALL)
+FILE_HEADER_PREFIXES = ('--- ', '+++ ', 'diff ', 'index ')
+
+
+class PatchError(Exception):
+    """A fix reply could not be applied to the script"""
+    pass
+
+
+class Hunk:
+    """One @@ section of a unified diff"""
+    __slots__ = ('start', 'old', 'new')
+
+    def __init__(self, start):
+        # 1-based line the hunk claims to start at, only used as a hint
+        self.start = start
+        self.old = []
+        self.new = []
+
+    def __repr__(self):
+        return f"Hunk(start={self.start}, -{len(self.old)} +{len(self.new)})"
+
+
+def strip_fences(text):
+    """Contents of the markdown code blocks in text, or text itself"""
+    blocks = FENCE_PATTERN.findall(text)
+    if blocks:
+        return '\n'.join(block.rstrip('\n') for block in blocks)
+    return text.strip('\n')
+
+
+def is_unified_diff(text):
+    return any(HUNK_HEADER.match(line) for line in text.split('\n'))
+
+
+def parse_unified_diff(diff):
+    """Hunks of a unified diff; file headers and line counts are ignored"""
+    hunks = []
+    hunk = None
+    for line in diff.split('\n'):
+        match = HUNK_HEADER.match(line)
+        if match:
+            hunk = Hunk(int(match.group(1)))
+            hunks.append(hunk)
+        elif hunk is None or line.startswith(FILE_HEADER_PREFIXES) or line.startswith('\\'):
+            continue
+        elif line.startswith('-'):
+            hunk.old.append(line[1:])
+        elif line.startswith('+'):
+            hunk.new.append(line[1:])
+        elif line.startswith(' '):
+            hunk.old.append(line[1:])
+            hunk.new.append(line[1:])
+        elif line == '':
+            # Models often drop the leading space of blank context lines
+            hunk.old.append('')
+            hunk.new.append('')
+        else:
+            raise PatchError(f"Unexpected line in diff: {line!r}")
+    # A trailing blank line is usually the end of the reply, not context
+    for hunk in hunks:
+        while hunk.old and hunk.new and hunk.old[-1] == '' and hunk.new[-1] == '':
+            hunk.old.pop()
+            hunk.new.pop()
+    return hunks
+
+
+def _find(lines, block, hint, start):
+    # Position of block in lines at or after start, nearest to hint;
+    # trailing whitespace is ignored since models rarely reproduce it
+    if not block:
+        return max(start, min(hint, len(lines)))
+    wanted = [line.rstrip() for line in block]
+    candidates = [
+        i for i in range(start, len(lines) - len(block) + 1)
+        if lines[i].rstrip() == wanted[0]
+        and [line.rstrip() for line in lines[i:i + len(block)]] == wanted
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda i: abs(i - hint))
+
+
+def apply_unified_diff(script, diff):
+    """
+    Apply a unified diff to script.
+
+    Hunks are located by their context and removed lines rather than by the
+    line numbers in their headers, which models often get wrong. Raises
+    PatchError when a hunk does not match the script.
+    """
+    hunks = parse_unified_diff(diff)
+    if not hunks:
+        raise PatchError("Diff has no hunks")
+    lines = script.split('\n')
+    position = 0
+    for hunk in hunks:
+        index = _find(lines, hunk.old, hunk.start - 1, position)
+        if index is None:
+            raise PatchError(f"Hunk at line {hunk.start} does not match the script")
+        lines[index:index + len(hunk.old)] = hunk.new
+        position = index + len(hunk.new)
+    return '\n'.join(lines)
+
+
+def apply_patch(script, reply):
+    """
+    Apply a fix reply to script and return the patched script.
+
+    The reply may be a unified diff, a set of replacement definitions
+    (functions, classes and imports, spliced in by name) or a complete
+    rewritten script, which is returned as is. Raises PatchError when the
+    reply is none of these or the patched script does not compile.
+    """
+    body = strip_fences(reply)
+    if is_unified_diff(body):
+        patched = apply_unified_diff(script, body)
+    else:
+        try:
+            tree = ast.parse(body)
+        except SyntaxError as e:
+            raise PatchError(f"Reply is neither a diff nor valid Python: {e}")
+        if code_analysis.is_definition_fragment(tree):
+            try:
+                patched = code_analysis.merge_definitions(script, body)
+            except SyntaxError as e:
+                raise PatchError(f"Cannot merge definitions into an invalid script: {e}")
+        else:
+            # The model rewrote the whole script after all
+            patched = body
+    try:
+        compile(patched, '<patched>', 'exec')
+    except SyntaxError as e:
+        raise PatchError(f"Patched script does not compile: {e}")
+    return patched
@@ -0,0 +1,346 @@
+import os
+import re
+import ast
+import math
+import code_analysis
+
+# Token counts are estimated locally (no tokenizer download or API call):
+# identifiers and numbers cost one token per ~4 characters, every symbol
+# and every run of whitespace one token. This errs slightly high for code.
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]|\s+')
+CHARS_PER_TOKEN = 4
+
+# Context windows of models not described in a settings YAML
+KNOWN_CONTEXT_LENGTHS = {
+    'claude-3-5-sonnet': 200000,
+    'claude-3-5-haiku': 200000,
+    'claude-3-opus': 200000,
+    'claude-3-sonnet': 200000,
+    'claude-3-haiku': 200000,
+}
+DEFAULT_CONTEXT_LENGTH = 8192
+
+# Settings files whose `models:` sections carry context_length
+SETTINGS_PATHS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents', 'groq_settings.yaml'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openai_settings.yaml'),
+]
+
+# Soft cap on fix prompts; a fix only needs the failing code, not the module
+DEFAULT_MAX_PROMPT_TOKENS = 3000
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+DEFAULT_MAX_FRAMES = 4
+SCRIPT_FILENAME = '<string>'
+
+FRAME_PATTERN = re.compile(r'^  File "(.*)", line (\d+)(?:, in (.*))?$')
+
+compact_fix_prompt = """
+The following excerpt is from a longer script that did not work. Only the code related to the error is shown.
+
+### Code:
+{excerpt}
+
+### Error:
+{error_string}
+
+Return the corrected versions of the functions or classes above, plus any imports they need. Return only definitions: do not repeat unchanged code and do not add code that calls them.
+"""
+
+_context_lengths = None
+
+
+def count_tokens(text):
+    """Estimated number of tokens in text"""
+    return sum(
+        math.ceil(len(piece) / CHARS_PER_TOKEN) if piece[0].isalnum() or piece[0] == '_' else 1
+        for piece in TOKEN_PATTERN.findall(text)
+    )
+
+
+def _load_context_lengths(settings_paths):
+    from agents.config_registry import get_registry
+    context_lengths = {}
+    for path in settings_paths:
+        try:
+            settings = get_registry().load(path)
+        except OSError:
+            continue
+        for model, model_settings in (settings.get('models') or {}).items():
+            if isinstance(model_settings, dict) and 'context_length' in model_settings:
+                context_lengths[model] = model_settings['context_length']
+    return context_lengths
+
+
+def model_context_length(model, settings_paths=None):
+    """Context window of model from the settings YAMLs, known models or the default"""
+    global _context_lengths
+    if settings_paths is not None:
+        context_lengths = _load_context_lengths(settings_paths)
+    else:
+        if _context_lengths is None:
+            _context_lengths = _load_context_lengths(SETTINGS_PATHS)
+        context_lengths = _context_lengths
+    if model in context_lengths:
+        return context_lengths[model]
+    for prefix, context_length in KNOWN_CONTEXT_LENGTHS.items():
+        if model and model.startswith(prefix):
+            return context_length
+    return DEFAULT_CONTEXT_LENGTH
+
+
+class PromptBudget:
+    """Token limits a prompt has to fit in"""
+
+    def __init__(self, max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS, context_length=DEFAULT_CONTEXT_LENGTH,
+                 max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.context_length = context_length
+        self.max_output_tokens = max_output_tokens
+
+    @classmethod
+    def for_llm(cls, llm, max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS):
+        """Budget for a llama_index LLM, from its model name and max_tokens"""
+        model = getattr(llm, 'model', None)
+        max_output_tokens = getattr(llm, 'max_tokens', None) or DEFAULT_MAX_OUTPUT_TOKENS
+        return cls(max_prompt_tokens, model_context_length(model), max_output_tokens)
+
+    @property
+    def limit(self):
+        # The prompt and the response share the context window
+        room = self.context_length - min(self.max_output_tokens, self.context_length // 2)
+        if self.max_prompt_tokens is None:
+            return room
+        return min(self.max_prompt_tokens, room)
+
+    def fits(self, text):
+        return count_tokens(text) <= self.limit
+
+
+def trim_traceback(error_text, script=None, max_frames=DEFAULT_MAX_FRAMES, filename=SCRIPT_FILENAME):
+    """
+    Keep only the frames of a traceback that point into the script.
+
+    Frames inside run_code, the interpreter or libraries are dropped (the
+    innermost library frame is kept when the script has none), only the
+    last max_frames script frames are kept, and when script is given its
+    source line is shown under each frame. Text that is not a traceback is
+    returned unchanged.
+    """
+    start = error_text.rfind('Traceback (most recent call last):')
+    if start == -1:
+        return error_text
+    lines = error_text[start:].rstrip('\n').split('\n')
+    script_lines = script.split('\n') if script is not None else None
+
+    frames = []
+    message_start = len(lines)
+    i = 1
+    while i < len(lines):
+        match = FRAME_PATTERN.match(lines[i])
+        if match is None:
+            if not lines[i].startswith(' '):
+                message_start = i
+                break
+            i += 1
+            continue
+        body = []
+        i += 1
+        while i < len(lines) and lines[i].startswith('    '):
+            body.append(lines[i])
+            i += 1
+        frames.append((match.group(1), int(match.group(2)), lines[i - len(body) - 1], body))
+
+    in_script = [frame for frame in frames if frame[0] == filename]
+    kept = in_script[-max_frames:] if in_script else frames[-1:]
+    trimmed = [lines[0]]
+    if len(kept) < len(frames):
+        trimmed.append(f"  ... {len(frames) - len(kept)} frames outside the script omitted")
+    for path, lineno, header, body in kept:
+        trimmed.append(header)
+        if path == filename and script_lines is not None and 0 < lineno <= len(script_lines):
+            trimmed.append('    ' + script_lines[lineno - 1].strip())
+        else:
+            trimmed.extend(body)
+    trimmed.extend(lines[message_start:])
+    return '\n'.join(trimmed)
+
+
+def failing_lines(error_text, filename=SCRIPT_FILENAME):
+    """Script line numbers in a traceback, innermost last"""
+    lines = []
+    for line in error_text.split('\n'):
+        match = FRAME_PATTERN.match(line)
+        if match and match.group(1) == filename:
+            lines.append(int(match.group(2)))
+    return lines
+
+
+def truncate_middle(text, max_tokens):
+    """Cut text to about max_tokens, keeping its head and tail"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.split('\n')
+    head, tail = [], []
+    used = count_tokens('... truncated ...')
+    while lines:
+        # Alternate so the final error message at the tail survives
+        line = lines.pop() if len(tail) <= len(head) else lines.pop(0)
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        used += cost
+        if len(tail) <= len(head):
+            tail.insert(0, line)
+        else:
+            head.append(line)
+    return '\n'.join(head + ['... truncated ...'] + tail)
+
+
+def _enclosing_function(analysis, lineno):
+    # Innermost function whose lines include lineno
+    best = None
+    for function in analysis.functions:
+        if function.lineno <= lineno <= function.end_lineno:
+            if best is None or function.lineno >= best.lineno:
+                best = function
+    return best
+
+
+def relevant_functions(analysis, error_text):
+    """
+    Functions needed to fix the error: the ones on the traceback, innermost
+    first, followed by everything they call that the script defines.
+    """
+    by_name = {}
+    for function in analysis.functions:
+        by_name.setdefault(function.name, function)
+        by_name.setdefault(function.qualname, function)
+
+    focus = []
+    calls = []
+    for lineno in reversed(failing_lines(error_text)):
+        function = _enclosing_function(analysis, lineno)
+        if function is None:
+            # The error is in module-level code, whatever it calls is relevant
+            calls.extend(analysis.call_graph.get(code_analysis.MODULE_SCOPE, []))
+        elif function not in focus:
+            focus.append(function)
+
+    # Breadth-first over the call graph so direct dependencies come first
+    queue = [callee for function in focus for callee in function.calls] + calls
+    while queue:
+        callee = queue.pop(0)
+        function = by_name.get(callee) or by_name.get(callee.split('.')[-1])
+        if function is not None and function not in focus:
+            focus.append(function)
+            queue.extend(function.calls)
+    return focus
+
+
+def _outermost(functions):
+    # Nested functions are shown as part of the function that contains them
+    kept = []
+    for function in functions:
+        if not any(other is not function and other.lineno <= function.lineno and function.end_lineno <= other.end_lineno
+                   for other in functions):
+            kept.append(function)
+    return kept
+
+
+def excerpt(analysis, functions):
+    """Source of the given functions with the script's imports, methods inside their class"""
+    parts = []
+    imports = sorted({lineno for *_, lineno in analysis.imports})
+    import_lines = [analysis.lines[lineno - 1] for lineno in imports
+                    if not analysis.lines[lineno - 1].startswith((' ', '\t'))]
+    if import_lines:
+        parts.append('\n'.join(import_lines))
+    by_class = {}
+    for function in sorted(_outermost(functions), key=lambda function: function.lineno):
+        if function.is_method:
+            class_info = next((class_info for class_info in analysis.classes if class_info.name == function.class_name), None)
+            if class_info is not None:
+                by_class.setdefault(class_info.qualname, (class_info, []))[1].append(function)
+                continue
+        parts.append(function.source)
+    for class_info, methods in by_class.values():
+        parts.append('\n'.join([analysis.lines[class_info.lineno - 1]] + [method.source for method in methods]))
+    return '\n\n'.join(parts)
+
+
+def build_fix_prompt(script, error_string, coding_agent_prompt, budget=None):
+    """
+    Prompt for fixing script, compacted to fit budget.
+
+    Returns (prompt, compacted). When the full script and error fit, the
+    prompt is the same one fix_script has always sent and compacted is
+    False. Otherwise the prompt only shows the failing functions and their
+    dependencies with a trimmed traceback, compacted is True, and the reply
+    is a set of definitions to splice back with apply_fix. When there is
+    nothing to narrow down to, the full prompt is sent as long as it fits
+    the context window: a cut-down script could not be spliced back.
+    """
+    budget = budget or PromptBudget()
+    error_string = trim_traceback(error_string, script)
+    full_prompt = coding_agent_prompt.format(task_description=f"The following script was generated to solve a task, but it did not work. Please correct it: {script}. The result of running the script was: {error_string}")
+    if budget.fits(full_prompt):
+        return full_prompt, False
+
+    # Give the error at most a quarter of the budget, the code the rest
+    error_string = truncate_middle(error_string, budget.limit // 4)
+    try:
+        analysis = code_analysis.analyze(script)
+    except SyntaxError:
+        analysis = None
+    functions = relevant_functions(analysis, error_string) if analysis is not None else []
+    if not functions:
+        # Nothing to narrow down to: the reply has to be the whole script,
+        # so the whole script is sent, up to the context window rather
+        # than the soft cap (past it the provider rejects the request)
+        prompt = coding_agent_prompt.format(task_description=f"The following script was generated to solve a task, but it did not work. Please correct it: {script}. The result of running the script was: {error_string}")
+        return prompt, False
+
+    def render(functions):
+        return coding_agent_prompt.format(task_description=compact_fix_prompt.format(
+            excerpt=excerpt(analysis, functions), error_string=error_string))
+
+    # Drop the most distant dependencies until the prompt fits
+    prompt = render(functions)
+    while len(functions) > 1 and not budget.fits(prompt):
+        functions = functions[:-1]
+        prompt = render(functions)
+    if not budget.fits(prompt):
+        overhead = count_tokens(render([])) + 64
+        code = truncate_middle(excerpt(analysis, functions), budget.limit - overhead)
+        prompt = coding_agent_prompt.format(task_description=compact_fix_prompt.format(
+            excerpt=code, error_string=error_string))
+    return prompt, True
+
+
+def _defined_names(source):
+    return {node.name for node in ast.parse(source).body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+
+
+def apply_fix(script, fix):
+    """
+    Merge a reply to a compacted prompt back into the full script.
+
+    A reply that redefines everything the script defines is a rewrite of
+    the whole script and replaces it. Any other reply only contributes its
+    definitions and imports, so code the prompt did not show is never
+    lost; a reply that does not parse leaves the script as it was.
+    """
+    try:
+        return code_analysis.merge_definitions(script, fix)
+    except SyntaxError:
+        return script
+    except ValueError:
+        # Statements besides definitions, e.g. the whole script or example calls
+        pass
+    if _defined_names(fix) >= _defined_names(script):
+        return fix
+    definitions = code_analysis.definitions_only(fix)
+    if not definitions:
+        return script
+    return code_analysis.merge_definitions(script, definitions)
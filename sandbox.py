@@ -0,0 +1,305 @@
+import os
+import sys
+import time
+import pickle
+import threading
+import importlib
+import traceback
+import multiprocessing
+from io import StringIO
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+
+import code_cache
+
+try:
+    import resource
+except ImportError:
+    # resource limits are only available on Unix
+    resource = None
+
+
+# Modules imported once per worker so generated scripts don't pay for them
+PRELOAD_MODULES = [
+    'os', 're', 'json', 'math', 'random', 'string', 'itertools',
+    'collections', 'functools', 'datetime', 'typing', 'ast', 'inspect',
+]
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MEMORY_LIMIT = 1024 * 1024 * 1024
+DEFAULT_MAX_JOBS_PER_WORKER = 100
+
+
+def error_result(error_message, output='', stderr='', tb=''):
+    return {
+        'is_error': True,
+        'result': None,
+        'output': output,
+        'error_message': error_message,
+        'stderr': stderr,
+        'traceback': tb
+    }
+
+
+class StreamingOutput(StringIO):
+    """
+    StringIO that also hands writes to on_output as they happen.
+
+    Only writes from the thread that created it are passed on: in-process
+    runs swap sys.stdout for every thread, and output printed by whoever
+    consumes the stream must not feed back into it.
+    """
+
+    def __init__(self, on_output):
+        super().__init__()
+        self.on_output = on_output
+        self.thread = threading.get_ident()
+
+    def write(self, text):
+        written = super().write(text)
+        if text and threading.get_ident() == self.thread:
+            self.on_output(text)
+        return written
+
+
+def execute(code_string, on_output=None):
+    """
+    Execute code_string like coding_agents.run_code, capturing stdout and stderr.
+
+    on_output, when given, is called with each piece of stdout as it is written.
+    """
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    redirected_output = sys.stdout = StringIO() if on_output is None else StreamingOutput(on_output)
+    redirected_error = sys.stderr = StringIO()
+    try:
+        try:
+            exec_result = code_cache.run_script(code_string)
+        except SystemExit as e:
+            # sys.exit() and sys.exit(0) end a script that worked
+            if e.code not in (0, None):
+                raise
+            exec_result = None
+        return {
+            'is_error': False,
+            'result': exec_result,
+            'output': redirected_output.getvalue().strip(),
+            'error_message': '',
+            'stderr': redirected_error.getvalue().strip()
+        }
+    except (Exception, SystemExit) as e:
+        return error_result(str(e) or type(e).__name__,
+                            output=redirected_output.getvalue().strip(),
+                            stderr=redirected_error.getvalue().strip(),
+                            tb=traceback.format_exc())
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+
+
+def _picklable(value):
+    # Results travel back over a pipe, fall back to repr for anything exotic
+    try:
+        pickle.dumps(value)
+        return value
+    except Exception:
+        return repr(value)
+
+
+def _set_memory_limit(memory_limit):
+    if resource is None or not memory_limit:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        memory_limit = min(memory_limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+    return soft, hard
+
+
+def _restore_memory_limit(limits):
+    if limits is not None:
+        resource.setrlimit(resource.RLIMIT_AS, limits)
+
+
+def _worker_main(conn, preload):
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        code_string, memory_limit, stream = job
+        # Streamed stdout goes back as ('output', text) messages ahead of the result
+        on_output = (lambda text: conn.send(('output', text))) if stream else None
+        limits = _set_memory_limit(memory_limit)
+        try:
+            result = execute(code_string, on_output)
+        except MemoryError:
+            result = error_result('MemoryError: job exceeded its memory limit')
+        except Exception:
+            result = error_result(traceback.format_exc())
+        finally:
+            _restore_memory_limit(limits)
+
+        result['result'] = _picklable(result['result'])
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.jobs = 0
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of warm worker processes that execute generated scripts.
+
+    Every job runs in a separate process with its own stdout/stderr capture,
+    a wall-clock timeout and an address-space limit. A worker that times out
+    or dies is killed and replaced, so a runaway script never blocks the pool.
+    Results have the same shape as coding_agents.run_code plus a 'stderr' key.
+    """
+
+    def __init__(self,
+                 workers=None,
+                 timeout=DEFAULT_TIMEOUT,
+                 memory_limit=DEFAULT_MEMORY_LIMIT,
+                 preload=PRELOAD_MODULES,
+                 max_jobs_per_worker=DEFAULT_MAX_JOBS_PER_WORKER,
+                 start_method=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.preload = list(preload)
+        self.max_jobs_per_worker = max_jobs_per_worker
+
+        # forkserver keeps a warm parent with the preloaded modules, so
+        # replacing a killed worker is a cheap fork instead of a cold start
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self._ctx.set_forkserver_preload(self.preload)
+
+        self._idle = Queue()
+        self._all_workers = set()
+        self._dispatcher = ThreadPoolExecutor(max_workers=self.workers,
+                                              thread_name_prefix='sandbox')
+        self._closed = False
+        for _ in range(self.workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=_worker_main,
+                                    args=(child_conn, self.preload),
+                                    daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        self._all_workers.add(worker)
+        return worker
+
+    def _replace(self, worker):
+        self._all_workers.discard(worker)
+        worker.kill()
+        return self._spawn()
+
+    def _receive(self, worker, timeout, on_output):
+        # The job's result, None on timeout; output messages before it are
+        # passed to on_output and count against the same timeout
+        deadline = time.monotonic() + timeout
+        while worker.conn.poll(max(0.0, deadline - time.monotonic())):
+            message = worker.conn.recv()
+            if isinstance(message, dict):
+                return message
+            on_output(message[1])
+        return None
+
+    def _run_job(self, code_string, timeout, memory_limit, on_output=None):
+        worker = self._idle.get()
+        try:
+            worker.conn.send((code_string, memory_limit, on_output is not None))
+            result = self._receive(worker, timeout, on_output)
+            if result is not None:
+                worker.jobs += 1
+            else:
+                worker = self._replace(worker)
+                result = error_result(f"Execution timed out after {timeout} seconds")
+        except (EOFError, OSError):
+            dead = worker
+            # _replace kills and joins the old process, only then is its exit code known
+            worker = self._replace(worker)
+            result = error_result(f"Worker process died (exit code {dead.process.exitcode})")
+        finally:
+            if worker.jobs >= self.max_jobs_per_worker:
+                self._all_workers.discard(worker)
+                worker.stop()
+                worker = self._spawn()
+            self._idle.put(worker)
+        return result
+
+    def submit(self, code_string, timeout=None, memory_limit=None, on_output=None):
+        """
+        Queue a script for execution and return a concurrent.futures.Future.
+
+        on_output, when given, is called (on a pool thread) with the
+        script's stdout as it is printed.
+        """
+        if self._closed:
+            raise RuntimeError("SandboxPool is closed")
+        return self._dispatcher.submit(
+            self._run_job,
+            code_string,
+            self.timeout if timeout is None else timeout,
+            self.memory_limit if memory_limit is None else memory_limit,
+            on_output
+        )
+
+    def run(self, code_string, timeout=None, memory_limit=None, on_output=None):
+        """Execute a script and block until its result is available"""
+        return self.submit(code_string, timeout, memory_limit, on_output).result()
+
+    def map(self, code_strings, timeout=None, memory_limit=None):
+        """Execute many scripts concurrently, returning results in input order"""
+        futures = [self.submit(code, timeout, memory_limit) for code in code_strings]
+        return [future.result() for future in futures]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._dispatcher.shutdown(wait=True)
+        for worker in list(self._all_workers):
+            worker.stop()
+        self._all_workers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
@@ -0,0 +1,113 @@
+import math
+from collections import Counter
+
+import numpy as np
+
+from history_index import HistoryIndex, tokenize
+
+DEFAULT_THRESHOLD = 0.8
+
+
+def features(text):
+    # Stemmed unigrams plus bigrams so word order carries some weight
+    words = tokenize(text)
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+
+class TaskSimilarityIndex:
+    """
+    Nearest-neighbour search over saved task descriptions.
+
+    Prompts from the history index are embedded as L2-normalized TF-IDF
+    vectors in a NumPy matrix, so a query is one matrix-vector product and
+    a batch of queries is one matrix-matrix product. The vectors are
+    rebuilt automatically when new scripts are saved.
+    """
+
+    def __init__(self, history_folder='history', threshold=DEFAULT_THRESHOLD, history=None):
+        self.history = history or HistoryIndex.for_folder(history_folder)
+        self.threshold = threshold
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.scripts = []
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._built_for = None
+
+    def build(self):
+        """(Re)compute the TF-IDF matrix from the history index"""
+        records = self.history.records()
+        documents = [Counter(features(prompt)) for _, prompt, _ in records]
+
+        document_frequency = Counter()
+        for document in documents:
+            document_frequency.update(document.keys())
+        self.vocabulary = {term: i for i, term in enumerate(sorted(document_frequency))}
+
+        n_documents = len(documents)
+        self.idf = np.ones(len(self.vocabulary), dtype=np.float32)
+        for term, i in self.vocabulary.items():
+            self.idf[i] = math.log((1 + n_documents) / (1 + document_frequency[term])) + 1
+
+        self.ids = np.array([index for index, _, _ in records], dtype=np.int64)
+        self.scripts = [script for _, _, script in records]
+        self.matrix = self._vectorize(documents)
+        self._built_for = self.history.largest_index()
+
+    def _vectorize(self, documents):
+        matrix = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    # Sublinear tf keeps repeated words from dominating
+                    matrix[row, column] = 1 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _ensure_built(self):
+        if self._built_for is None or self._built_for != self.history.largest_index():
+            self.build()
+
+    def query_many(self, task_descriptions, k=1):
+        """Top-k (ids, scores) arrays of shape (len(tasks), k) by cosine similarity"""
+        self._ensure_built()
+        queries = self._vectorize([Counter(features(task)) for task in task_descriptions])
+        k = min(k, len(self.ids))
+        if k == 0:
+            empty = np.zeros((len(task_descriptions), 0))
+            return empty.astype(np.int64), empty
+        scores = queries @ self.matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return self.ids[top], np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, task_description, k=1):
+        """Top-k [(id, score)] for one task description"""
+        ids, scores = self.query_many([task_description], k)
+        return list(zip(ids[0].tolist(), scores[0].tolist()))
+
+    def find_scripts(self, task_descriptions, min_score=None):
+        """Stored script for each task whose best match clears the threshold, else None"""
+        min_score = self.threshold if min_score is None else min_score
+        ids, scores = self.query_many(task_descriptions, k=1)
+        positions = {index: position for position, index in enumerate(self.ids.tolist())}
+        matches = []
+        for row in range(len(task_descriptions)):
+            if ids.shape[1] == 0 or scores[row, 0] < min_score:
+                matches.append(None)
+                continue
+            index = int(ids[row, 0])
+            matches.append({
+                'id': index,
+                'score': float(scores[row, 0]),
+                'script': self.scripts[positions[index]]
+            })
+        return matches
+
+    def find_script(self, task_description, min_score=None):
+        """Stored script for a similar task, or None below the threshold"""
+        return self.find_scripts([task_description], min_score)[0]
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+GROQ_SETTINGS_PATH = os.path.join(ROOT, 'agents', 'groq_settings.yaml')
+
+
+class FakeChatClient:
+    """
+    Groq/OpenAI-style client.chat.completions.create answering with a
+    fixed JSON code reply after `delay` seconds, or raising `error`.
+    """
+
+    def __init__(self, code='x = 1', delay=0.0, usage=(10, 20), error=None):
+        self.code = code
+        self.delay = delay
+        self.usage = usage
+        self.error = error
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls.append(model)
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        code = self.code(model) if callable(self.code) else self.code
+        usage = None
+        if self.usage is not None:
+            usage = SimpleNamespace(prompt_tokens=self.usage[0], completion_tokens=self.usage[1])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(
+                content=json.dumps({"code": code, "explanation": "", "is_valid": True, "issues": []})))],
+            usage=usage
+        )
+
+
+class FakeLLM:
+    """
+    llama_index-style LLM. `replies` is a list answered in order (the last
+    one repeats) or a callable taking the prompt and call kwargs.
+    """
+
+    def __init__(self, replies, model='fake-llm', delay=0.0):
+        self.replies = replies
+        self.model = model
+        self.temperature = 0.0
+        self.max_tokens = 1024
+        self.delay = delay
+        self.prompts = []
+        self.kwargs = []
+
+    def _reply(self, prompt, kwargs):
+        self.prompts.append(prompt)
+        self.kwargs.append(kwargs)
+        if callable(self.replies):
+            text = self.replies(prompt, kwargs)
+        else:
+            text = self.replies[min(len(self.prompts), len(self.replies)) - 1]
+        if isinstance(text, Exception):
+            raise text
+        return SimpleNamespace(text=text, raw=None)
+
+    def complete(self, prompt, **kwargs):
+        return self._reply(prompt, kwargs)
+
+    async def acomplete(self, prompt, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self._reply(prompt, kwargs)
+
+
+class InProcess:
+    """Executor running scripts in the test process, without a SandboxPool"""
+
+    def run(self, code_string):
+        import coding_agents
+        return coding_agents.run_code(code_string)
+
+
+class StaticReuse:
+    """find_script/find_scripts over a fixed {task: script} mapping"""
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+
+    def find_script(self, task_description):
+        script = self.scripts.get(task_description)
+        return {'id': 7, 'script': script} if script else None
+
+    def find_scripts(self, task_descriptions):
+        return [self.find_script(task) for task in task_descriptions]
+
+
+@pytest.fixture(autouse=True)
+def fresh_resilience():
+    # Circuit breakers are shared per provider, don't let them leak between tests
+    from agents.resilience import Resilience
+    Resilience._instances.clear()
+    yield
+    Resilience._instances.clear()
+
+
+@pytest.fixture
+def groq_agent(monkeypatch):
+    """Build GroqAgents that talk to a given fake client"""
+    pytest.importorskip('groq')
+    monkeypatch.setenv('GROQ_API_KEY', 'test-key')
+    from agents.groq_agent import GroqAgent
+
+    def make(client=None):
+        class FakeGroqAgent(GroqAgent):
+            def setup_client(self):
+                self.client = client or FakeChatClient()
+        return FakeGroqAgent(GROQ_SETTINGS_PATH)
+    return make
+
+
+@pytest.fixture
+def fake_client():
+    """The FakeChatClient class"""
+    return FakeChatClient
+
+
+@pytest.fixture
+def fake_llm():
+    """The FakeLLM class"""
+    return FakeLLM
+
+
+@pytest.fixture
+def in_process():
+    """An InProcess executor"""
+    return InProcess()
+
+
+@pytest.fixture
+def reuse():
+    """The StaticReuse class, a reuse index over a {task: script} dict"""
+    return StaticReuse
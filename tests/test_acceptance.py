@@ -0,0 +1,86 @@
+import pytest
+
+import coding_agents
+from acceptance import AcceptanceTests, example_test, parse_tests, resolve
+from sandbox import SandboxPool
+
+SCRIPT = '''import math
+
+LIMIT = 10
+
+
+def double(x):
+    return x * 2
+
+
+print(double(input()))
+'''
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with SandboxPool(workers=2, timeout=5) as pool:
+        yield pool
+
+
+def test_parse_tests_keeps_compiling_asserts_once():
+    reply = "Here are tests:\n```\nassert double(2) == 4\nassert double(2) == 4\nassert double(\n  assert double(0) == 0\n```"
+    assert parse_tests(reply) == ['assert double(2) == 4', 'assert double(0) == 0']
+
+
+def test_example_test_forms():
+    assert example_test('double(2) == 4') == 'assert double(2) == 4'
+    assert example_test('assert double(2) == 4') == 'assert double(2) == 4'
+    assert example_test(('double(2)', 4)) == example_test({'input': 'double(2)', 'output': 4})
+
+
+def test_test_program_drops_the_task_code():
+    script = SCRIPT + "result = double(int(input()))\nNAMES: list = ['a', 'b']\n"
+    program = AcceptanceTests([]).test_program(script, 'assert double(2) == 4')
+    assert 'LIMIT = 10' in program and "NAMES: list = ['a', 'b']" in program
+    assert 'def double' in program
+    assert 'input()' not in program
+    assert program.endswith('assert double(2) == 4\n')
+
+
+def test_run_reports_each_test(pool):
+    tests = AcceptanceTests.from_examples([('double(2)', 4), ('double(3)', 7), 'missing()'])
+    results = tests.run(SCRIPT, pool)
+    assert [result['passed'] for result in results] == [True, False, False]
+    assert 'returned 6' in results[1]['error']
+    assert 'missing' in results[2]['error']
+    failures = AcceptanceTests.failures(results)
+    assert AcceptanceTests.describe(failures).startswith("The script ran, but 2 acceptance test(s) failed:")
+
+
+def test_hanging_test_times_out(pool):
+    tests = AcceptanceTests(['assert double(1) == 2', 'while True: pass'], timeout=1)
+    assert [result['passed'] for result in tests.run(SCRIPT, pool)] == [True, False]
+
+
+def test_generate_asks_the_llm(fake_llm):
+    llm = fake_llm(["assert double(2) == 4\nnot a test"])
+    tests = AcceptanceTests.generate('double a number', SCRIPT, llm=llm)
+    assert tests.tests == ['assert double(2) == 4']
+    assert '- double(x)' in llm.prompts[0]
+    # Nothing to call, no tests and no LLM call
+    assert len(AcceptanceTests.generate('print', "print(1)", llm=llm)) == 0
+    assert len(llm.prompts) == 1
+
+
+def test_resolve():
+    tests = AcceptanceTests([])
+    assert resolve(None, 'task', SCRIPT) is None
+    assert resolve(tests, 'task', SCRIPT) is tests
+    assert resolve([('double(1)', 2)], 'task', SCRIPT).tests == [example_test(('double(1)', 2))]
+
+
+def test_failing_acceptance_is_fixed(fake_llm, pool):
+    llm = fake_llm(["def double(x):\n    return x + 2", "def double(x):\n    return x * 2"])
+    results = coding_agents.run_and_fix('double a number', llm=llm, executor=pool, cache=None,
+                                        acceptance=[('double(3)', 6)])
+    assert results[0]['is_error']
+    assert 'acceptance test(s) failed' in results[0]['error_message']
+    assert not results[-1]['is_error']
+    assert results[-1]['acceptance'][0]['passed']
+    assert 'double(3)' in llm.prompts[1]
@@ -0,0 +1,96 @@
+import pytest
+
+import coding_agents
+from agents.cascade import EscalationStats, ModelCascade, categorize, order_models
+from history_store import HistoryStore
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # run_and_fix learns from ./history, keep it out of the repository
+    monkeypatch.chdir(tmp_path)
+    coding_agents._cascades.clear()
+    yield tmp_path
+    coding_agents._cascades.clear()
+    for store in list(HistoryStore._instances.values()):
+        store.close()
+    HistoryStore._instances.clear()
+
+
+def model_reply(scripts):
+    # FakeLLM replies: the script for the model the cascade picked
+    return lambda prompt, kwargs: scripts[kwargs['model']]
+
+
+def test_categorize():
+    assert categorize("Sort a list with merge sort") == 'algorithms'
+    assert categorize("Fix the traceback in my script") == 'code_fixes'
+    assert categorize("Print hello") == 'simple_scripts'
+
+
+def test_order_models_puts_strong_models_last():
+    models = {
+        'big': {'best_for': ['architecture'], 'response_time': 3},
+        'small': {'best_for': ['simple_scripts'], 'response_time': 1},
+        'medium': {'best_for': ['code_fixes'], 'response_time': 2},
+    }
+    assert order_models(models) == ['small', 'medium', 'big']
+
+
+def test_escalation_rate():
+    stats = EscalationStats()
+    stats.record('c', 0, 0, True)
+    stats.record('c', 0, 1, True)
+    stats.record('c', 0, 1, False)
+    assert stats.escalation_rate('c', 0) == pytest.approx(2 / 3)
+    assert stats.escalation_rate('c', 1) == pytest.approx(1 / 2)
+    assert stats.escalation_rate('other', 0) is None
+
+
+def test_failed_run_escalates_to_the_next_model(fake_llm, workdir):
+    llm = fake_llm(model_reply({'fast': "x = 1 / 0", 'strong': "x = 1"}))
+    results = coding_agents.run_and_fix("print a number", llm=llm, cache=None, cascade=['fast', 'strong'])
+    assert not results[-1]['is_error']
+    assert [kwargs['model'] for kwargs in llm.kwargs] == ['fast', 'strong']
+    assert results[-1]['cascade'] == {
+        'category': 'simple_scripts', 'start_model': 'fast', 'final_model': 'strong',
+        'escalations': 1, 'succeeded': True
+    }
+
+
+def test_categories_that_always_escalate_skip_the_fast_model():
+    cascade = ModelCascade(['fast', 'strong'], min_samples=3, explore=0)
+    for _ in range(3):
+        cascade.stats.record('algorithms', 0, 1, True)
+    assert cascade.plan("sort this").start_tier == 1
+    assert cascade.plan("print hello").start_tier == 0
+
+
+def test_history_is_learned_once(workdir):
+    store = HistoryStore.for_folder('history')
+    summary = {'category': 'algorithms', 'start_model': 'fast', 'final_model': 'strong',
+               'escalations': 1, 'succeeded': True}
+    for _ in range(5):
+        store.append('sort', 'x = 1', metadata={'cascade': summary})
+    reads = []
+    records = store.records
+    store.records = lambda *args: reads.append(1) or records(*args)
+
+    cascade = coding_agents.resolve_cascade(['fast', 'strong'])
+    cascade.explore = 0
+    assert cascade.plan("sort numbers").start_tier == 1
+    assert coding_agents.resolve_cascade(['fast', 'strong']) is cascade
+    cascade.plan("sort more numbers")
+    assert len(reads) == 1
+    # Other model lists and folders get cascades of their own
+    assert coding_agents.resolve_cascade(['fast', 'medium', 'strong']) is not cascade
+    assert coding_agents.resolve_cascade(['fast', 'strong'], 'other') is not cascade
+
+
+def test_outcomes_learned_in_process_are_kept(fake_llm, workdir):
+    llm = fake_llm(model_reply({'fast': "x = 1 / 0", 'strong': "x = 1"}))
+    for _ in range(5):
+        coding_agents.run_and_fix("sort a list", llm=llm, cache=None, cascade=['fast', 'strong'])
+    cascade = coding_agents.resolve_cascade(['fast', 'strong'])
+    assert cascade.stats.tried('algorithms', 0) == 5
+    assert cascade.start_tier('algorithms') == 1
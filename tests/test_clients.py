@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from agents.base_agent import AgentError
+from agents.clients import ClientRegistry, LoopLocal
+
+
+def test_loop_local_gives_one_instance_per_loop():
+    proxy = LoopLocal(object)
+
+    async def instance():
+        first = proxy.get()
+        assert proxy.get() is first
+        return first
+
+    assert asyncio.run(instance()) is not asyncio.run(instance())
+    assert proxy.get() is proxy.get()
+
+
+def test_loop_local_forwards_attributes():
+    class Client:
+        def __init__(self):
+            self.loop = asyncio.get_running_loop()
+
+        async def ping(self):
+            return asyncio.get_running_loop() is self.loop
+
+    proxy = LoopLocal(Client)
+
+    async def ping():
+        return await proxy.ping()
+
+    assert asyncio.run(ping()) and asyncio.run(ping())
+
+
+def test_loop_local_drops_instances_of_closed_loops():
+    proxy = LoopLocal(object)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(asyncio.sleep(0, proxy.get()))
+    loop.close()
+    asyncio.run(asyncio.sleep(0, proxy.get()))
+
+    async def count():
+        proxy.get()
+        return len(proxy._instances)
+    assert asyncio.run(count()) == 1
+
+
+def test_async_http_client_is_per_loop():
+    registry = ClientRegistry()
+
+    async def pool():
+        client = registry.async_http_client('groq')
+        assert registry.async_http_client('groq') is client
+        await registry.aclose()
+        return client
+
+    first, second = asyncio.run(pool()), asyncio.run(pool())
+    assert first is not second
+    assert first.is_closed and second.is_closed
+
+
+def test_async_sdk_client_works_across_asyncio_runs():
+    pytest.importorskip('groq')
+    registry = ClientRegistry()
+    client = registry.get_async_client('groq', 'test-key')
+    assert registry.get_async_client('groq', 'test-key') is client
+
+    async def underlying():
+        sdk_client = client.get()
+        assert client.chat is sdk_client.chat
+        await registry.aclose()
+        return sdk_client
+
+    assert asyncio.run(underlying()) is not asyncio.run(underlying())
+
+
+def test_unknown_provider_and_missing_key(monkeypatch):
+    registry = ClientRegistry()
+    with pytest.raises(AgentError):
+        registry.get_async_client('nope', 'key')
+    monkeypatch.delenv('GROQ_API_KEY', raising=False)
+    with pytest.raises(AgentError):
+        registry.get_sync_client('groq')
@@ -0,0 +1,128 @@
+import ast
+
+import coding_agents
+import code_analysis
+
+SOURCE = '''import os
+import numpy as np
+from collections import deque as queue
+from . import sibling
+
+
+class Store:
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def size(self):
+        if self.path:
+            return os.path.getsize(self.path)
+        return 0
+
+
+def outer(a, b):
+    def inner(c):
+        return c, a
+    if a:
+        return inner(a)
+    return b
+
+
+async def fetch(url):
+    return url
+
+
+print(outer(1, 2))
+'''
+
+
+def walk_extract_functions(source):
+    # extract_functions as it was written before the single-pass analyzer
+    functions = {}
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.FunctionDef):
+            returns = []
+            for child in ast.walk(node):
+                if isinstance(child, ast.Return):
+                    if isinstance(child.value, ast.Name):
+                        returns.append(child.value.id)
+                    elif isinstance(child.value, ast.Tuple):
+                        returns.extend(elt.id for elt in child.value.elts if isinstance(elt, ast.Name))
+            functions[node.name] = {'arguments': [arg.arg for arg in node.args.args], 'returns': returns}
+    return functions
+
+
+def test_matches_the_ast_walk_results():
+    assert coding_agents.extract_functions(SOURCE) == walk_extract_functions(SOURCE)
+    assert list(coding_agents.extract_functions(SOURCE)) == list(walk_extract_functions(SOURCE))
+
+
+def test_statements_only_analysis_matches_the_full_one():
+    source = SOURCE + """
+def guarded(x):
+    try:
+        def parse():
+            return x
+    except ValueError as error:
+        return error
+    else:
+        return parse
+    finally:
+        pass
+    match x:
+        case 1:
+            def one():
+                return x, guarded
+            return one
+    with open(x) as f:
+        return f
+"""
+    full = code_analysis.analyze(source)
+    light = code_analysis.analyze(source, calls=False)
+    assert [(f.qualname, f.return_names, f.return_lines, f.source) for f in light.functions] == \
+        [(f.qualname, f.return_names, f.return_lines, f.source) for f in full.functions]
+    assert light.imports == full.imports
+    assert light.call_graph == {}
+    assert coding_agents.extract_functions(source) == walk_extract_functions(source)
+    assert list(coding_agents.extract_functions(source)) == list(walk_extract_functions(source))
+
+
+def test_functions_methods_and_classes():
+    analysis = code_analysis.analyze(SOURCE)
+    assert [f.qualname for f in analysis.functions] == [
+        'outer', 'fetch', 'Store.__init__', 'Store.size', 'outer.inner']
+    size = analysis.function('Store.size')
+    assert size.is_method and size.class_name == 'Store'
+    assert size.return_lines == ['return 0', 'return os.path.getsize(self.path)']
+    assert analysis.function('fetch').is_async
+    assert analysis.function('outer').header == 'def outer(a, b):'
+    [store] = analysis.classes
+    assert [method.name for method in store.methods] == ['__init__', 'size']
+    assert analysis.function('missing') is None
+
+
+def test_imports_and_call_graph():
+    analysis = code_analysis.analyze(SOURCE)
+    assert analysis.imports == [
+        ('os', None, None, 1),
+        ('numpy', None, 'np', 2),
+        ('collections', 'deque', 'queue', 3),
+        ('.', 'sibling', None, 4),
+    ]
+    assert analysis.call_graph[code_analysis.MODULE_SCOPE] == ['print', 'outer']
+    assert analysis.call_graph['outer'] == ['inner']
+    assert analysis.call_graph['Store.size'] == ['os.path.getsize']
+
+
+def test_analyze_python_content():
+    functions = coding_agents.analyze_python_content(SOURCE)
+    assert [function['header'].strip() for function in functions] == [
+        'def outer(a, b):', 'def __init__(self, path):', 'def size(self):', 'def inner(c):']
+    assert functions[0]['original'].startswith('def outer(a, b):')
+    assert coding_agents.analyze_python_content("def (") is None
+    assert coding_agents.extract_functions("def (") == "Invalid Python code"
+
+
+def test_dotted_name():
+    assert code_analysis.dotted_name(ast.parse('a.b.c', mode='eval').body) == 'a.b.c'
+    assert code_analysis.dotted_name(ast.parse('f().b', mode='eval').body) is None
@@ -0,0 +1,68 @@
+import pytest
+
+import coding_agents
+import functions
+from code_cache import CodeCache, CompiledScript, compile_script, new_namespace, run_script
+
+
+def test_final_expression_is_returned():
+    assert run_script("x = 2\nx * 21", cache=None) == 42
+    assert run_script("x = 2", cache=None) is None
+
+
+def test_functions_see_each_other_and_imports():
+    source = "import math\n\ndef radius():\n    return 2\n\ndef area():\n    return math.pi * radius() ** 2\n\narea()"
+    assert run_script(source, cache=None) == pytest.approx(12.566, rel=1e-3)
+
+
+def test_expression_side_effects_run_once():
+    # The old expression probe re-ran a script whose execution raised SyntaxError
+    import builtins
+    builtins._pycoder_calls = []
+    try:
+        for run_code in (coding_agents.run_code, functions.run_code):
+            builtins._pycoder_calls.clear()
+            script = "__import__('builtins')._pycoder_calls.append(1); compile('(', 'bad', 'eval')"
+            assert run_code(script)['is_error'] is True
+            assert builtins._pycoder_calls == [1]
+    finally:
+        del builtins._pycoder_calls
+
+
+def test_main_block_does_not_run_by_default():
+    source = "ran = False\nif __name__ == '__main__':\n    ran = True\nran"
+    assert run_script(source, cache=None) is False
+    assert run_script(source, new_namespace(main=True), cache=None) is True
+    result = coding_agents.run_code("if __name__ == '__main__':\n    input()\n'done'")
+    assert not result['is_error']
+    assert result['result'] == 'done'
+
+
+def test_memory_cache_hits_and_eviction():
+    cache = CodeCache(max_entries=2)
+    first = cache.compile("1")
+    assert cache.compile("1") is first
+    cache.compile("2")
+    cache.compile("3")
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert cache.compile("1") is not first
+
+
+def test_compiled_scripts_persist_to_disk(tmp_path):
+    CodeCache(directory=str(tmp_path)).compile("x = 1\nx + 1")
+    cache = CodeCache(directory=str(tmp_path))
+    compiled = cache.compile("x = 1\nx + 1")
+    assert cache.disk_hits == 1
+    assert compiled.run(new_namespace()) == 2
+
+
+def test_bytecode_from_another_interpreter_is_ignored():
+    data = compile_script("1").dumps()
+    assert CompiledScript.loads(data) is not None
+    assert CompiledScript.loads(b'other' + data) is None
+
+
+def test_syntax_errors_point_at_the_script():
+    with pytest.raises(SyntaxError) as error:
+        compile_script("def (")
+    assert error.value.filename == '<string>'
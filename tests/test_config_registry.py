@@ -0,0 +1,113 @@
+import os
+import copy
+
+import pytest
+
+pytest.importorskip('yaml')
+
+from agents.config_registry import ConfigError, ConfigRegistry, FrozenDict, PromptTemplate
+
+
+def write(path, text):
+    # Bump the mtime explicitly, writes within one timer tick may share it
+    stamp = os.stat(path).st_mtime_ns + 1_000_000 if os.path.exists(path) else None
+    with open(path, 'w') as f:
+        f.write(text)
+    if stamp is not None:
+        os.utime(path, ns=(stamp, stamp))
+
+
+@pytest.fixture
+def files(tmp_path):
+    base = str(tmp_path / 'base.yaml')
+    provider = str(tmp_path / 'provider.yaml')
+    write(base, "prompts:\n  generate: 'Write {requirements}'\napi_settings:\n  timeout: 10\n")
+    write(provider, "prompt_additions:\n  generate: 'Be brief.'\napi_settings:\n  retries: 2\n")
+    return base, provider
+
+
+def test_load_is_cached_until_the_file_changes(tmp_path):
+    registry = ConfigRegistry(check_interval=0)
+    path = str(tmp_path / 'settings.yaml')
+    write(path, "a: 1\n")
+    first = registry.load(path)
+    assert registry.load(path) is first
+    write(path, "a: 22\n")
+    assert registry.load(path)['a'] == 22
+
+
+def test_check_interval_delays_the_stat(tmp_path):
+    registry = ConfigRegistry(check_interval=3600)
+    path = str(tmp_path / 'settings.yaml')
+    write(path, "a: 1\n")
+    registry.load(path)
+    write(path, "a: 22\n")
+    assert registry.load(path)['a'] == 1
+    registry.clear()
+    assert registry.load(path)['a'] == 22
+
+
+def test_settings_are_frozen(tmp_path):
+    path = str(tmp_path / 'settings.yaml')
+    write(path, "models:\n  m: {context_length: 10}\nlist: [1, 2]\n")
+    settings = ConfigRegistry().load(path)
+    assert isinstance(settings, FrozenDict)
+    with pytest.raises(TypeError):
+        settings['models']['m']['context_length'] = 20
+    assert settings['list'] == (1, 2)
+    thawed = copy.deepcopy(settings)
+    thawed['models']['m']['context_length'] = 20
+    assert thawed['list'] == [1, 2]
+
+
+def test_merged_settings_and_templates(files):
+    base, provider = files
+    merged = ConfigRegistry(check_interval=0).merged(provider, base)
+    assert merged.settings['prompts']['generate'] == 'Write {requirements}\nBe brief.'
+    assert dict(merged.settings['api_settings']) == {'timeout': 10, 'retries': 2}
+    assert merged.templates['generate'].format(requirements='a parser') == 'Write a parser\nBe brief.'
+
+
+def test_merged_is_rebuilt_after_an_edit(files):
+    base, provider = files
+    registry = ConfigRegistry(check_interval=0)
+    first = registry.merged(provider, base)
+    assert registry.merged(provider, base) is first
+    write(provider, "api_settings:\n  retries: 5\n")
+    assert registry.merged(provider, base).settings['api_settings']['retries'] == 5
+
+
+def test_broken_edit_strict_and_lenient(files):
+    base, provider = files
+    registry = ConfigRegistry(check_interval=0)
+    good = registry.merged(provider, base, strict=False)
+
+    # Invalid YAML
+    write(provider, "api_settings: [unclosed\n")
+    assert registry.merged(provider, base, strict=False) is good
+    with pytest.raises(Exception):
+        registry.merged(provider, base)
+
+    # Valid YAML, invalid template
+    write(provider, "prompts:\n  generate: 'Write {0}'\n")
+    stale = registry.merged(provider, base, strict=False)
+    assert stale.settings is good.settings
+    assert isinstance(stale.error, ConfigError)
+    with pytest.raises(ConfigError):
+        registry.merged(provider, base)
+
+    # Fixed again
+    write(provider, "api_settings:\n  retries: 3\n")
+    assert registry.merged(provider, base).settings['api_settings']['retries'] == 3
+
+
+def test_prompt_template():
+    template = PromptTemplate("100% {what} {count:>3}")
+    assert template.format(what='done', count=7) == "100% done   7"
+    assert PromptTemplate("{a} and %s").format(a=1) == "1 and %s"
+    with pytest.raises(ConfigError):
+        template.format(what='done')
+    with pytest.raises(ConfigError):
+        PromptTemplate("{a.b}")
+    with pytest.raises(ConfigError):
+        PromptTemplate("{unclosed")
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('gradio')
+pytest.importorskip('pygments')
+
+import gardio_app
+
+
+def test_chat_streams_messages_history(monkeypatch):
+    seen = {}
+
+    async def fake_stream(task_description, max_iterations, executor):
+        seen['executor'] = executor
+        yield {'type': 'token', 'text': "print('hi')"}
+        yield {'type': 'script', 'script': "print('hi')"}
+        yield {'type': 'output', 'text': 'hi\n'}
+        yield {'type': 'done', 'run_results': [{'script': "print('hi')", 'output': 'hi', 'error_message': '',
+                                                 'is_error': False, 'fix_iterations': 0}]}
+
+    pool = object()
+    monkeypatch.setattr(gardio_app, '_executor', pool)
+    monkeypatch.setattr(gardio_app.coding_agents, 'astream_run_and_fix', fake_stream)
+
+    async def run():
+        return [update async for update in gardio_app.chat("say hi", [])]
+
+    updates = asyncio.run(run())
+    history = updates[-1][1]
+    assert history[0] == {"role": "user", "content": "say hi"}
+    assert history[1]["role"] == "assistant"
+    assert "Done after 0 fixes" in history[1]["content"]
+    # Scripts never run in the server process
+    assert seen['executor'] is pool
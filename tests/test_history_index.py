@@ -0,0 +1,105 @@
+import pytest
+
+import coding_agents
+from history_index import HistoryIndex, normalized_ast_hash, tokenize
+from history_store import HistoryStore
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    index = HistoryIndex(str(tmp_path), store=store)
+    yield store, index
+    index.close()
+    store.close()
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize("Write a function that sorts the running_totals") == ['sort', 'run', 'total']
+
+
+def test_ast_hash_ignores_name_docstring_and_formatting():
+    first = "def add(a, b):\n    '''Add.'''\n    return a + b"
+    second = "def plus(a,b):\n    return (a + b)"
+    assert normalized_ast_hash(first) == normalized_ast_hash(second)
+    assert normalized_ast_hash(first) != normalized_ast_hash("def add(a, b):\n    return a - b")
+    assert normalized_ast_hash("def (") is None
+
+
+def test_functions_are_indexed(history):
+    store, index = history
+    run_id = store.append('add numbers', "def add(a, b):\n    return a + b\n\ndef unused():\n    pass")
+    [function] = index.find_functions(name='add')
+    assert function['script_id'] == run_id
+    assert function['arguments'] == ['a', 'b']
+    assert function['returns'] == ['return a + b']
+    assert index.find_functions(ast_hash=normalized_ast_hash("def plus(x, y):\n    return x + y")) == []
+    assert [f['name'] for f in index.find_functions(ast_hash=function['ast_hash'])] == ['add']
+
+
+def test_index_catches_up_with_the_store(history):
+    store, index = history
+    assert index.largest_index() is None
+    store.append('first', 'x = 1')
+    assert index.largest_index() == 1
+    # Saved by another writer after the index was opened
+    store.append('second', 'x = 2')
+    assert [row[0] for row in index.records()] == [1, 2]
+
+
+def test_search_and_find_script(history):
+    store, index = history
+    store.append('sort a list of numbers', "def sort_numbers(numbers):\n    return sorted(numbers)")
+    store.append('download a web page', "def download(url):\n    pass")
+    assert index.search('sort numbers')[0]['id'] == 1
+    match = index.find_script('sort a list of numbers')
+    assert match['id'] == 1
+    assert 'sorted(numbers)' in match['script']
+    assert index.find_script('parse an xml document') is None
+    assert index.find_scripts(['download web page', 'parse xml'])[1] is None
+    assert index.search('the a of') == []
+
+
+def test_search_matches_inflected_words(history):
+    store, index = history
+    store.append('Read files and count their lines and names', "def count_lines(paths):\n    pass")
+    store.append('download a web page', "def download(url):\n    pass")
+    for query in ('file', 'lines', 'reading the names'):
+        assert [match['id'] for match in index.search(query)] == [1], query
+
+
+def write_legacy(folder, index, prompt, script):
+    with open(folder / f'ca_{index}_prompt.txt', 'w') as f:
+        f.write(prompt)
+    with open(folder / f'ca_code_{index}.py', 'w') as f:
+        f.write(script)
+
+
+def test_saving_into_a_migrated_folder_indexes_the_legacy_runs(tmp_path):
+    for i in range(1, 8):
+        write_legacy(tmp_path, i, f'legacy task {i}', f'x = {i}')
+    index = HistoryIndex(str(tmp_path), store=HistoryStore(str(tmp_path)))
+    try:
+        run_id = coding_agents.save_as_descriptive_name('y = 8', 'new task', str(tmp_path), index=index)
+        assert run_id == 8
+        assert [row[0] for row in index.records()] == list(range(1, 9))
+    finally:
+        index.close()
+        index.store.close()
+
+
+def test_index_with_skipped_records_is_rebuilt(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    for i in range(3):
+        store.append(f'task {i}', f'x = {i}')
+    # An index that only saw the last record, as older versions left it
+    index = HistoryIndex(str(tmp_path), store=store)
+    index.add_script(3, 'x = 2', 'task 2')
+    index.close()
+
+    reopened = HistoryIndex(str(tmp_path), store=store)
+    try:
+        assert [row[0] for row in reopened.records()] == [1, 2, 3]
+    finally:
+        reopened.close()
+        store.close()
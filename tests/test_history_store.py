@@ -0,0 +1,142 @@
+import os
+import sys
+import threading
+
+import pytest
+
+import code_cache
+import coding_agents
+from history_store import HistoryStore, legacy_records
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / 'history'
+    path.mkdir()
+    yield str(path)
+    for store in list(HistoryStore._instances.values()):
+        store.close()
+    HistoryStore._instances.clear()
+
+
+def write_legacy(folder, index, prompt, script, suffix=''):
+    with open(os.path.join(folder, f'ca_{index}_prompt.txt'), 'w') as f:
+        f.write(prompt)
+    with open(os.path.join(folder, f'ca_code_{index}.py'), 'w') as f:
+        f.write(script)
+    if suffix:
+        with open(os.path.join(folder, f'ca_code_{index}_{suffix}.py'), 'w') as f:
+            f.write(script)
+
+
+def test_append_and_read_back(folder):
+    store = HistoryStore(folder)
+    run_id = store.append('task', 'x = 1', {'is_error': False, 'result': object()}, {'name': 'f'})
+    record = store.get(run_id)
+    assert record['prompt'] == 'task'
+    assert record['script'] == 'x = 1'
+    assert record['run_results']['is_error'] is False
+    assert record['metadata'] == {'name': 'f'}
+    assert store.script(run_id) == 'x = 1'
+    assert store.get(run_id + 1) is None
+    store.close()
+
+
+def test_legacy_files_are_migrated_with_their_ids(folder):
+    write_legacy(folder, 3, 'third', 'x = 3', suffix='square')
+    write_legacy(folder, 7, 'seventh', 'x = 7')
+    # A prompt without its script is skipped
+    with open(os.path.join(folder, 'ca_9_prompt.txt'), 'w') as f:
+        f.write('orphan')
+
+    store = HistoryStore(folder)
+    assert [record['id'] for record in store.records()] == [3, 7]
+    assert store.get(3)['metadata']['migrated_from'] == ['ca_3_prompt.txt', 'ca_code_3.py', 'ca_code_3_square.py']
+    # New ids continue after the migrated ones
+    assert store.append('new', 'x = 8') == 8
+    store.close()
+
+
+def test_migration_runs_once(folder):
+    write_legacy(folder, 1, 'first', 'x = 1')
+    store = HistoryStore(folder)
+    assert len(store) == 1
+    store.close()
+    write_legacy(folder, 2, 'second', 'x = 2')
+    store = HistoryStore(folder)
+    assert len(store) == 1
+    store.close()
+
+
+def test_concurrent_appends_get_distinct_ids(folder):
+    # Separate stores stand in for separate processes sharing the database
+    stores = [HistoryStore(folder) for _ in range(4)]
+    ids = []
+    lock = threading.Lock()
+
+    def save(store):
+        for i in range(25):
+            run_id = store.append(f'task {i}', f'x = {i}')
+            with lock:
+                ids.append(run_id)
+
+    threads = [threading.Thread(target=save, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ids) == list(range(1, 101))
+    assert stores[0].last_id() == 100
+    for store in stores:
+        store.close()
+
+
+def test_records_after(folder):
+    store = HistoryStore(folder)
+    for i in range(5):
+        store.append(f'task {i}', f'x = {i}')
+    assert [record['id'] for record in store.records(after=3)] == [4, 5]
+    assert HistoryStore(os.path.join(folder, 'empty')).last_id() is None
+    store.close()
+
+
+def test_legacy_records_of_a_missing_folder(tmp_path):
+    assert legacy_records(str(tmp_path / 'missing')) == []
+
+
+def test_save_as_descriptive_name_indexes_the_run(folder):
+    first = coding_agents.save_as_descriptive_name("def square(x):\n    return x * x", 'square a number', folder)
+    second = coding_agents.save_as_descriptive_name("def cube(x):\n    return x ** 3", 'cube a number', folder)
+    assert second == first + 1
+    assert HistoryStore.for_folder(folder).get(first)['metadata']['name'] == 'square'
+
+
+def test_history_scripts_are_importable(folder):
+    run_id = HistoryStore.for_folder(folder).append('task', "def answer():\n    return 42")
+    package = 'pycoder_history_test'
+    try:
+        module = code_cache.import_history_script(run_id, folder, package)
+        assert module.answer() == 42
+        assert code_cache.run_history_script(run_id, folder) is None
+    finally:
+        sys.meta_path[:] = [finder for finder in sys.meta_path
+                            if getattr(finder, 'package', None) != package]
+        for name in [name for name in sys.modules if name.startswith(package)]:
+            del sys.modules[name]
+
+
+def test_history_package_is_bound_to_one_folder(tmp_path):
+    first, second = str(tmp_path / 'a'), str(tmp_path / 'b')
+    run_id = HistoryStore.for_folder(first).append('task', "ORIGIN = 'a'")
+    HistoryStore.for_folder(second).append('task', "ORIGIN = 'b'")
+    package = 'pycoder_history_bound'
+    try:
+        assert code_cache.import_history_script(run_id, first, package).ORIGIN == 'a'
+        with pytest.raises(ValueError):
+            code_cache.import_history_script(run_id, second, package)
+        assert code_cache.import_history_script(run_id, second, package + '_b').ORIGIN == 'b'
+    finally:
+        sys.meta_path[:] = [finder for finder in sys.meta_path
+                            if not str(getattr(finder, 'package', '')).startswith(package)]
+        for name in [name for name in sys.modules if name.startswith(package)]:
+            del sys.modules[name]
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import coding_agents
+from patching import PatchError, apply_patch, apply_unified_diff, parse_unified_diff, strip_fences
+
+SCRIPT = '''import math
+
+
+def area(r):
+    return math.pi * r ** 2
+
+
+print(area(2))'''
+
+DIFF = '''--- script.py
++++ script.py
+@@ -4,2 +4,2 @@
+ def area(r):
+-    return math.pi * r ** 2
++    return math.pi * r * r
+'''
+
+
+def test_parse_unified_diff():
+    hunks = parse_unified_diff(DIFF)
+    assert len(hunks) == 1
+    assert hunks[0].start == 4
+    assert hunks[0].old == ['def area(r):', '    return math.pi * r ** 2']
+    assert hunks[0].new == ['def area(r):', '    return math.pi * r * r']
+
+
+def test_diff_is_located_by_context_not_line_numbers():
+    wrong_lines = DIFF.replace('@@ -4,2 +4,2 @@', '@@ -40,2 +40,2 @@')
+    patched = apply_unified_diff(SCRIPT, wrong_lines)
+    assert 'return math.pi * r * r' in patched
+    assert patched.endswith('print(area(2))')
+
+
+def test_diff_that_does_not_match_raises():
+    with pytest.raises(PatchError):
+        apply_unified_diff(SCRIPT, DIFF.replace('def area(r):', 'def volume(r):'))
+
+
+def test_apply_patch_fenced_diff():
+    assert 'r * r' in apply_patch(SCRIPT, f"Here you go:\n```diff\n{DIFF}```\n")
+
+
+def test_apply_patch_definitions_are_spliced():
+    patched = apply_patch(SCRIPT, "```python\ndef area(r):\n    return 0\n```")
+    assert 'return 0' in patched
+    assert patched.startswith('import math')
+    assert patched.endswith('print(area(2))')
+
+
+def test_apply_patch_full_rewrite():
+    rewrite = "print('rewritten')"
+    assert apply_patch(SCRIPT, rewrite) == rewrite
+
+
+def test_apply_patch_rejects_invalid_replies():
+    with pytest.raises(PatchError):
+        apply_patch(SCRIPT, "def area(r)\n    return")
+    with pytest.raises(PatchError):
+        apply_patch(SCRIPT, "@@ -1,1 +1,1 @@\n-import math\n+import math(\n")
+
+
+def test_strip_fences():
+    assert strip_fences("text\n```python\na = 1\n```\nmore") == 'a = 1'
+    assert strip_fences("\na = 1\n") == 'a = 1'
+
+
+def test_patch_script_applies_diff(fake_llm):
+    llm = fake_llm([DIFF])
+    patched = coding_agents.patch_script(SCRIPT, 'ZeroDivisionError', llm=llm, cache=None)
+    assert 'r * r' in patched
+    assert len(llm.prompts) == 1
+
+
+def test_patch_script_falls_back_to_fix_script(fake_llm):
+    # The diff doesn't match, so the whole script is asked for again
+    bad_diff = DIFF.replace('def area(r):', 'def volume(r):')
+    llm = fake_llm([bad_diff, "```python\nprint('fixed')\n```"])
+    patched = coding_agents.patch_script(SCRIPT, 'ZeroDivisionError', llm=llm, cache=None)
+    assert patched.strip() == "print('fixed')"
+    assert len(llm.prompts) == 2
+
+
+def test_apatch_script_falls_back_to_afix_script(fake_llm):
+    llm = fake_llm(["not python (", "```python\nprint('fixed')\n```"])
+    patched = asyncio.run(coding_agents.apatch_script(SCRIPT, 'ZeroDivisionError', llm=llm, cache=None))
+    assert patched.strip() == "print('fixed')"
@@ -0,0 +1,139 @@
+import pytest
+
+import code_analysis
+import prompt_budget
+from prompt_budget import PromptBudget, apply_fix, build_fix_prompt
+
+TEMPLATE = "### Task:\n{task_description}\n"
+
+SCRIPT = '''import math
+
+
+def area(r):
+    return math.pi * r ** 2
+
+
+class Shape:
+    def size(self):
+        return 1
+
+    @staticmethod
+    def name():
+        return 'shape'
+
+
+print(area(2))
+'''
+
+TRACEBACK = '''Traceback (most recent call last):
+  File "/root/package/coding_agents.py", line 90, in run_code
+    exec(code_string, namespace)
+  File "<string>", line 18, in <module>
+  File "<string>", line 5, in area
+ZeroDivisionError: division by zero
+'''
+
+
+def test_count_tokens():
+    assert prompt_budget.count_tokens('') == 0
+    assert prompt_budget.count_tokens('abcdefgh') == 2
+    assert prompt_budget.count_tokens('a = 1') == 5
+
+
+def test_trim_traceback_keeps_script_frames():
+    trimmed = prompt_budget.trim_traceback(TRACEBACK, SCRIPT)
+    assert 'coding_agents.py' not in trimmed
+    assert '1 frames outside the script omitted' in trimmed
+    assert '    return math.pi * r ** 2' in trimmed
+    assert trimmed.endswith('ZeroDivisionError: division by zero')
+    assert prompt_budget.failing_lines(TRACEBACK) == [18, 5]
+
+
+def test_truncate_middle_keeps_head_and_tail():
+    text = '\n'.join(f"line {i}" for i in range(200))
+    truncated = prompt_budget.truncate_middle(text, 100)
+    assert '... truncated ...' in truncated
+    assert truncated.startswith('line 0')
+    assert truncated.endswith('line 199')
+    assert prompt_budget.truncate_middle('short', 100) == 'short'
+
+
+def test_small_prompt_is_sent_whole():
+    prompt, compacted = build_fix_prompt(SCRIPT, TRACEBACK, TEMPLATE)
+    assert not compacted
+    assert SCRIPT in prompt
+
+
+def test_large_prompt_is_compacted_to_the_failing_function():
+    filler = '\n'.join(f"def helper_{i}(x):\n    return x + {i}\n\n" for i in range(300))
+    script = SCRIPT.replace('class Shape:', filler + '\nclass Shape:')
+    error = TRACEBACK.replace('line 18, in <module>', f"line {script.count(chr(10))}, in <module>")
+    budget = PromptBudget(max_prompt_tokens=1000)
+    prompt, compacted = build_fix_prompt(script, error, TEMPLATE, budget)
+    assert compacted
+    assert 'def area(r):' in prompt
+    assert 'helper_150' not in prompt
+    assert budget.fits(prompt)
+
+
+def test_prompt_without_functions_is_never_truncated():
+    # Nothing to compact to, so the reply replaces the script: every line
+    # of it has to be in the prompt
+    script = '\n'.join(f"value_{i} = {i}" for i in range(2000)) + '\nprint(1 / 0)\n'
+    budget = PromptBudget(max_prompt_tokens=500, context_length=100000)
+    prompt, compacted = build_fix_prompt(script, 'ZeroDivisionError: division by zero', TEMPLATE, budget)
+    assert not compacted
+    assert script in prompt
+    assert '... truncated ...' not in prompt
+
+
+def test_apply_fix_splices_definitions():
+    fixed = apply_fix(SCRIPT, "def area(r):\n    return math.pi * r * r\n")
+    assert 'return math.pi * r * r' in fixed
+    assert 'class Shape:' in fixed
+    assert fixed.rstrip().endswith('print(area(2))')
+
+
+def test_apply_fix_keeps_script_when_reply_does_not_parse():
+    assert apply_fix(SCRIPT, "def area(r)\n    return") == SCRIPT
+
+
+def test_apply_fix_drops_statements_of_a_partial_reply():
+    reply = "def area(r):\n    return 3.0 * r * r\n\nprint(area(3))\n"
+    fixed = apply_fix(SCRIPT, reply)
+    assert 'return 3.0 * r * r' in fixed
+    assert 'class Shape:' in fixed
+    assert 'print(area(3))' not in fixed
+
+
+def test_apply_fix_takes_a_full_rewrite():
+    rewrite = "import math\n\n\ndef area(r):\n    return r\n\n\nclass Shape:\n    pass\n\n\nprint(area(1))\n"
+    assert apply_fix(SCRIPT, rewrite) == rewrite
+
+
+def test_merge_definitions_replaces_methods_and_adds_imports():
+    fragment = "import os\n\n\nclass Shape:\n    def size(self):\n        return 2\n\n\ndef volume(r):\n    return r ** 3\n"
+    merged = code_analysis.merge_definitions(SCRIPT, fragment)
+    assert merged.index('import os') < merged.index('def area')
+    assert '        return 2' in merged
+    assert '        return 1' not in merged
+    # Decorated methods keep their decorator
+    assert '    @staticmethod\n    def name():' in merged
+    assert merged.index('def volume') < merged.index('print(area(2))')
+
+
+def test_merge_definitions_bare_method_goes_to_its_class():
+    merged = code_analysis.merge_definitions(SCRIPT, "def size(self):\n    return 3\n")
+    assert '    def size(self):\n        return 3' in merged
+
+
+def test_merge_definitions_rejects_statements():
+    with pytest.raises(ValueError):
+        code_analysis.merge_definitions(SCRIPT, "x = 1\n")
+    with pytest.raises(SyntaxError):
+        code_analysis.merge_definitions(SCRIPT, "def (")
+
+
+def test_definitions_only():
+    source = "import os\nx = 1\n\n@decorate\ndef f():\n    pass\n\nf()\n"
+    assert code_analysis.definitions_only(source) == "import os\n\n@decorate\ndef f():\n    pass"
@@ -0,0 +1,82 @@
+import time
+import asyncio
+
+from types import SimpleNamespace
+
+from agents.rate_limit import TokenBucket, RateLimiter, report_usage
+
+
+def usage(prompt_tokens, completion_tokens):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+
+def test_bucket_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(600)  # 10 per second
+        await bucket.acquire(600)
+        start = time.monotonic()
+        await bucket.acquire(2)
+        return time.monotonic() - start
+    assert 0.1 < asyncio.run(run()) < 1.0
+
+
+def test_bucket_caps_requests_larger_than_capacity():
+    async def run():
+        return await TokenBucket(60).acquire(1000)
+    assert asyncio.run(run()) == 60
+
+
+def test_bucket_is_usable_from_several_event_loops():
+    bucket = TokenBucket(60000)
+
+    async def contended():
+        await asyncio.gather(*(bucket.acquire(1) for _ in range(5)))
+
+    asyncio.run(contended())
+    asyncio.run(contended())
+
+
+def test_reservation_refunds_unused_tokens():
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    async def run():
+        async with limiter.reserve(800) as reservation:
+            report_usage(usage(50, 50))
+        return reservation
+    reservation = asyncio.run(run())
+    assert reservation.used == 100
+    assert limiter.tokens.tokens >= 900
+
+
+def test_reservation_takes_overruns():
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    async def run():
+        async with limiter.reserve(100):
+            report_usage(usage(300, 300))
+    asyncio.run(run())
+    assert limiter.tokens.tokens < 500
+
+
+def test_reservation_keeps_estimate_without_usage():
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    async def run():
+        async with limiter.reserve(800):
+            report_usage(SimpleNamespace())
+    asyncio.run(run())
+    assert limiter.tokens.tokens < 300
+
+
+def test_report_usage_outside_a_reservation_is_ignored():
+    report_usage(usage(1, 1))
+
+
+def test_batch_generate_is_not_throttled_by_the_completion_estimate(groq_agent, fake_client):
+    # 6000 tokens per minute with 2000-token estimates: without settling
+    # against real usage the fourth request would wait about 20 seconds
+    agent = groq_agent(fake_client(usage=(50, 50)))
+    start = time.monotonic()
+    results = asyncio.run(agent.batch_generate([f"task {i}" for i in range(8)], concurrency=2))
+    assert time.monotonic() - start < 5
+    assert all(result.code == 'x = 1' for result in results)
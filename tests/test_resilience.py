@@ -0,0 +1,214 @@
+import asyncio
+import email.utils
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('tenacity')
+
+from agents import resilience
+from agents.resilience import (
+    FATAL, OVERLOADED, RATE_LIMITED, TRANSIENT,
+    AIMDLimiter, CircuitBreaker, CircuitOpenError, Resilience, classify, retry_after,
+)
+
+
+class APIError(Exception):
+    def __init__(self, status=None, headers=None):
+        super().__init__(f"status {status}")
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the module's clock, the event loop keeps the real one
+    clock = Clock()
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(monotonic=clock, time=time.time))
+    return clock
+
+
+def test_classify():
+    assert classify(APIError(429)) == RATE_LIMITED
+    assert classify(APIError(503)) == OVERLOADED
+    assert classify(APIError(529)) == OVERLOADED
+    assert classify(APIError(599)) == OVERLOADED
+    assert classify(APIError(408)) == TRANSIENT
+    assert classify(APIError(401)) == FATAL
+    assert classify(APIConnectionError()) == TRANSIENT
+    assert classify(asyncio.TimeoutError()) == TRANSIENT
+    assert classify(ValueError()) == FATAL
+
+
+def test_retry_after():
+    assert retry_after(APIError(429, {'retry-after-ms': '1500'})) == 1.5
+    assert retry_after(APIError(429, {'retry-after': '3'})) == 3.0
+    assert retry_after(APIError(429, {'retry-after': 'soon'})) is None
+    assert retry_after(APIError(429)) is None
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < retry_after(APIError(429, {'retry-after': later})) <= 30
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker('p', failure_threshold=2, reset_timeout=10)
+    breaker.record_failure(OVERLOADED)
+    assert breaker.state == 'closed'
+    breaker.record_failure(TRANSIENT)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 10
+    assert breaker.state == 'half_open'
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+
+def test_failed_probe_opens_again(clock):
+    breaker = CircuitBreaker('p', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure(OVERLOADED)
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_failure(OVERLOADED)
+    assert breaker.state == 'open'
+
+
+def test_rate_limits_and_fatal_errors_do_not_trip_the_breaker(clock):
+    breaker = CircuitBreaker('p', failure_threshold=1)
+    breaker.record_failure(RATE_LIMITED)
+    breaker.record_failure(FATAL)
+    assert breaker.state == 'closed'
+
+
+def test_abandoned_probe_lets_the_next_call_through(clock):
+    breaker = CircuitBreaker('p', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure(OVERLOADED)
+    clock.now += 10
+    breaker.before_call()
+    breaker.abandon_probe()
+    breaker.before_call()
+
+
+def test_aimd(clock):
+    limiter = AIMDLimiter(initial=4, max_limit=8, cooldown=1.0)
+    limiter.on_success()
+    assert limiter.limit == pytest.approx(4.25)
+    limiter.on_throttle()
+    assert limiter.limit == pytest.approx(2.125)
+    # A burst of errors within the cooldown only counts once
+    limiter.on_throttle()
+    assert limiter.limit == pytest.approx(2.125)
+    clock.now += 1
+    limiter.on_throttle()
+    limiter.on_throttle()
+    clock.now += 1
+    limiter.on_throttle()
+    assert limiter.limit == 1
+    for _ in range(200):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+
+def test_aimd_caps_concurrency_across_loops():
+    limiter = AIMDLimiter(initial=2, max_limit=2)
+    peak = 0
+
+    async def task():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(task() for _ in range(6)))
+
+    asyncio.run(main())
+    asyncio.run(main())
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+def test_should_retry():
+    policy = Resilience('p', {'max_retry_after': 10})
+    assert policy.should_retry(APIError(503))
+    assert policy.should_retry(APIError(429, {'retry-after': '5'}))
+    assert not policy.should_retry(APIError(429, {'retry-after': '120'}))
+    assert not policy.should_retry(APIError(400))
+    assert not policy.should_retry(CircuitOpenError('p', 1.0))
+
+
+def test_retrying_call_recovers_from_transient_errors():
+    policy = Resilience('p', {'retry_attempts': 3, 'min_backoff': 0, 'max_backoff': 0})
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise APIError(503)
+        return 'ok'
+
+    async def main():
+        async for attempt in policy.retrying():
+            with attempt:
+                return await policy.call(flaky)
+
+    assert asyncio.run(main()) == 'ok'
+    assert len(attempts) == 3
+    assert policy.breaker.failures == 0
+
+
+def test_fatal_errors_are_not_retried():
+    policy = Resilience('p', {'retry_attempts': 3, 'min_backoff': 0, 'max_backoff': 0})
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        raise APIError(401)
+
+    async def main():
+        async for attempt in policy.retrying():
+            with attempt:
+                return await policy.call(broken)
+
+    with pytest.raises(APIError):
+        asyncio.run(main())
+    assert len(attempts) == 1
+
+
+def test_cancelled_probe_is_abandoned(clock):
+    policy = Resilience('p', {'circuit_failure_threshold': 1, 'circuit_reset_timeout': 10})
+    policy.breaker.record_failure(OVERLOADED)
+    clock.now += 10
+
+    async def main():
+        probe = asyncio.ensure_future(policy.call(asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await policy.call(asyncio.sleep, 0, 'ok')
+
+    assert asyncio.run(main()) == 'ok'
+    assert policy.breaker.state == 'closed'
+
+
+def test_for_provider_is_shared():
+    assert Resilience.for_provider('groq') is Resilience.for_provider('groq', {'retry_attempts': 9})
+    assert Resilience.for_provider('groq').attempts != 9
@@ -0,0 +1,91 @@
+import asyncio
+import itertools
+
+import pytest
+
+from agents import response_cache
+from agents.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock so LRU order does not depend on timer resolution
+    clock = itertools.count(1)
+    monkeypatch.setattr(response_cache.time, 'time', lambda: float(next(clock)))
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite'), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def key(prompt, **extra):
+    return ResponseCache.make_key('model', 0.0, 100, prompt, **extra)
+
+
+def test_key_covers_every_parameter():
+    assert key('a') == key('a')
+    assert key('a') != key('b')
+    assert key('a') != key('a', seed=1)
+    assert ResponseCache.make_key('m1', 0.0, 100, 'a') != ResponseCache.make_key('m2', 0.0, 100, 'a')
+
+
+def test_miss_then_hit(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'reply'
+
+    assert cache.get_or_compute(compute, model='m', temperature=0, max_tokens=1, prompt='p') == 'reply'
+    assert cache.get_or_compute(compute, model='m', temperature=0, max_tokens=1, prompt='p') == 'reply'
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_bypass_skips_the_cache(cache):
+    assert cache.get_or_compute(lambda: 'x', bypass=True, model='m', temperature=0, max_tokens=1, prompt='p') == 'x'
+    assert cache.stats()['entries'] == 0
+
+
+def test_async_get_or_compute(cache):
+    async def compute():
+        return 'async reply'
+
+    async def twice():
+        first = await cache.aget_or_compute(compute, model='m', temperature=0, max_tokens=1, prompt='q')
+        second = await cache.aget_or_compute(compute, model='m', temperature=0, max_tokens=1, prompt='q')
+        return first, second
+
+    assert asyncio.run(twice()) == ('async reply', 'async reply')
+    assert cache.stats()['hits'] == 1
+
+
+def test_evicts_least_recently_used(cache):
+    for name in ('a', 'b', 'c'):
+        cache.set(key(name), name)
+    # Touch 'a' so 'b' becomes the oldest entry
+    assert cache.get(key('a')) == 'a'
+    cache.set(key('d'), 'd')
+    assert cache.get(key('b')) is None
+    assert [cache.get(key(name)) for name in ('a', 'c', 'd')] == ['a', 'c', 'd']
+
+
+def test_evicts_by_size(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'small.sqlite'), max_bytes=10)
+    cache.set(key('a'), 'x' * 8)
+    cache.set(key('b'), 'y' * 8)
+    assert cache.stats()['bytes'] <= 10
+    assert cache.get(key('b')) == 'y' * 8
+    cache.close()
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / 'persist.sqlite')
+    first = ResponseCache(path)
+    first.set(key('a'), 'kept')
+    first.close()
+    second = ResponseCache(path)
+    assert second.get(key('a')) == 'kept'
+    second.clear()
+    assert second.get(key('a')) is None
+    second.close()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from agents.router_agent import LatencyTracker, RouterAgent
+
+
+def test_cancelled_requests_are_not_samples():
+    tracker = LatencyTracker('p', prior=1.0, context_length=None, window=100, min_samples=5)
+    for seconds in (0.08, 0.09, 0.10, 0.11, 0.12):
+        tracker.record(seconds)
+    p50 = tracker.percentile(0.5)
+    # A loser cancelled early says nothing about how fast it is
+    tracker.record_cancelled(0.05)
+    assert len(tracker.latencies) == 5
+    assert tracker.percentile(0.5) == p50
+    # One cancelled after longer than anything measured only raises the tail
+    tracker.record_cancelled(1.0)
+    tracker.record_cancelled(1.0)
+    assert tracker.percentile(0.95) == 1.0
+    assert tracker.percentile(0.5) >= p50
+    assert tracker.stats()['cancelled'] == 3
+
+
+def test_cold_start_uses_the_prior():
+    tracker = LatencyTracker('p', prior=2.0, context_length=None, window=100, min_samples=5)
+    tracker.record(0.1)
+    assert tracker.percentile(0.5) == 2.0
+    assert tracker.percentile(0.95) == 4.0
+
+
+@pytest.fixture
+def router(groq_agent, fake_client):
+    def make(*clients, samples=None):
+        agents = [groq_agent(client) for client in clients]
+        router = RouterAgent(agents)
+        for agent, seconds in zip(agents, samples or []):
+            for _ in range(router.trackers[agent].min_samples):
+                router.trackers[agent].record(seconds)
+        return router, agents
+    return make
+
+
+def test_candidates_fastest_first(router, fake_client):
+    routed, (slow, fast) = router(fake_client(), fake_client(), samples=[0.5, 0.1])
+    assert routed.candidates() == [fast, slow]
+    # Agents whose context window is too small are skipped
+    routed.trackers[fast].context_length = 10
+    assert routed.candidates(tokens=100) == [slow]
+
+
+def test_failover_to_the_next_agent(router, fake_client):
+    broken = fake_client(error=ValueError("bad request"))
+    working = fake_client(code='y = 2')
+    routed, (first, second) = router(broken, working, samples=[0.01, 0.02])
+    response = asyncio.run(routed.generate_code('code_generation', 'anything'))
+    assert response.code == 'y = 2'
+    assert broken.calls and working.calls
+    assert routed.trackers[first].error_rate > 0
+
+
+def test_slow_agent_is_hedged_and_the_loser_not_sampled(router, fake_client):
+    slow = fake_client(code='slow = 1', delay=0.5)
+    fast = fake_client(code='fast = 1', delay=0.01)
+    routed, (first, second) = router(slow, fast, samples=[0.01, 0.02])
+
+    async def main():
+        response = await routed.generate_code('code_generation', 'anything')
+        # Let the cancelled loser unwind
+        await asyncio.sleep(0.05)
+        return response
+
+    response = asyncio.run(main())
+    assert response.code == 'fast = 1'
+    assert list(routed.trackers[first].latencies) == [0.01] * 5
+    assert len(routed.trackers[first].censored) == 1
+    assert len(routed.trackers[second].latencies) == 6
+
+
+def test_every_agent_failing_raises(router, fake_client):
+    from agents.base_agent import AgentError
+    routed, _ = router(fake_client(error=ValueError("a")), fake_client(error=ValueError("b")))
+    with pytest.raises(AgentError):
+        asyncio.run(routed.generate_code('code_generation', 'anything'))
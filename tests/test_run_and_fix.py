@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import coding_agents
+
+
+def test_run_and_fix_fixes_until_the_script_works(fake_llm, in_process):
+    llm = fake_llm(["x = 1 / 0", "```python\nx = 1\nx\n```"])
+    results = coding_agents.run_and_fix('task', llm=llm, executor=in_process, cache=None)
+    assert [result['is_error'] for result in results] == [True, False]
+    assert results[-1]['fix_iterations'] == 1
+    assert results[-1]['result'] == 1
+    # The fix prompt carries the failing script and its error
+    assert 'x = 1 / 0' in llm.prompts[1] and 'division by zero' in llm.prompts[1]
+
+
+def test_run_and_fix_gives_up_after_max_iterations(fake_llm, in_process):
+    llm = fake_llm(["x = 1 / 0"])
+    results = coding_agents.run_and_fix('task', max_iterations=2, llm=llm, executor=in_process, cache=None)
+    assert len(results) == 3
+    assert results[-1]['is_error']
+    assert results[-1]['fix_iterations'] == 2
+
+
+def test_reused_script_skips_generation(fake_llm, in_process, reuse):
+    llm = fake_llm(["x = 1 / 0"])
+    results = coding_agents.run_and_fix('task', llm=llm, executor=in_process, cache=None,
+                                        reuse=reuse({'task': "'stored'"}))
+    assert results[-1]['reused_from'] == 7
+    assert results[-1]['result'] == 'stored'
+    assert llm.prompts == []
+
+
+def test_arun_and_fix_gathers_on_one_loop(fake_llm, in_process):
+    llm = fake_llm(["x = 2\nx"], delay=0.05)
+
+    async def main():
+        return await asyncio.gather(*(
+            coding_agents.arun_and_fix(f'task {i}', llm=llm, executor=in_process, cache=None) for i in range(5)))
+
+    all_results = asyncio.run(main())
+    assert [results[-1]['result'] for results in all_results] == [2] * 5
+
+
+def test_run_and_fix_inside_a_running_loop(fake_llm, in_process):
+    # e.g. Jupyter: run_sync moves to a thread with a loop of its own
+    llm = fake_llm(["x = 3\nx"])
+
+    async def main():
+        return coding_agents.run_and_fix('task', llm=llm, executor=in_process, cache=None)
+
+    assert asyncio.run(main())[-1]['result'] == 3
+
+
+def test_astream_run_and_fix_events(fake_llm):
+    llm = fake_llm(["print('a')\nx = 1 / 0", "print('b')"])
+
+    async def main():
+        return [event async for event in coding_agents.astream_run_and_fix('task', llm=llm, cache=None)]
+
+    events = asyncio.run(main())
+    kinds = [event['type'] for event in events]
+    assert kinds[0] == 'script' and kinds[-1] == 'done'
+    assert [event['step'] for event in events if event['type'] == 'script'] == ['generate_script', 'fix_script']
+    assert ''.join(event['text'] for event in events if event['type'] == 'output') == 'a\nb\n'
+    assert not events[-1]['run_results'][-1]['is_error']
+
+
+def test_unknown_fix_mode_is_rejected(fake_llm):
+    with pytest.raises(ValueError):
+        coding_agents.run_and_fix('task', llm=fake_llm(["x = 1"]), cache=None, fix_mode='guess')
+
+
+def test_replies_of_failed_runs_are_not_replayed(fake_llm, in_process, tmp_path):
+    from agents.response_cache import ResponseCache
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite'))
+    failing = coding_agents.run_and_fix('task', max_iterations=0, llm=fake_llm(["x = 1 / 0"]),
+                                        executor=in_process, cache=cache)
+    assert failing[-1]['is_error']
+    assert cache.stats()['entries'] == 0
+    # A fresh completion rather than the cached failing script
+    llm = fake_llm(["x = 2\nx"])
+    assert coding_agents.run_and_fix('task', llm=llm, executor=in_process, cache=cache)[-1]['result'] == 2
+    assert len(llm.prompts) == 1
+    # Working replies stay cached
+    llm = fake_llm([RuntimeError('not called')])
+    assert coding_agents.run_and_fix('task', llm=llm, executor=in_process, cache=cache)[-1]['result'] == 2
+    assert llm.prompts == []
+    cache.close()
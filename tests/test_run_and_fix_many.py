@@ -0,0 +1,79 @@
+import asyncio
+
+import coding_agents
+
+
+class CountingLLM:
+    """Wraps a FakeLLM and records the most acomplete calls in flight at once"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.model = llm.model
+        self.in_flight = 0
+        self.peak = 0
+
+    def complete(self, prompt, **kwargs):
+        return self.llm.complete(prompt, **kwargs)
+
+    async def acomplete(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await self.llm.acomplete(prompt, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+def test_run_and_fix_many_caps_llm_concurrency(fake_llm, in_process):
+    llm = CountingLLM(fake_llm(lambda prompt, kwargs: f"x = {len(prompt)}", delay=0.02))
+    tasks = [f'task number {i}' + 'x' * i for i in range(10)]
+
+    async def main():
+        return [item async for item in coding_agents.run_and_fix_many(
+            tasks, concurrency=3, llm=llm, executor=in_process, cache=None)]
+
+    finished = asyncio.run(main())
+    assert sorted(index for index, _ in finished) == list(range(10))
+    assert all(not results[-1]['is_error'] for _, results in finished)
+    assert llm.peak == 3
+
+
+def test_run_and_fix_many_reuses_stored_scripts(fake_llm, in_process, reuse):
+    llm = fake_llm(["'generated'"])
+
+    async def main():
+        return dict([item async for item in coding_agents.run_and_fix_many(
+            ['old', 'new'], llm=llm, executor=in_process, cache=None, reuse=reuse({'old': "'stored'"}))])
+
+    finished = asyncio.run(main())
+    assert finished[0][-1]['result'] == 'stored'
+    assert finished[1][-1]['result'] == 'generated'
+    assert len(llm.prompts) == 1
+
+
+def test_private_pool_starts_off_the_event_loop(fake_llm, monkeypatch):
+    import threading
+    import sandbox
+    threads = []
+
+    class RecordingPool:
+        def __init__(self):
+            threads.append(threading.get_ident())
+
+        def run(self, code_string):
+            return coding_agents.run_code(code_string)
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(sandbox, 'SandboxPool', RecordingPool)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        finished = [item async for item in coding_agents.run_and_fix_many(
+            ['task'], llm=fake_llm(["x = 1"]), cache=None)]
+        return loop_thread, finished
+
+    loop_thread, finished = asyncio.run(main())
+    assert not finished[0][1][-1]['is_error']
+    assert threads and loop_thread not in threads
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import coding_agents
+from sandbox import SandboxPool, execute
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with SandboxPool(workers=2, timeout=5) as pool:
+        yield pool
+
+
+def test_execute_captures_output_and_result():
+    result = execute("print('hi')\n1 + 1")
+    assert result['is_error'] is False
+    assert result['output'] == 'hi'
+    assert result['result'] == 2
+
+
+def test_execute_reports_errors_with_traceback():
+    result = execute("raise ValueError('boom')")
+    assert result['is_error'] is True
+    assert result['error_message'] == 'boom'
+    assert 'ValueError' in result['traceback']
+
+
+@pytest.mark.parametrize('run', [execute, coding_agents.run_code])
+def test_clean_exit_is_a_success(run):
+    for script in ("import sys\nprint('done')\nsys.exit(0)", "import sys\nsys.exit()"):
+        result = run(script)
+        assert result['is_error'] is False, script
+        assert result['result'] is None
+    assert run("print('done')\nimport sys\nsys.exit(0)")['output'] == 'done'
+    failed = run("import sys\nsys.exit(3)")
+    assert failed['is_error'] is True
+    assert failed['error_message'] == '3'
+
+
+def test_pool_runs_scripts(pool):
+    result = pool.run("print('from worker')")
+    assert result['is_error'] is False
+    assert result['output'] == 'from worker'
+
+
+def test_pool_map_keeps_input_order(pool):
+    results = pool.map([f"{i} * 2" for i in range(6)])
+    assert [result['result'] for result in results] == [i * 2 for i in range(6)]
+
+
+def test_timeout_kills_and_replaces_worker(pool):
+    start = time.monotonic()
+    result = pool.run("while True: pass", timeout=0.5)
+    assert result['is_error'] is True
+    assert 'timed out' in result['error_message']
+    assert time.monotonic() - start < 5
+    # The pool still has its workers afterwards
+    assert pool.map(["1", "2"]) and pool.run("3")['result'] == 3
+
+
+def test_dead_worker_reports_exit_code(pool):
+    result = pool.run("import os; os._exit(7)")
+    assert result['is_error'] is True
+    assert result['error_message'] == 'Worker process died (exit code 7)'
+    assert pool.run("4")['result'] == 4
+
+
+def test_on_output_streams_stdout(pool):
+    pieces = []
+    result = pool.run("print('a')\nprint('b')", on_output=pieces.append)
+    assert ''.join(pieces) == 'a\nb\n'
+    assert result['output'] == 'a\nb'
+
+
+def test_closed_pool_rejects_jobs():
+    pool = SandboxPool(workers=1)
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.submit("1")
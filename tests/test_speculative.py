@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import coding_agents
+from agents.response_cache import ResponseCache
+
+
+@pytest.fixture
+def speculate(in_process):
+    def speculate(llm, **kwargs):
+        return asyncio.run(coding_agents.arun_speculative(
+            'task', llm=llm, executor=in_process, cache=None, max_iterations=0, **kwargs))
+    return speculate
+
+
+def test_first_working_candidate_wins(fake_llm, speculate):
+    def reply(prompt, kwargs):
+        return "x = 1 / 0" if kwargs['temperature'] == 0.0 else "x = 1"
+    results = speculate(fake_llm(reply))
+    assert not results[-1]['is_error']
+    assert results[-1]['candidate'] in (1, 2)
+    assert results[-1]['variant']['temperature'] != 0.0
+
+
+def test_candidate_exception_does_not_end_the_race(fake_llm, speculate):
+    def reply(prompt, kwargs):
+        if kwargs['model'] == 'unknown-model':
+            return RuntimeError("model not found")
+        return "x = 1"
+    variants = [{'model': 'unknown-model'}, {'model': 'slow-but-real'}]
+    llm = fake_llm(reply, delay=0.01)
+    results = speculate(llm, candidates=2, variants=variants)
+    assert not results[-1]['is_error']
+    assert results[-1]['candidate'] == 1
+
+
+def test_every_candidate_failing_returns_the_error(fake_llm, speculate):
+    results = speculate(fake_llm([RuntimeError("provider down")]), candidates=2)
+    assert results[-1]['is_error']
+    assert results[-1]['candidate'] == 0
+    assert 'provider down' in results[-1]['candidate_error']
+
+
+def test_repeated_variants_bypass_the_cache(fake_llm, in_process, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite'))
+    variants = [{'temperature': 0.0}]
+    try:
+        # Cache a reply for the only variant
+        first = asyncio.run(coding_agents.arun_speculative(
+            'task', candidates=1, variants=variants, llm=fake_llm(["x = 1"]),
+            executor=in_process, cache=cache, max_iterations=0))
+        assert not first[-1]['is_error']
+
+        # Candidate 0 gets the cached reply, candidate 1 asks again
+        llm = fake_llm(["x = 2"])
+        results = asyncio.run(coding_agents.arun_speculative(
+            'task', candidates=2, variants=variants, llm=llm,
+            executor=in_process, cache=cache, max_iterations=0))
+        assert not results[-1]['is_error']
+        assert len(llm.prompts) == 1
+    finally:
+        cache.close()
+
+
+def test_run_speculative_can_be_called_repeatedly(fake_llm, in_process):
+    llm = fake_llm(["x = 1"])
+    for _ in range(2):
+        results = coding_agents.run_speculative('task', llm=llm, executor=in_process, cache=None, max_iterations=0)
+        assert not results[-1]['is_error']
@@ -0,0 +1,131 @@
+import ast
+import asyncio
+
+import pytest
+
+from agents.streaming import IncrementalCodeParser, StreamingCodeValidator, StreamValidationError, unresolved_imports
+
+
+def feed_all(parser, chunks):
+    statements = []
+    for chunk in chunks:
+        statements.extend(parser.feed(chunk))
+    return statements + parser.finish()
+
+
+def chunked(text, size=3):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_statements_are_emitted_as_they_close():
+    parser = IncrementalCodeParser()
+    assert parser.feed("```python\nimport os\n") == []
+    statements = parser.feed("x = 1\n")
+    assert [type(s) for s in statements] == [ast.Import]
+    assert [type(s) for s in parser.finish()] == [ast.Assign]
+
+
+def test_prose_before_the_fence_is_ignored():
+    text = "Here is the code:\n\n```python\nx = 1\ny = 2\n```\nHope this helps!\n"
+    statements = feed_all(IncrementalCodeParser(), chunked(text))
+    assert [ast.unparse(s) for s in statements] == ['x = 1', 'y = 2']
+
+
+def test_prose_between_fenced_blocks_is_ignored():
+    text = "```python\nx = 1\n```\nAnd a usage example:\n```python\nprint(x)\n```\n"
+    parser = IncrementalCodeParser()
+    statements = feed_all(parser, chunked(text))
+    assert [ast.unparse(s) for s in statements] == ['x = 1', 'print(x)']
+    assert parser.source == "x = 1\nprint(x)\n"
+
+
+def test_reply_without_fence_is_parsed_at_the_end():
+    parser = IncrementalCodeParser()
+    assert parser.feed("x = 1\ny = 2\n") == []
+    assert [ast.unparse(s) for s in parser.finish()] == ['x = 1', 'y = 2']
+
+
+def test_blocks_with_continuations_and_decorators_stay_whole():
+    text = ("```python\n"
+            "@staticmethod\n"
+            "def f():\n"
+            "    return 1\n"
+            "if f():\n"
+            "    pass\n"
+            "else:\n"
+            "    pass\n"
+            "try:\n"
+            "    pass\n"
+            "except ValueError as e:\n"
+            "    pass\n"
+            "```\n")
+    statements = feed_all(IncrementalCodeParser(), chunked(text))
+    assert [type(s) for s in statements] == [ast.FunctionDef, ast.If, ast.Try]
+
+
+def test_line_starting_with_a_colon():
+    text = "```python\nx = {'a'\n: 1}\ny = 2\n```\n"
+    statements = feed_all(IncrementalCodeParser(), chunked(text))
+    assert [ast.unparse(s) for s in statements] == ["x = {'a': 1}", 'y = 2']
+
+
+def test_open_brackets_wait_for_more_lines():
+    parser = IncrementalCodeParser()
+    parser.feed("```python\nvalues = [\n")
+    assert parser.feed("1,\n2,\n") == []
+    assert [ast.unparse(s) for s in feed_all(parser, ["]\n```\n"])] == ['values = [1, 2]']
+
+
+def test_syntax_errors_report_their_line():
+    parser = IncrementalCodeParser()
+    parser.feed("```python\nx = 1\ny = = 2\n")
+    with pytest.raises(StreamValidationError, match='line 2'):
+        parser.feed("z = 3\n")
+
+
+def test_statement_line_numbers_are_absolute():
+    statements = feed_all(IncrementalCodeParser(), ["```python\na = 1\nb = 2\nc = 3\n```"])
+    assert [s.lineno for s in statements] == [1, 2, 3]
+
+
+def test_unresolved_imports():
+    assert unresolved_imports(ast.parse("import os, surely_not_a_module").body[0]) == ['surely_not_a_module']
+    assert unresolved_imports(ast.parse("from . import x").body[0]) == []
+    assert unresolved_imports(ast.parse("x = 1").body[0]) == []
+
+
+class Chunks:
+    """Async chunk stream that records whether it was closed"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.closed = False
+        self.consumed = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed or self.consumed == len(self.chunks):
+            raise StopAsyncIteration
+        self.consumed += 1
+        return self.chunks[self.consumed - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_validator_returns_the_source():
+    seen = []
+    validator = StreamingCodeValidator(on_statement=seen.append)
+    source = asyncio.run(validator.consume(Chunks(chunked("Sure:\n```python\nimport os\nx = 1\n```\n"))))
+    assert source == "import os\nx = 1\n"
+    assert validator.statement_count == 2 and len(seen) == 2
+
+
+def test_validator_stops_the_stream_on_a_bad_import():
+    chunks = Chunks(["```python\n", "import surely_not_a_module\n", "x = 1\n", "y = 2\n", "z = 3\n", "```\n"])
+    with pytest.raises(StreamValidationError, match='surely_not_a_module'):
+        asyncio.run(StreamingCodeValidator().consume(chunks))
+    assert chunks.closed
+    assert chunks.consumed < len(chunks.chunks)
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from history_index import HistoryIndex
+from history_store import HistoryStore
+from task_similarity import TaskSimilarityIndex, features
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    index = HistoryIndex(str(tmp_path), store=store)
+    store.append('sort a list of numbers in ascending order', "sorted_numbers = sorted([3, 1, 2])")
+    store.append('download a web page and count its links', "links = 0")
+    store.append('compute the nth fibonacci number', "def fib(n):\n    return n")
+    yield store, index
+    index.close()
+    store.close()
+
+
+def test_features_include_bigrams():
+    assert features("sort numbers quickly") == ['sort', 'number', 'quickly', 'sort number', 'number quickly']
+
+
+def test_query_ranks_the_closest_task_first(history):
+    store, index = history
+    similarity = TaskSimilarityIndex(history=index)
+    [(best, score)] = similarity.query('sort numbers in ascending order')
+    assert best == 1
+    assert 0 < score <= 1
+    ranked = similarity.query('fibonacci number', k=3)
+    assert ranked[0][0] == 3
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+
+
+def test_find_scripts_respects_the_threshold(history):
+    store, index = history
+    similarity = TaskSimilarityIndex(history=index, threshold=0.5)
+    exact, unrelated = similarity.find_scripts(['compute the nth fibonacci number', 'resize an image'])
+    assert exact['id'] == 3
+    assert exact['score'] == pytest.approx(1.0)
+    assert 'def fib' in exact['script']
+    assert unrelated is None
+    assert similarity.find_script('resize an image', min_score=0.0)['id'] in (1, 2, 3)
+
+
+def test_rebuilds_after_new_saves(history):
+    store, index = history
+    similarity = TaskSimilarityIndex(history=index)
+    assert similarity.find_script('parse a csv file into rows') is None
+    store.append('parse a csv file into rows', "rows = []")
+    assert similarity.find_script('parse a csv file into rows')['id'] == 4
+
+
+def test_empty_history(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    index = HistoryIndex(str(tmp_path), store=store)
+    try:
+        similarity = TaskSimilarityIndex(history=index)
+        assert similarity.query('anything') == []
+        assert similarity.find_script('anything') is None
+    finally:
+        index.close()
+        store.close()
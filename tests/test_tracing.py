@@ -0,0 +1,124 @@
+import time
+import asyncio
+
+import pytest
+
+from agents.tracing import Tracer, InMemoryExporter, PrometheusExporter, JsonlExporter, NOOP_SPAN, token_usage
+
+
+@pytest.fixture
+def memory():
+    exporter = InMemoryExporter()
+    tracer = Tracer().enable(exporter)
+    return tracer, exporter
+
+
+def test_disabled_tracer_hands_out_the_noop_span():
+    tracer = Tracer()
+    assert tracer.span('x') is NOOP_SPAN
+    with tracer.span('x') as span:
+        span.set('a', 1)
+    tracer.count('c')
+
+
+def test_spans_nest_and_record_attributes(memory):
+    tracer, exporter = memory
+    with tracer.span('outer', task='t') as outer:
+        with tracer.span('inner') as inner:
+            inner.increment('attempts')
+            inner.increment('attempts')
+    assert [span.name for span in exporter.spans] == ['inner', 'outer']
+    assert inner.parent_id == outer.span_id
+    assert inner.attributes == {'attempts': 2}
+    assert outer.attributes == {'task': 't'}
+
+
+def test_span_duration_uses_a_monotonic_clock(memory, monkeypatch):
+    tracer, exporter = memory
+    wall = iter([1000.0, 0.0])
+    # A wall clock stepping backwards must not give negative durations
+    monkeypatch.setattr(time, 'time', lambda: next(wall))
+    with tracer.span('step'):
+        time.sleep(0.01)
+    span = exporter.spans[0]
+    assert span.duration >= 0.01
+    assert span.start == 1000.0 and span.end == span.start + span.duration
+
+
+def test_span_records_errors(memory):
+    tracer, exporter = memory
+    with pytest.raises(ValueError):
+        with tracer.span('failing'):
+            raise ValueError('boom')
+    assert exporter.spans[0].error == 'ValueError: boom'
+
+
+def test_traced_wraps_sync_and_async_functions(memory):
+    tracer, exporter = memory
+
+    @tracer.traced('sync')
+    def f():
+        return 1
+
+    @tracer.traced()
+    async def g():
+        return 2
+
+    assert f() == 1 and asyncio.run(g()) == 2
+    assert [span.name for span in exporter.spans] == ['sync', 'test_traced_wraps_sync_and_async_functions.<locals>.g']
+
+
+def test_counters_aggregate_by_labels(memory):
+    tracer, exporter = memory
+    tracer.count('hits', provider='a')
+    tracer.count('hits', 2, provider='a')
+    tracer.count('hits', provider='b')
+    assert exporter.counters[('hits', (('provider', 'a'),))] == 3
+    assert exporter.counters[('hits', (('provider', 'b'),))] == 1
+
+
+def test_prometheus_escapes_label_values():
+    exporter = PrometheusExporter()
+    tracer = Tracer().enable(exporter)
+    tracer.count('errors', kind='say "hi"\\now\nnext')
+    with tracer.span('odd"span'):
+        pass
+    text = exporter.render()
+    assert r'pycoder_errors_total{kind="say \"hi\"\\now\nnext"} 1' in text
+    assert r'pycoder_span_duration_seconds_count{span="odd\"span"} 1' in text
+    # Every sample stays on one line
+    assert all(line.startswith(('#', 'pycoder_')) for line in text.strip().split('\n'))
+
+
+def test_prometheus_renders_mixed_label_values():
+    exporter = PrometheusExporter()
+    tracer = Tracer().enable(exporter)
+    tracer.count('llm.input_tokens', 3, model=None)
+    tracer.count('llm.input_tokens', 5, model='claude')
+    tracer.count('llm.input_tokens', 7, model=2)
+    text = exporter.render()
+    assert 'pycoder_llm_input_tokens_total 3' in text
+    assert 'pycoder_llm_input_tokens_total{model="claude"} 5' in text
+    assert 'pycoder_llm_input_tokens_total{model="2"} 7' in text
+
+
+def test_jsonl_exporter(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    tracer = Tracer().enable(JsonlExporter(str(path)))
+    with tracer.span('s'):
+        tracer.count('c')
+    lines = path.read_text().strip().split('\n')
+    assert len(lines) == 2 and '"type": "counter"' in lines[0] and '"type": "span"' in lines[1]
+
+
+def test_token_usage_from_dicts_and_objects():
+    class Usage:
+        input_tokens = 3
+        output_tokens = 4
+
+    class Response:
+        usage = Usage()
+
+    assert token_usage(Response()) == (3, 4)
+    assert token_usage(type('R', (), {'raw': {'usage': {'prompt_tokens': 1, 'completion_tokens': 2}}})()) == (1, 2)
+    assert token_usage(object()) == (None, None)